@@ -0,0 +1,230 @@
+"""
+Makes birth charts for a file of records without any prompts:
+
+    python3 batch.py customers.csv --output charts.jsonl
+
+Records have name, date (DD/MM/YYYY), time (HH:MM), city and country
+fields and come from a CSV file with a header or a JSONL file. The
+cities are resolved in the main process, which is a lookup in the
+memory-mapped dataset, while the charts are made by a pool of
+processes, since the ephemeris calculations are CPU-bound and hold
+the GIL. Only the signs are needed, so they come from ephemeris.py,
+which caches the planets of every birth minute instead of building a
+full AstrologicalSubject for each record. Every chart is written as
+one JSON list as soon as it is ready, in the order of the records and
+in the same shape as the rows of the birth_chart worksheet, or as a
+report rendered by renderers.py:
+
+    python3 batch.py customers.csv --report text --output charts.txt
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime as dt
+from multiprocessing import Pool
+
+import ephemeris
+from cities import DatasetError, load_cities
+from records import ChartRecord
+from renderers import RENDERERS, SEPARATORS
+from timezones import timezone_at
+
+FIELDS = ('name', 'date', 'time', 'city', 'country')
+# Records sent to a worker at a time
+CHUNK_SIZE = 16
+
+
+def read_records(file, file_format):
+    """
+    Reads the records of a CSV or JSONL file one at a time.
+
+    Args:
+        file (file): The open file.
+        file_format (str): 'csv' or 'jsonl'.
+
+    Yields:
+        record (dict): The fields of a record, or the line of a JSONL
+        record, which prepare() parses so that a bad line is reported
+        like any other bad record.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield line
+
+
+def prepare(record, cities):
+    """
+    Checks a record and finds the location of its city.
+
+    Args:
+        record (dict): The fields of a record, or a line of JSON.
+        cities (CityTable): The cities dataset.
+
+    Returns:
+        job (tuple): The name, date, time, city, country, latitude,
+        longitude and timezone of the chart.
+
+    Raises:
+        ValueError: If the record isn't a JSON object, a field is
+        missing or invalid, or the city can't be found.
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError(f'Expected an object, got {record!r}')
+    missing = [field for field in FIELDS if not record.get(field)]
+    if missing:
+        raise ValueError(f'Missing {", ".join(missing)}')
+    name, date, time_, city, country = (str(record[field]).strip()
+                                        for field in FIELDS)
+    # Same formats as the prompts, so the rows match the worksheet's
+    dt.strptime(date, '%d/%m/%Y')
+    dt.strptime(time_, '%H:%M')
+
+    location = cities.resolve(city, country)
+    if location is None:
+        raise ValueError(f'{city}, {country} could not be found.')
+    lat, long, tz_str = location
+    if tz_str is None:
+        tz_str = timezone_at(lat, long)
+    return name, date, time_, city, country, lat, long, tz_str
+
+
+def make_chart(job):
+    """
+    Makes the birth chart of a job in a worker process.
+
+    Args:
+        job (tuple): See prepare().
+
+    Returns:
+        record (ChartRecord): The chart, or None if it couldn't be made.
+        error (str): Why the chart couldn't be made, or None.
+        cached (bool): Whether the planets came from the cache.
+    """
+    name, date, time_, city, country, lat, long, tz_str = job
+    valid_date = dt.strptime(date, '%d/%m/%Y')
+    valid_time = dt.strptime(time_, '%H:%M')
+    hits = ephemeris.cache_info().hits
+    try:
+        signs = ephemeris.chart_signs(valid_date, valid_time,
+                                      lat, long, tz_str)
+    except ephemeris.EphemerisError as e:
+        return None, str(e), False
+    cached = ephemeris.cache_info().hits > hits
+    # Records are much smaller to send back than the rows
+    return ChartRecord.from_signs(name, valid_date, valid_time,
+                                  city, country, signs), None, cached
+
+
+def run_batch(records, output, workers=None, errors=sys.stderr,
+              report=None):
+    """
+    Makes the birth chart of every record and writes them as JSONL.
+
+    Args:
+        records (iterable): The records, see read_records().
+        output (file): Where the rows are written.
+        workers (int): Processes making charts. Defaults to one per core.
+        errors (file): Where records that fail are reported.
+        report (str): One of renderers.RENDERERS to write reports
+            instead of worksheet rows. Defaults to None.
+
+    Returns:
+        made (int): Charts written.
+        failed (int): Records that couldn't be charted.
+        cached (int): Charts whose planets came from a worker's cache.
+    """
+    cities = load_cities()
+    failed = 0
+    if report is None:
+        render, end = ChartRecord.to_json, '\n'
+    else:
+        render, end = RENDERERS[report], SEPARATORS[report]
+
+    def jobs():
+        # Consumed by the pool's own thread, so the records that can't be
+        # prepared are passed along and counted with the others below
+        for number, record in enumerate(records, start=1):
+            try:
+                yield number, prepare(record, cities), None
+            except ValueError as e:
+                yield number, None, str(e)
+
+    made = cached = 0
+    with Pool(workers) as pool:
+        results = pool.imap(_numbered_chart, jobs(), chunksize=CHUNK_SIZE)
+        for number, (record, error, hit) in results:
+            if error:
+                failed += 1
+                print(f'Record {number}: {error}', file=errors)
+                continue
+            output.write(render(record) + end)
+            made += 1
+            cached += hit
+    return made, failed, cached
+
+
+def _numbered_chart(numbered_job):
+    """
+    Makes the chart of a job, keeping the number of its record, or
+    passes on why its record couldn't be prepared.
+    """
+    number, job, error = numbered_job
+    if error:
+        return number, (None, error, False)
+    return number, make_chart(job)
+
+
+def main():
+    """
+    Parses the command line and makes the charts.
+    """
+    parser = argparse.ArgumentParser(
+        description='Make birth charts for a file of records.')
+    parser.add_argument('input',
+                        help='CSV or JSONL file of records, - for stdin')
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help='format of the input, guessed from '
+                             'its extension by default')
+    parser.add_argument('--output', default='-',
+                        help='JSONL file of charts, - for stdout')
+    parser.add_argument('--report', choices=RENDERERS,
+                        help='write reports instead of worksheet rows')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes making charts')
+    args = parser.parse_args()
+
+    file_format = args.format
+    if file_format is None:
+        file_format = 'csv' if args.input.endswith('.csv') else 'jsonl'
+    source = (sys.stdin if args.input == '-'
+              else open(args.input, encoding='utf-8', newline=''))
+    output = (sys.stdout if args.output == '-'
+              else open(args.output, 'w', encoding='utf-8'))
+
+    start = time.perf_counter()
+    with source, output:
+        try:
+            made, failed, cached = run_batch(
+                read_records(source, file_format), output, args.workers,
+                report=args.report)
+        except DatasetError as e:
+            sys.exit(str(e))
+    elapsed = time.perf_counter() - start
+    rate = made / elapsed if elapsed else 0
+    cores = min(args.workers, os.cpu_count() or 1)
+    print(f'{made} charts in {elapsed:.1f}s, {failed} failed: '
+          f'{rate:.1f} charts/sec, {rate / cores:.1f} charts/sec '
+          f'per core ({args.workers} workers on {cores} cores), '
+          f'{cached} with cached planets', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
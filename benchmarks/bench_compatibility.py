@@ -0,0 +1,72 @@
+"""
+Measures scoring compatibility in bulk with compatibility.py, on random
+charts, and checks the bulk synastry scores against scoring every
+pair on its own:
+
+    python3 benchmarks/bench_compatibility.py
+    python3 benchmarks/bench_compatibility.py --users 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# The benchmarks import the app's modules from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from compatibility import (SynastryIndex,  # noqa: E402
+                           cohort_sign_scores, sign_scores, synastry_score)
+
+# Pairs scored one by one to check the bulk scores
+CHECKED_PAIRS = 200
+
+
+def timed(task, *args):
+    """
+    Returns the result of a task and the milliseconds it took.
+    """
+    start = time.perf_counter()
+    result = task(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark bulk compatibility scoring.')
+    parser.add_argument('--users', type=int, default=2000,
+                        help='charts in the cohort')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    signs = rng.integers(1, 13, args.users)
+    longitudes = rng.uniform(0, 360, (args.users, 10))
+
+    _, ms = timed(sign_scores, 'Leo', signs)
+    print(f'Sun signs, one against {args.users}: {ms:.2f}ms')
+    _, ms = timed(cohort_sign_scores, signs)
+    print(f'Sun signs, all {args.users ** 2} pairs: {ms:.2f}ms')
+
+    index, ms = timed(SynastryIndex, longitudes)
+    print(f'Synastry, indexing {args.users} charts: {ms:.2f}ms')
+    scores, ms = timed(index.scores, longitudes[0])
+    print(f'Synastry, one against {args.users}: {ms:.2f}ms')
+    cohort, ms = timed(index.cohort)
+    print(f'Synastry, all {args.users ** 2} pairs: {ms:.2f}ms')
+
+    pairs = rng.integers(0, args.users, (CHECKED_PAIRS, 2))
+    error = max(abs(cohort[i, j] - synastry_score(longitudes[i],
+                                                  longitudes[j]))
+                for i, j in pairs)
+    assert np.allclose(scores, cohort[0])
+    print(f'Largest difference with scoring pairs one by one: {error:.1e}')
+
+
+if __name__ == '__main__':
+    main()
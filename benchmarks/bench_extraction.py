@@ -0,0 +1,100 @@
+"""
+Compares extracting the horoscope text with extraction.py against
+building a full BeautifulSoup tree, on pages saved from horoscope.com.
+
+Small pages in the layout of horoscope.com are kept in
+benchmarks/fixtures, so it runs offline; --fetch replaces them with
+the live pages first:
+
+    python3 benchmarks/bench_extraction.py
+    python3 benchmarks/bench_extraction.py --fetch
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+# The benchmarks import the app's modules from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from extraction import SELECTORS, extract_text  # noqa: E402
+from horoscopes import COMPATIBILITY_URL, horoscope_url  # noqa: E402
+from http_client import fetch  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+# Fixture file: (page type, URL)
+PAGES = {
+    'daily.html': ('horoscope', horoscope_url(('Leo', 5), 'Daily')),
+    'weekly.html': ('horoscope', horoscope_url(('Leo', 5), 'Weekly')),
+    'monthly.html': ('horoscope', horoscope_url(('Leo', 5), 'Monthly')),
+    'yearly.html': ('yearly', horoscope_url(('Leo', 5), 'Yearly')),
+    'compatibility.html': ('compatibility',
+                           f'{COMPATIBILITY_URL}Leo-Aries'),
+}
+
+
+def soup_text(html, page_type):
+    """
+    Extracts the text the way the app used to.
+    """
+    tag, attribute, value = SELECTORS[page_type]
+    soup = BeautifulSoup(html, 'html.parser')
+    attrs = {'class_' if attribute == 'class' else attribute: value}
+    return soup.find(tag, **attrs).p.text
+
+
+def measure(extract, html, page_type, repeat):
+    """
+    Returns the CPU time per parse (ms) and the peak memory
+    allocated by one parse (KiB).
+    """
+    start = time.process_time()
+    for _ in range(repeat):
+        extract(html, page_type)
+    cpu = (time.process_time() - start) / repeat * 1000
+
+    tracemalloc.start()
+    extract(html, page_type)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--fetch', action='store_true',
+                        help='download the fixture pages first')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.fetch:
+        os.makedirs(FIXTURES, exist_ok=True)
+        for name, (_, url) in PAGES.items():
+            with open(os.path.join(FIXTURES, name), 'wb') as file:
+                file.write(fetch(url).content)
+
+    print(f'{"page":<20}{"soup ms":>10}{"soup KiB":>10}'
+          f'{"stream ms":>11}{"stream KiB":>12}')
+    for name, (page_type, _) in PAGES.items():
+        path = os.path.join(FIXTURES, name)
+        if not os.path.exists(path):
+            print(f'{name:<20}missing, run with --fetch')
+            continue
+        with open(path, 'rb') as file:
+            html = file.read()
+        if soup_text(html, page_type) != extract_text(html, page_type):
+            print(f'{name:<20}texts differ!')
+        soup_cpu, soup_peak = measure(soup_text, html, page_type,
+                                      args.repeat)
+        cpu, peak = measure(extract_text, html, page_type, args.repeat)
+        print(f'{name:<20}{soup_cpu:>10.2f}{soup_peak:>10.0f}'
+              f'{cpu:>11.2f}{peak:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Measures what a span and a timed function cost with instrumentation
+disabled and enabled, against the bare call:
+
+    python3 benchmarks/bench_instrumentation.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# The benchmarks import the app's modules from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import instrumentation  # noqa: E402
+from instrumentation import count, span, timed  # noqa: E402
+
+
+def stage():
+    pass
+
+
+@timed('stage')
+def timed_stage():
+    pass
+
+
+def per_call(task, calls):
+    """
+    Returns the nanoseconds one call of a task takes.
+    """
+    start = time.perf_counter()
+    for _ in range(calls):
+        task()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def with_span():
+    with span('stage'):
+        stage()
+    count('stage.calls')
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the cost of instrumentation.')
+    parser.add_argument('--calls', type=int, default=200000)
+    args = parser.parse_args()
+
+    instrumentation.disable()
+    bare = per_call(stage, args.calls)
+    print(f'Bare call:                 {bare:7.0f}ns')
+    for state in ('disabled', 'enabled', 'traced'):
+        if state == 'enabled':
+            instrumentation.enable()
+        elif state == 'traced':
+            trace = tempfile.NamedTemporaryFile(suffix='.jsonl')
+            instrumentation.enable(trace.name)
+        print(f'span + count, {state + ":":<12}'
+              f'{per_call(with_span, args.calls) - bare:7.0f}ns more')
+        print(f'timed,        {state + ":":<12}'
+              f'{per_call(timed_stage, args.calls) - bare:7.0f}ns more')
+    instrumentation.disable()
+    stages, _ = instrumentation.registry.summary()
+    print(f'{stages["stage"]["count"]} spans recorded')
+
+
+if __name__ == '__main__':
+    main()
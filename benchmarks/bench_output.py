@@ -0,0 +1,101 @@
+"""
+Measures what printing one styled line costs: with a new rich Console
+for every line (as prettify_text() used to), through the shared
+console of output.py, with a screen of lines held and written in one
+go, and as plain output:
+
+    python3 benchmarks/bench_output.py
+    python3 benchmarks/bench_output.py --lines 20000
+
+Lines are written to os.devnull by a console forced into terminal
+mode, so only the rendering is measured.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from rich.console import Console
+
+# The benchmarks import the app's modules from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import output  # noqa: E402
+
+# A screen's worth of the app's lines, printed over and over
+LINES = (('\nHello, Gerry.', 'deep_pink1', 'sparkles'),
+         ('Your Sun sign is Gemini. ♊️\n', 'deep_pink1', None),
+         ('Your Moon sign is Taurus. ♉️\n', 'deep_pink1', None),
+         ('Your Rising sign is Libra. ♎️\n', 'deep_pink1', None),
+         ('\nPlease enter your time of birth (24-hour):\n', '#5fd700', None),
+         ('Please enter date in DD/MM/YYYY format.', 'red', 'warning'))
+# Lines held at once by screen()
+SCREEN = 24
+
+
+def per_line(task, lines):
+    """
+    Returns the microseconds a task takes per line printed.
+    """
+    start = time.perf_counter()
+    task(lines)
+    return (time.perf_counter() - start) / lines * 1e6
+
+
+def new_consoles(lines, file):
+    for number in range(lines):
+        text, color, emoji = LINES[number % len(LINES)]
+        console = Console(file=file, force_terminal=True)
+        if emoji:
+            console.print(f'[bold {color}]{text}[/] :{emoji}:')
+        else:
+            console.print(f'[bold {color}]{text}[/]')
+
+
+def shared_console(lines):
+    for number in range(lines):
+        output.echo(*LINES[number % len(LINES)])
+
+
+def screens(lines):
+    for start in range(0, lines, SCREEN):
+        with output.screen():
+            shared_console(min(SCREEN, lines - start))
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark printing styled lines.')
+    parser.add_argument('--lines', type=int, default=5000)
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        cost = per_line(lambda lines: new_consoles(lines, devnull),
+                        args.lines)
+        print(f'New console per line: {cost:7.1f}µs')
+        output.configure(plain=False, file=devnull,
+                         force_terminal=True)
+        print(f'Shared console:       '
+              f'{per_line(shared_console, args.lines):7.1f}µs')
+        print(f'Screens of {SCREEN} lines:  '
+              f'{per_line(screens, args.lines):7.1f}µs')
+        output.configure(plain=True, file=devnull)
+        print(f'Plain output:         '
+              f'{per_line(shared_console, args.lines):7.1f}µs')
+
+    # Both consoles print the same thing
+    before, after = io.StringIO(), io.StringIO()
+    new_consoles(len(LINES), before)
+    output.configure(plain=False, file=after, force_terminal=True)
+    shared_console(len(LINES))
+    assert before.getvalue() == after.getvalue()
+    print('Shared console output matches.')
+
+
+if __name__ == '__main__':
+    main()
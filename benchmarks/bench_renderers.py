@@ -0,0 +1,87 @@
+"""
+Measures rendering chart reports with renderers.py, on random records,
+against Kerykeion's Report for a few charts:
+
+    python3 benchmarks/bench_renderers.py
+    python3 benchmarks/bench_renderers.py --charts 50000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime as dt
+
+# The benchmarks import the app's modules from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from records import SIGN_KEYS, ChartRecord  # noqa: E402
+from renderers import RENDERERS, write_reports  # noqa: E402
+from zodiac import SIGNS  # noqa: E402
+
+# Charts rendered by the rich renderer and Kerykeion, which are slower
+SLOW_CHARTS = 200
+
+
+def random_records(charts, seed=0):
+    """
+    Returns random chart records.
+    """
+    rng = random.Random(seed)
+    return [ChartRecord.from_signs(
+                f'Person{number}',
+                dt(rng.randint(1900, 2024), rng.randint(1, 12),
+                   rng.randint(1, 28)),
+                dt(1900, 1, 1, rng.randint(0, 23), rng.randint(0, 59)),
+                'Dublin', 'Ireland',
+                {key: rng.choice(SIGNS) for key in SIGN_KEYS})
+            for number in range(charts)]
+
+
+def per_second(task, charts):
+    """
+    Returns how many charts a task renders a second.
+    """
+    start = time.perf_counter()
+    task()
+    return charts / (time.perf_counter() - start)
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark rendering chart reports.')
+    parser.add_argument('--charts', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    records = random_records(args.charts, args.seed)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull:
+        for renderer in RENDERERS:
+            charts = args.charts if renderer != 'rich' else SLOW_CHARTS
+            rate = per_second(lambda: write_reports(records[:charts],
+                                                    devnull, renderer),
+                              charts)
+            print(f'{renderer:<10}{rate:10.0f} reports/sec')
+
+    try:
+        from kerykeion import AstrologicalSubject, Report
+    except ImportError:
+        return
+    subjects = [AstrologicalSubject(record.name, record.date.year,
+                                    record.date.month, record.date.day,
+                                    record.minute // 60, record.minute % 60,
+                                    'Dublin', 'IE', lat=53.35, lng=-6.26,
+                                    tz_str='Europe/Dublin', online=False)
+                for record in records[:SLOW_CHARTS]]
+    rate = per_second(lambda: [Report(subject).get_full_report()
+                               for subject in subjects], SLOW_CHARTS)
+    print(f'{"kerykeion":<10}{rate:10.0f} reports/sec '
+          f'(given the AstrologicalSubject)')
+
+
+if __name__ == '__main__':
+    main()
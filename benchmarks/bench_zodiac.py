@@ -0,0 +1,81 @@
+"""
+Measures classifying birth dates into zodiac signs with zodiac.py,
+one at a time and in bulk, and checks the bulk results against
+the scalar function:
+
+    python3 benchmarks/bench_zodiac.py
+    python3 benchmarks/bench_zodiac.py --dates 10000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# The benchmarks import the app's modules from the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from zodiac import (date_sign_orders, sign_names, sign_of,  # noqa: E402
+                    sign_orders)
+
+# Birth dates are drawn from this range
+FIRST_DATE = np.datetime64('1900-01-01')
+LAST_DATE = np.datetime64('2025-01-01')
+# Dates classified one at a time, which is much slower
+SCALAR_DATES = 1000000
+
+
+def timed(task, *args):
+    """
+    Returns the result of a task and the seconds it took.
+    """
+    start = time.perf_counter()
+    result = task(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark zodiac sign classification.')
+    parser.add_argument('--dates', type=int, default=10000000,
+                        help='dates classified in bulk')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    span = int((LAST_DATE - FIRST_DATE).astype(np.int64))
+    dates = FIRST_DATE + rng.integers(0, span, args.dates)
+    month_starts = dates.astype('datetime64[M]')
+    days = ((dates - month_starts).astype(np.int64) + 1).astype(np.int8)
+    months = (month_starts.astype(np.int64) % 12 + 1).astype(np.int8)
+
+    orders, seconds = timed(sign_orders, days, months)
+    print(f'sign_orders:      {args.dates} dates in {seconds:.3f}s '
+          f'({args.dates / seconds / 1e6:.1f}M dates/sec)')
+    date_orders, seconds = timed(date_sign_orders, dates)
+    print(f'date_sign_orders: {args.dates} dates in {seconds:.3f}s '
+          f'({args.dates / seconds / 1e6:.1f}M dates/sec)')
+    names, seconds = timed(sign_names, orders)
+    print(f'sign_names:       {args.dates} orders in {seconds:.3f}s')
+
+    count = min(SCALAR_DATES, args.dates)
+    pairs = list(zip(days[:count].tolist(), months[:count].tolist()))
+    scalar, seconds = timed(lambda: [sign_of(day, month)
+                                     for day, month in pairs])
+    print(f'sign_of:          {count} dates in {seconds:.3f}s '
+          f'({count / seconds / 1e6:.1f}M dates/sec)')
+
+    # The bulk functions must agree with the one the app uses
+    assert (orders == date_orders).all()
+    assert [order for _, order in scalar] == orders[:count].tolist()
+    assert [name for name, _ in scalar] == names[:count].tolist()
+    print('All results match.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Load-tests the JSON API of server.py from many concurrent keep-alive
+connections and reports the throughput and latency percentiles:
+
+    python3 server.py --workers 4 &
+    python3 benchmarks/loadtest.py --connections 64 --duration 20
+
+It can also start the server itself for the length of the test:
+
+    python3 benchmarks/loadtest.py --start-server --workers 4
+
+Requests cycle through a mix of the endpoints. Birth charts need the
+cities dataset and horoscopes are fetched from horoscope.com the
+first time, so run `python3 horoscopes.py warm` beforehand or
+choose the endpoints with --paths.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ('/horoscope?date=20/06/1990&timeframe=Daily',
+         '/birth-chart?name=Gerry&date=20/06/1990&time=14:30'
+         '&city=Dublin&country=Ireland',
+         '/compatibility?date1=20/06/1990&date2=01/01/1992',
+         '/health')
+
+
+async def client(host, port, paths, deadline, latencies, statuses):
+    """
+    Sends requests one after the other on a keep-alive connection
+    until the deadline.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path in paths:
+            if time.perf_counter() >= deadline:
+                break
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n'
+                         .encode('latin-1'))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            length = 0
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[int(lines[0].split(' ')[1])] += 1
+    finally:
+        writer.close()
+
+
+async def load_test(url, connections, duration, paths):
+    """
+    Runs the clients and returns the latencies and statuses.
+    """
+    address = urlsplit(url)
+    deadline = time.perf_counter() + duration
+    latencies, statuses = [], Counter()
+    clients = [client(address.hostname, address.port,
+                      itertools.islice(itertools.cycle(paths), number,
+                                       None),
+                      deadline, latencies, statuses)
+               for number in range(connections)]
+    await asyncio.gather(*clients)
+    return latencies, statuses
+
+
+def wait_for_server(url, timeout=60):
+    """
+    Waits until the server accepts connections.
+    """
+    address = urlsplit(url)
+    deadline = time.perf_counter() + timeout
+
+    async def attempt():
+        _, writer = await asyncio.open_connection(address.hostname,
+                                                  address.port)
+        writer.close()
+
+    while True:
+        try:
+            asyncio.run(attempt())
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def main():
+    """
+    Parses the command line and runs the load test.
+    """
+    parser = argparse.ArgumentParser(
+        description='Load-test the JSON API of server.py.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--connections', type=int, default=32,
+                        help='concurrent keep-alive connections')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds the test runs')
+    parser.add_argument('--paths', nargs='+', default=PATHS,
+                        help='paths and query strings requested in turn')
+    parser.add_argument('--start-server', action='store_true',
+                        help='start server.py for the test')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='workers of the started server')
+    args = parser.parse_args()
+
+    server = None
+    if args.start_server:
+        port = str(urlsplit(args.url).port)
+        server = subprocess.Popen([sys.executable, 'server.py',
+                                   '--port', port,
+                                   '--workers', str(args.workers)],
+                                  cwd=ROOT)
+    try:
+        wait_for_server(args.url)
+        latencies, statuses = asyncio.run(load_test(
+            args.url, args.connections, args.duration, args.paths))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    if not latencies:
+        print('No responses received.')
+        sys.exit(1)
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f'{len(latencies)} requests in {args.duration:.0f}s over '
+          f'{args.connections} connections: '
+          f'{len(latencies) / args.duration:.0f} requests/sec')
+    print(f'Latency p50 {percentiles[49] * 1000:.1f}ms, '
+          f'p95 {percentiles[94] * 1000:.1f}ms, '
+          f'p99 {percentiles[98] * 1000:.1f}ms, '
+          f'max {max(latencies) * 1000:.1f}ms')
+    print('Statuses: ' + ', '.join(f'{status}: {count}' for status, count
+                                   in sorted(statuses.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures how long the terminal app takes to start, and fails when it
+takes longer than a budget, e.g. as a check before deploying:
+
+    python3 benchmarks/startup.py
+    python3 benchmarks/startup.py --runs 20 --budget 0.4
+
+Every visitor of the web terminal starts a new Python process, so this
+is the wait everyone feels first. Two things are measured on cold
+processes: the import of run.py, with `python -X importtime`, listing
+the modules it spends the most on, and the wall-clock time from
+starting `python3 run.py` in a pseudo-terminal to the menu's prompt.
+"""
+import argparse
+import os
+import pty
+import select
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Printed by questionary once the menu is ready for input
+PROMPT = b'Select an option'
+# Seconds from starting the app to its menu, and milliseconds importing
+# run.py, above which the benchmark fails
+BUDGET = 0.5
+IMPORT_BUDGET = 300
+
+
+def import_times(module='run'):
+    """
+    Imports a module in a new process with -X importtime.
+
+    Returns:
+        total (float): Milliseconds importing the module.
+        imports (list): (milliseconds, name) of the modules it imports
+        directly, the slowest first.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime',
+                             '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True,
+                            check=True)
+    total, imports = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            if name.strip() == module:
+                total = int(cumulative) / 1000
+                break
+            # Imported by another module, e.g. while Python starts
+            imports = []
+        elif depth == 1:
+            imports.append((int(cumulative) / 1000, name.strip()))
+    # The direct imports come before their importer in the output
+    return total, sorted(imports, reverse=True)
+
+
+def time_to_prompt(timeout=30):
+    """
+    Starts run.py in a pseudo-terminal and returns the seconds until
+    its menu's prompt is printed.
+    """
+    main, terminal = pty.openpty()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, 'run.py'], cwd=ROOT,
+                               stdin=terminal, stdout=terminal,
+                               stderr=terminal, close_fds=True)
+    os.close(terminal)
+    output = b''
+    try:
+        while PROMPT not in output:
+            left = timeout - (time.perf_counter() - start)
+            if left <= 0 or not select.select([main], [], [], left)[0]:
+                raise TimeoutError(f'No prompt after {timeout}s: {output!r}')
+            try:
+                chunk = os.read(main, 4096)
+            except OSError:
+                chunk = b''
+            if not chunk:
+                raise RuntimeError(f'run.py exited before its prompt: '
+                                   f'{output!r}')
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+        os.close(main)
+
+
+def main():
+    """
+    Parses the command line and runs the benchmark.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the app's start-up time.")
+    parser.add_argument('--runs', type=int, default=10,
+                        help='cold starts measured')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help='seconds to the first prompt (median)')
+    parser.add_argument('--import-budget', type=float,
+                        default=IMPORT_BUDGET,
+                        help='milliseconds importing run.py (median)')
+    parser.add_argument('--top', type=int, default=8,
+                        help='slowest imports listed')
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        total, imports = import_times()
+        totals.append(total)
+    print(f'Importing run.py: {statistics.median(totals):.0f}ms '
+          f'(median of {args.runs}), slowest direct imports of the last run:')
+    for milliseconds, name in imports[:args.top]:
+        print(f'  {name:<24}{milliseconds:8.1f}ms')
+
+    starts = [time_to_prompt() for _ in range(args.runs)]
+    print(f'Time to first prompt: median {statistics.median(starts):.3f}s, '
+          f'min {min(starts):.3f}s, max {max(starts):.3f}s')
+
+    failed = []
+    if statistics.median(starts) > args.budget:
+        failed.append(f'time to first prompt over {args.budget}s')
+    if statistics.median(totals) > args.import_budget:
+        failed.append(f'import over {args.import_budget:.0f}ms')
+    if failed:
+        print('Start-up regressed: ' + ', '.join(failed))
+        sys.exit(1)
+    print('Within budget.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Converts the compressed cities dataset into the memory-mapped format
+loaded by the app (see cities.py), working out the timezone of every
+city on the way. Run it whenever the dataset changes:
+
+    python3 build_cities.py
+
+The converted dataset is versioned and carries the checksum of every
+file, which can be checked with:
+
+    python3 build_cities.py --verify
+"""
+import argparse
+import sys
+
+from cities import DATASET_PATH, ENRICHED_PATH, STORE_PATH, CityTable
+from timezones import timezone_at
+
+
+def main():
+    """
+    Parses the command line and converts the dataset.
+    """
+    parser = argparse.ArgumentParser(
+        description='Convert the cities dataset for memory-mapping.')
+    parser.add_argument('--source', default=DATASET_PATH,
+                        help='compressed CSV dataset to convert')
+    parser.add_argument('--output', default=STORE_PATH,
+                        help='directory of the converted dataset')
+    parser.add_argument('--csv-output', default=ENRICHED_PATH,
+                        help='compressed CSV copy with normalized names '
+                             'and timezones')
+    parser.add_argument('--skip-timezones', action='store_true',
+                        help="don't work out the timezone of every city")
+    parser.add_argument('--verify', action='store_true',
+                        help='check the checksums of the converted dataset '
+                             'instead of converting it')
+    args = parser.parse_args()
+
+    if args.verify:
+        damaged = CityTable.verify(args.output)
+        for name in damaged:
+            print(f'{name} does not match its checksum')
+        sys.exit(1 if damaged else 0)
+
+    cities = CityTable.from_csv(args.source)
+    # An enriched CSV already carries its timezones
+    if cities.timezone_codes is None and not args.skip_timezones:
+        cities.add_timezones(timezone_at)
+    cities.save(args.output)
+    cities.to_csv(args.csv_output)
+    print(f'Converted {len(cities)} cities into {args.output} '
+          f'and {args.csv_output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1092 @@
+"""
+Gazetteer for the cities dataset.
+
+The birth chart needs the coordinates of the city the user was born in.
+Instead of scanning the whole dataset on every lookup, the cities are
+indexed once by their normalized name and country.
+
+The compressed CSV is converted when the app is built (see
+build_cities.py) into one numpy file per column, which are
+memory-mapped on first use, so starting the app doesn't parse the
+dataset and forked workers share the same pages.
+"""
+import bisect
+import collections
+import csv
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import unicodedata
+import zlib
+from array import array
+
+import numpy as np
+
+DATASET_PATH = os.path.join('assets', 'datasets',
+                            'compressed-cities-df.csv.gz')
+# Bump FORMAT_VERSION whenever the columns change, so the app never
+# maps a dataset converted by an older version of build_cities.py
+FORMAT_VERSION = 1
+STORE_PATH = os.path.join('assets', 'datasets', f'cities-v{FORMAT_VERSION}')
+# The same dataset as a CSV, with the normalized names and timezones
+ENRICHED_PATH = os.path.join('assets', 'datasets',
+                             f'cities-v{FORMAT_VERSION}.csv.gz')
+MANIFEST = 'manifest.json'
+
+# Columns of the converted dataset, rows are sorted by name_key,
+# then country_key, then biggest population first
+STRING_COLUMNS = ('city', 'country', 'name_key', 'country_key')
+NUMBER_COLUMNS = ('latitude', 'longitude', 'population')
+# Columns of the gazetteer: rows of each distinct name_key (a group),
+# the most populated row of each group and the hash table of groups,
+# followed by the trigram index of the groups used for suggestions
+INDEX_COLUMNS = ('group_offsets', 'group_best', 'buckets', 'group_trigrams',
+                 'trigram_keys', 'trigram_offsets', 'trigram_postings')
+
+# Timezone of each row as a code into the list of timezone names,
+# code 0 meaning unknown. They are worked out by build_cities.py,
+# so a dataset parsed from the CSV doesn't have them
+TIMEZONE_CODES = 'timezone_code'
+TIMEZONE_NAMES = 'timezone_name'
+
+# Trigrams shared by more groups than this are only used to rank
+# candidates found through rarer trigrams
+COMMON_TRIGRAM = 20000
+# Suggestions less similar than this to what the user typed are dropped
+MIN_SIMILARITY = 0.3
+
+
+
+class DatasetError(OSError):
+    """
+    Raised when the converted dataset is missing or can't be used,
+    see build_cities.py.
+    """
+
+
+CityMatch = collections.namedtuple('CityMatch',
+                                   ['city', 'country', 'population', 'row'])
+Location = collections.namedtuple('Location', ['lat', 'long', 'tz_str'])
+
+# ISO 3166-1 alpha-2 codes followed by the English names (and common
+# aliases) users are likely to type in the Country prompt; a code with
+# many aliases takes several lines
+_COUNTRY_NAMES = """
+ad Andorra
+ae United Arab Emirates|UAE
+af Afghanistan
+ag Antigua and Barbuda
+ai Anguilla
+al Albania
+am Armenia
+ao Angola
+aq Antarctica
+ar Argentina
+as American Samoa
+at Austria
+au Australia
+aw Aruba
+ax Aland Islands
+az Azerbaijan
+ba Bosnia and Herzegovina|Bosnia
+bb Barbados
+bd Bangladesh
+be Belgium
+bf Burkina Faso
+bg Bulgaria
+bh Bahrain
+bi Burundi
+bj Benin
+bl Saint Barthelemy
+bm Bermuda
+bn Brunei
+bo Bolivia
+bq Bonaire
+br Brazil|Brasil
+bs Bahamas|The Bahamas
+bt Bhutan
+bw Botswana
+by Belarus
+bz Belize
+ca Canada
+cc Cocos Islands
+cd Democratic Republic of the Congo|DR Congo|Congo Kinshasa
+cf Central African Republic
+cg Republic of the Congo|Congo|Congo Brazzaville
+ch Switzerland
+ci Ivory Coast|Cote d'Ivoire
+ck Cook Islands
+cl Chile
+cm Cameroon
+cn China
+co Colombia
+cr Costa Rica
+cu Cuba
+cv Cape Verde|Cabo Verde
+cw Curacao
+cx Christmas Island
+cy Cyprus
+cz Czech Republic|Czechia
+de Germany|Deutschland
+dj Djibouti
+dk Denmark
+dm Dominica
+do Dominican Republic
+dz Algeria
+ec Ecuador
+ee Estonia
+eg Egypt
+eh Western Sahara
+er Eritrea
+es Spain|Espana
+et Ethiopia
+fi Finland
+fj Fiji
+fk Falkland Islands
+fm Micronesia
+fo Faroe Islands
+fr France
+ga Gabon
+gb United Kingdom|UK|Great Britain|Britain
+gb England|Scotland|Wales|Northern Ireland
+gd Grenada
+ge Georgia
+gf French Guiana
+gg Guernsey
+gh Ghana
+gi Gibraltar
+gl Greenland
+gm Gambia|The Gambia
+gn Guinea
+gp Guadeloupe
+gq Equatorial Guinea
+gr Greece
+gt Guatemala
+gu Guam
+gw Guinea-Bissau
+gy Guyana
+hk Hong Kong
+hn Honduras
+hr Croatia
+ht Haiti
+hu Hungary
+id Indonesia
+ie Ireland|Republic of Ireland|Eire
+il Israel
+im Isle of Man
+in India
+iq Iraq
+ir Iran
+is Iceland
+it Italy|Italia
+je Jersey
+jm Jamaica
+jo Jordan
+jp Japan
+ke Kenya
+kg Kyrgyzstan
+kh Cambodia
+ki Kiribati
+km Comoros
+kn Saint Kitts and Nevis
+kp North Korea
+kr South Korea|Korea
+kw Kuwait
+ky Cayman Islands
+kz Kazakhstan
+la Laos
+lb Lebanon
+lc Saint Lucia
+li Liechtenstein
+lk Sri Lanka
+lr Liberia
+ls Lesotho
+lt Lithuania
+lu Luxembourg
+lv Latvia
+ly Libya
+ma Morocco
+mc Monaco
+md Moldova
+me Montenegro
+mf Saint Martin
+mg Madagascar
+mh Marshall Islands
+mk North Macedonia|Macedonia
+ml Mali
+mm Myanmar|Burma
+mn Mongolia
+mo Macau|Macao
+mp Northern Mariana Islands
+mq Martinique
+mr Mauritania
+ms Montserrat
+mt Malta
+mu Mauritius
+mv Maldives
+mw Malawi
+mx Mexico
+my Malaysia
+mz Mozambique
+na Namibia
+nc New Caledonia
+ne Niger
+nf Norfolk Island
+ng Nigeria
+ni Nicaragua
+nl Netherlands|The Netherlands|Holland
+no Norway
+np Nepal
+nr Nauru
+nu Niue
+nz New Zealand
+om Oman
+pa Panama
+pe Peru
+pf French Polynesia
+pg Papua New Guinea
+ph Philippines
+pk Pakistan
+pl Poland
+pm Saint Pierre and Miquelon
+pn Pitcairn Islands
+pr Puerto Rico
+ps Palestine
+pt Portugal
+pw Palau
+py Paraguay
+qa Qatar
+re Reunion
+ro Romania
+rs Serbia
+ru Russia|Russian Federation
+rw Rwanda
+sa Saudi Arabia
+sb Solomon Islands
+sc Seychelles
+sd Sudan
+se Sweden
+sg Singapore
+sh Saint Helena
+si Slovenia
+sj Svalbard and Jan Mayen
+sk Slovakia
+sl Sierra Leone
+sm San Marino
+sn Senegal
+so Somalia
+sr Suriname
+ss South Sudan
+st Sao Tome and Principe
+sv El Salvador
+sx Sint Maarten
+sy Syria
+sz Eswatini|Swaziland
+tc Turks and Caicos Islands
+td Chad
+tg Togo
+th Thailand
+tj Tajikistan
+tk Tokelau
+tl East Timor|Timor-Leste
+tm Turkmenistan
+tn Tunisia
+to Tonga
+tr Turkey|Turkiye
+tt Trinidad and Tobago
+tv Tuvalu
+tw Taiwan
+tz Tanzania
+ua Ukraine
+ug Uganda
+us United States|United States of America|USA|US|America
+uy Uruguay
+uz Uzbekistan
+va Vatican City|Holy See
+vc Saint Vincent and the Grenadines
+ve Venezuela
+vg British Virgin Islands
+vi US Virgin Islands
+vn Vietnam|Viet Nam
+vu Vanuatu
+wf Wallis and Futuna
+ws Samoa
+ye Yemen
+yt Mayotte
+za South Africa
+zm Zambia
+zw Zimbabwe
+"""
+
+
+def normalize_name(text):
+    """
+    Normalizes a place name so different spellings of it share one key:
+    accents are stripped, case is folded and hyphens count as spaces.
+
+    Args:
+        text (str): The place name.
+
+    Returns:
+        key (str): The normalized name.
+    """
+    if not isinstance(text, str):
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed
+                       if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().replace('-', ' ').split())
+
+
+def _build_country_codes():
+    """
+    Maps every normalized country name, alias and code to its ISO code.
+    """
+    codes = {}
+    for line in _COUNTRY_NAMES.strip().splitlines():
+        code, names = line.split(' ', 1)
+        codes[code] = code
+        for name in names.split('|'):
+            codes[normalize_name(name)] = code
+    return codes
+
+
+COUNTRY_CODES = _build_country_codes()
+
+
+def country_key(text):
+    """
+    Normalizes a country so that a name typed by the user ("Ireland")
+    and a code stored in the dataset ("IE") end up with the same key.
+
+    Args:
+        text (str): Country name or ISO code.
+
+    Returns:
+        key (str): The ISO code if the country is known,
+        otherwise its normalized name.
+    """
+    key = normalize_name(text)
+    return COUNTRY_CODES.get(key, key)
+
+
+class StringColumn:
+    """
+    Column of strings stored as one UTF-8 blob and the offsets
+    where each string starts, so it can be memory-mapped.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_strings(cls, strings):
+        """
+        Packs a list of strings into a column.
+
+        Args:
+            strings (list): The strings, one per row.
+        """
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(offsets, blob)
+
+    @classmethod
+    def load(cls, path, name):
+        """
+        Memory-maps a column saved with save().
+
+        Args:
+            path (str): Directory of the converted dataset.
+            name (str): Name of the column.
+        """
+        return cls(np.load(os.path.join(path, f'{name}.offsets.npy'),
+                           mmap_mode='r'),
+                   np.load(os.path.join(path, f'{name}.blob.npy'),
+                           mmap_mode='r'))
+
+    def save(self, path, name):
+        """
+        Saves the column as two numpy files.
+
+        Args:
+            path (str): Directory of the converted dataset.
+            name (str): Name of the column.
+        """
+        np.save(os.path.join(path, f'{name}.offsets.npy'), self.offsets)
+        np.save(os.path.join(path, f'{name}.blob.npy'), self.blob)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return bytes(self.blob[start:end]).decode('utf-8')
+
+
+def file_sha256(path):
+    """
+    Returns the SHA-256 checksum of a file.
+
+    Args:
+        path (str): The file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stable_hash(key):
+    """
+    Hashes a normalized name. Python's hash() changes between processes,
+    crc32 doesn't, so the hash table can be saved to disk.
+
+    Args:
+        key (str): The normalized name.
+    """
+    return zlib.crc32(key.encode('utf-8'))
+
+
+def trigrams(key):
+    """
+    Splits a normalized name into the trigrams used for fuzzy matching.
+    Each trigram is packed into one integer so the index can be
+    searched with numpy.
+
+    Args:
+        key (str): The normalized name.
+
+    Returns:
+        trigrams (set): The packed trigrams.
+    """
+    # Padding makes the first and last letters count as much as the rest
+    padded = f'  {key} '
+    return {(ord(padded[i]) << 42) | (ord(padded[i + 1]) << 21)
+            | ord(padded[i + 2])
+            for i in range(len(padded) - 2)}
+
+
+def build_trigram_index(group_keys):
+    """
+    Builds an inverted index from every trigram to the groups using it.
+
+    Args:
+        group_keys (list): The normalized name of each group.
+
+    Returns:
+        index (dict): The group_trigrams, trigram_keys, trigram_offsets
+        and trigram_postings columns.
+    """
+    # Used arrays instead of lists so millions of pairs stay compact
+    codes = array('q')
+    groups = array('q')
+    counts = array('H')
+    for group, key in enumerate(group_keys):
+        grams = trigrams(key)
+        codes.extend(grams)
+        groups.extend([group] * len(grams))
+        counts.append(min(len(grams), 0xffff))
+    codes = np.frombuffer(codes, dtype=np.int64)
+    groups = np.frombuffer(groups, dtype=np.int64)
+
+    order = np.lexsort((groups, codes))
+    codes = codes[order]
+    keys, starts = np.unique(codes, return_index=True)
+    return {'group_trigrams': np.frombuffer(counts, dtype=np.uint16),
+            'trigram_keys': keys,
+            'trigram_offsets': np.append(starts, len(codes)).astype(np.int64),
+            'trigram_postings': groups[order].astype(np.int32)}
+
+
+def build_index(name_keys, populations):
+    """
+    Builds the gazetteer columns for rows already sorted by name_key.
+
+    Args:
+        name_keys (list): Normalized city name of each row.
+        populations (array): Population of each row.
+
+    Returns:
+        index (dict): The group_offsets, group_best and buckets columns.
+    """
+    offsets = [0]
+    for row in range(1, len(name_keys)):
+        if name_keys[row] != name_keys[row - 1]:
+            offsets.append(row)
+    offsets.append(len(name_keys))
+    group_offsets = np.array(offsets, dtype=np.int64)
+
+    group_best = np.empty(len(offsets) - 1, dtype=np.int64)
+    for group in range(len(group_best)):
+        start, end = offsets[group], offsets[group + 1]
+        group_best[group] = start + int(np.argmax(populations[start:end]))
+
+    # Open addressing table at most half full, so probing stays short
+    size = 1 << max(4, (2 * len(group_best)).bit_length())
+    mask = size - 1
+    buckets = [-1] * size
+    for group, start in enumerate(offsets[:-1]):
+        slot = stable_hash(name_keys[start]) & mask
+        while buckets[slot] != -1:
+            slot = (slot + 1) & mask
+        buckets[slot] = group
+
+    index = {'group_offsets': group_offsets,
+             'group_best': group_best,
+             'buckets': np.array(buckets, dtype=np.int32)}
+    index.update(build_trigram_index([name_keys[start]
+                                      for start in offsets[:-1]]))
+    return index
+
+
+class Gazetteer:
+    """
+    Index of the cities dataset keyed on the normalized city name
+    and then on the country, so a lookup costs the same
+    no matter how big the dataset is.
+
+    When a name appears more than once in a country, the city
+    with the biggest population wins.
+    """
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns (dict): The name_key, country_key and index columns.
+        """
+        self.name_keys = columns['name_key']
+        self.country_keys = columns['country_key']
+        self.group_offsets = columns['group_offsets']
+        self.group_best = columns['group_best']
+        self.buckets = columns['buckets']
+
+    def __len__(self):
+        return len(self.group_best)
+
+    def find_group(self, key):
+        """
+        Finds the group of rows sharing a normalized name.
+
+        Args:
+            key (str): The normalized city name.
+
+        Returns:
+            group (int): The group number or None if the name isn't known.
+        """
+        mask = len(self.buckets) - 1
+        slot = stable_hash(key) & mask
+        while True:
+            group = int(self.buckets[slot])
+            if group < 0:
+                return None
+            if self.name_keys[int(self.group_offsets[group])] == key:
+                return group
+            slot = (slot + 1) & mask
+
+    def lookup(self, city, country=None):
+        """
+        Finds the dataset row of a city.
+
+        Args:
+            city (str): The city typed by the user.
+            country (str): The country typed by the user. Defaults to None.
+
+        Returns:
+            row (int): Position of the city in the dataset, or None
+            if the city isn't known (in the country, if one is given).
+        """
+        group = self.find_group(normalize_name(city))
+        if group is None:
+            return None
+        if country:
+            # Rows of a group are sorted by country, then population
+            start = int(self.group_offsets[group])
+            end = int(self.group_offsets[group + 1])
+            key = country_key(country)
+            row = bisect.bisect_left(range(start, end), key,
+                                     key=lambda row: self.country_keys[row])
+            if row < end - start and self.country_keys[start + row] == key:
+                return start + row
+            return None
+        return int(self.group_best[group])
+
+
+class CitySearch:
+    """
+    Suggestions for a city the user typed: names starting with it
+    for autocompletion, and names sharing the most trigrams with it
+    when it doesn't match any city because of a typo.
+
+    The groups are sorted by name, so the prefix search is a binary
+    search over them, which is the same walk a trie would do
+    without building one.
+    """
+
+    def __init__(self, columns):
+        """
+        Args:
+            columns (dict): The name_key, population and index columns.
+        """
+        self.name_keys = columns['name_key']
+        self.population = columns['population']
+        self.group_offsets = columns['group_offsets']
+        self.group_best = columns['group_best']
+        self.group_trigrams = columns['group_trigrams']
+        self.trigram_keys = columns['trigram_keys']
+        self.trigram_offsets = columns['trigram_offsets']
+        self.trigram_postings = columns['trigram_postings']
+
+    def _group_key(self, group):
+        return self.name_keys[int(self.group_offsets[group])]
+
+    def _best_rows(self, groups, limit):
+        """
+        Returns the most populated row of the biggest groups.
+        """
+        rows = np.asarray(self.group_best[groups])
+        populations = np.asarray(self.population[rows])
+        if len(rows) > limit:
+            top = np.argpartition(-populations, limit)[:limit]
+            rows, populations = rows[top], populations[top]
+        return [int(row) for row in rows[np.argsort(-populations,
+                                                    kind='stable')]]
+
+    def complete(self, prefix, limit=5):
+        """
+        Finds the most populated cities whose name starts with a prefix.
+
+        Args:
+            prefix (str): What the user typed so far.
+            limit (int): Number of rows returned. Defaults to 5.
+
+        Returns:
+            rows (list): Matching dataset rows, biggest city first.
+        """
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        groups = range(len(self.group_best))
+        start = bisect.bisect_left(groups, key, key=self._group_key)
+        end = bisect.bisect_left(groups, key + '\U0010ffff',
+                                 lo=start, key=self._group_key)
+        return self._best_rows(np.arange(start, end), limit)
+
+    def suggest(self, query, limit=5):
+        """
+        Finds the cities whose name is the most similar to the query,
+        so a typo still finds the city the user meant.
+
+        Args:
+            query (str): The city typed by the user.
+            limit (int): Number of rows returned. Defaults to 5.
+
+        Returns:
+            rows (list): Matching dataset rows, most similar first.
+        """
+        query_grams = trigrams(normalize_name(query))
+        codes = np.fromiter(query_grams, dtype=np.int64)
+        positions = np.searchsorted(self.trigram_keys, codes)
+
+        postings = []
+        for position, code in zip(positions, codes):
+            if (position < len(self.trigram_keys)
+                    and self.trigram_keys[position] == code):
+                start = self.trigram_offsets[position]
+                end = self.trigram_offsets[position + 1]
+                postings.append(self.trigram_postings[start:end])
+        if not postings:
+            return []
+        postings.sort(key=len)
+        rare = [posting for number, posting in enumerate(postings)
+                if number < 2 or len(posting) <= COMMON_TRIGRAM]
+        common = postings[len(rare):]
+
+        # Candidates are found through the rare trigrams only, then the
+        # common ones are counted too, so a name made of common trigrams
+        # isn't judged less similar than it is
+        groups, shared = np.unique(np.concatenate(rare), return_counts=True)
+        for posting in common:
+            # Postings are sorted by group
+            found = np.searchsorted(posting, groups)
+            found[found == len(posting)] = 0
+            shared += posting[found] == groups
+
+        # Groups are ranked by how similar their whole name is
+        # (Jaccard index of the trigram sets), then by population
+        similarity = shared / (len(query_grams) - shared
+                               + self.group_trigrams[groups])
+        keep = similarity >= MIN_SIMILARITY
+        groups, similarity = groups[keep], similarity[keep]
+        if len(groups) > limit * 10:
+            top = np.argpartition(-similarity, limit * 10)[:limit * 10]
+            groups, similarity = groups[top], similarity[top]
+        rows = np.asarray(self.group_best[groups])
+        order = np.lexsort((-np.asarray(self.population[rows]), -similarity))
+        return [int(row) for row in rows[order[:limit]]]
+
+
+class CityTable:
+    """
+    The cities dataset stored column by column.
+    """
+
+    def __init__(self, columns, manifest=None):
+        """
+        Args:
+            columns (dict): Every column of STRING_COLUMNS,
+                NUMBER_COLUMNS and INDEX_COLUMNS.
+            manifest (dict): Version and checksums of the converted
+                dataset or of its source. Defaults to None.
+        """
+        self.columns = columns
+        self.manifest = manifest or {}
+        self.city = columns['city']
+        self.country = columns['country']
+        self.latitude = columns['latitude']
+        self.longitude = columns['longitude']
+        self.population = columns['population']
+        self.timezone_codes = columns.get(TIMEZONE_CODES)
+        self.timezone_names = columns.get(TIMEZONE_NAMES)
+        self.gazetteer = Gazetteer(columns)
+        self.search = CitySearch(columns)
+
+    def __len__(self):
+        return len(self.latitude)
+
+    @classmethod
+    def from_csv(cls, path=DATASET_PATH):
+        """
+        Parses a compressed CSV dataset and builds every column in memory.
+        Timezones are kept if the CSV has them (see to_csv()).
+
+        Args:
+            path (str): The compressed CSV dataset.
+                Defaults to DATASET_PATH.
+        """
+        cities, countries, latitudes, longitudes, populations = (
+            [], [], [], [], [])
+        timezones = []
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+            for record in csv.DictReader(file):
+                # AccentCity keeps the spelling users know, when it exists
+                cities.append(record.get('AccentCity') or record['City'])
+                countries.append(record.get('Country') or '')
+                latitudes.append(float(record['Latitude']))
+                longitudes.append(float(record['Longitude']))
+                population = record.get('Population') or ''
+                populations.append(int(float(population))
+                                   if population else -1)
+                if 'Timezone' in record:
+                    timezones.append(record['Timezone'])
+
+        name_keys = [normalize_name(city) for city in cities]
+        country_keys = [country_key(country) for country in countries]
+        order = sorted(range(len(cities)),
+                       key=lambda row: (name_keys[row],
+                                        country_keys[row],
+                                        -populations[row]))
+
+        columns = {'city': [cities[row] for row in order],
+                   'country': [countries[row] for row in order],
+                   'name_key': [name_keys[row] for row in order],
+                   'country_key': [country_keys[row] for row in order],
+                   'latitude': np.array(latitudes)[order],
+                   'longitude': np.array(longitudes)[order],
+                   'population': np.array(populations,
+                                          dtype=np.int64)[order]}
+        columns.update(build_index(columns['name_key'],
+                                   columns['population']))
+        cities = cls(columns, {'source': os.path.basename(path),
+                               'source_sha256': file_sha256(path)})
+        if timezones:
+            cities.set_timezones([timezones[row] for row in order])
+        return cities
+
+    @classmethod
+    def load(cls, path=STORE_PATH):
+        """
+        Memory-maps a dataset converted with save().
+        Nothing is read until a row is used, so only the version
+        and the size of each file are checked (see verify()).
+
+        Args:
+            path (str): Directory of the converted dataset.
+                Defaults to STORE_PATH.
+
+        Raises:
+            ValueError: If the dataset was converted by another
+            version or some of its files are missing or truncated.
+        """
+        try:
+            with open(os.path.join(path, MANIFEST), encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError) as e:
+            raise ValueError(f'{path} has no valid manifest: {e}')
+        if manifest.get('version') != FORMAT_VERSION:
+            raise ValueError(f'{path} was converted for version '
+                             f'{manifest.get("version")}, '
+                             f'not {FORMAT_VERSION}.')
+        for name, details in manifest['files'].items():
+            file_path = os.path.join(path, name)
+            if (not os.path.exists(file_path)
+                    or os.path.getsize(file_path) != details['size']):
+                raise ValueError(f'{file_path} is missing or truncated.')
+
+        columns = {name: StringColumn.load(path, name)
+                   for name in STRING_COLUMNS}
+        for name in NUMBER_COLUMNS + INDEX_COLUMNS:
+            columns[name] = np.load(os.path.join(path, f'{name}.npy'),
+                                    mmap_mode='r')
+        if f'{TIMEZONE_CODES}.npy' in manifest['files']:
+            columns[TIMEZONE_CODES] = np.load(
+                os.path.join(path, f'{TIMEZONE_CODES}.npy'), mmap_mode='r')
+            columns[TIMEZONE_NAMES] = StringColumn.load(path, TIMEZONE_NAMES)
+        return cls(columns, manifest)
+
+    def save(self, path=STORE_PATH):
+        """
+        Saves every column as numpy files in a directory,
+        with a manifest holding the format version and the checksum
+        of every file. The directory is swapped in whole,
+        so the app never maps a half-written dataset.
+
+        Args:
+            path (str): Directory of the converted dataset.
+                Defaults to STORE_PATH.
+        """
+        tmp_path = f'{path}.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in STRING_COLUMNS:
+            column = self.columns[name]
+            if not isinstance(column, StringColumn):
+                column = StringColumn.from_strings(column)
+            column.save(tmp_path, name)
+        for name in NUMBER_COLUMNS + INDEX_COLUMNS:
+            np.save(os.path.join(tmp_path, f'{name}.npy'),
+                    np.asarray(self.columns[name]))
+        if self.timezone_codes is not None:
+            np.save(os.path.join(tmp_path, f'{TIMEZONE_CODES}.npy'),
+                    np.asarray(self.timezone_codes))
+            StringColumn.from_strings(list(self.timezone_names)).save(
+                tmp_path, TIMEZONE_NAMES)
+
+        files = {name: {'size': os.path.getsize(os.path.join(tmp_path,
+                                                             name)),
+                        'sha256': file_sha256(os.path.join(tmp_path, name))}
+                 for name in sorted(os.listdir(tmp_path))}
+        manifest = {'version': FORMAT_VERSION,
+                    'rows': len(self),
+                    'source': self.manifest.get('source'),
+                    'source_sha256': self.manifest.get('source_sha256'),
+                    'files': files}
+        with open(os.path.join(tmp_path, MANIFEST), 'w',
+                  encoding='utf-8') as file:
+            json.dump(manifest, file, indent=2)
+
+        old_path = f'{path}.old'
+        if os.path.isdir(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        self.manifest = manifest
+
+    @staticmethod
+    def verify(path=STORE_PATH):
+        """
+        Checks every file of a converted dataset against the checksums
+        of its manifest. This reads the whole dataset, so the app
+        doesn't do it when loading.
+
+        Args:
+            path (str): Directory of the converted dataset.
+                Defaults to STORE_PATH.
+
+        Returns:
+            damaged (list): Names of the files that don't match.
+        """
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as file:
+            manifest = json.load(file)
+        return [name for name, details in manifest['files'].items()
+                if not os.path.exists(os.path.join(path, name))
+                or file_sha256(os.path.join(path, name)) != details['sha256']]
+
+    def to_csv(self, path=ENRICHED_PATH):
+        """
+        Writes the dataset as a compressed CSV with the normalized
+        name and the timezone of every city.
+
+        Args:
+            path (str): The compressed CSV written.
+                Defaults to ENRICHED_PATH.
+        """
+        name_keys = self.columns['name_key']
+        with gzip.open(path, 'wt', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Country', 'City', 'Population', 'Latitude',
+                             'Longitude', 'NameKey', 'Timezone'])
+            for row in range(len(self)):
+                population = int(self.population[row])
+                writer.writerow([self.country[row],
+                                 self.city[row],
+                                 population if population >= 0 else '',
+                                 float(self.latitude[row]),
+                                 float(self.longitude[row]),
+                                 name_keys[row],
+                                 self.timezone(row) or ''])
+
+    def lookup(self, city, country=None):
+        """
+        Finds the dataset row of a city, see Gazetteer.lookup().
+        """
+        return self.gazetteer.lookup(city, country)
+
+    def match(self, row):
+        """
+        Describes a row so the user can pick it.
+
+        Args:
+            row (int): Position of the city in the dataset.
+
+        Returns:
+            match (CityMatch): The name, country and population of the city.
+        """
+        population = int(self.population[row])
+        return CityMatch(self.city[row], self.country[row],
+                         population if population >= 0 else None, row)
+
+    def complete(self, prefix, limit=5):
+        """
+        Returns the biggest cities whose name starts with the prefix,
+        see CitySearch.complete().
+        """
+        return [self.match(row)
+                for row in self.search.complete(prefix, limit)]
+
+    def suggest(self, query, limit=5):
+        """
+        Returns the cities whose name is the closest to the query,
+        see CitySearch.suggest().
+        """
+        return [self.match(row)
+                for row in self.search.suggest(query, limit)]
+
+    def add_timezones(self, timezone_at):
+        """
+        Works out the timezone of every row, so a known city
+        never needs a timezone lookup.
+
+        Args:
+            timezone_at (func): Returns the timezone name of
+                a latitude and longitude, or None.
+        """
+        self.set_timezones([timezone_at(*self.coordinates(row))
+                            for row in range(len(self))])
+
+    def set_timezones(self, timezones):
+        """
+        Stores the timezone of every row as small codes.
+
+        Args:
+            timezones (list): Timezone name of each row, empty or None
+                when it isn't known.
+        """
+        codes = np.zeros(len(self), dtype=np.uint16)
+        names = {'': 0}
+        for row, tz_str in enumerate(timezones):
+            codes[row] = names.setdefault(tz_str or '', len(names))
+        self.columns[TIMEZONE_CODES] = self.timezone_codes = codes
+        self.columns[TIMEZONE_NAMES] = self.timezone_names = list(names)
+
+    def timezone(self, row):
+        """
+        Returns the timezone worked out for a row by add_timezones().
+
+        Args:
+            row (int): Position of the city in the dataset.
+
+        Returns:
+            tz_str (str): Timezone name or None if it isn't known.
+        """
+        if self.timezone_codes is None:
+            return None
+        code = int(self.timezone_codes[row])
+        return self.timezone_names[code] if code else None
+
+    def coordinates(self, row):
+        """
+        Returns the latitude and longitude of a row as floats.
+
+        Args:
+            row (int): Position of the city in the dataset.
+        """
+        return float(self.latitude[row]), float(self.longitude[row])
+
+    def location(self, row):
+        """
+        Returns everything a birth chart needs to know about a row.
+
+        Args:
+            row (int): Position of the city in the dataset.
+
+        Returns:
+            location (Location): The latitude, the longitude and
+            the timezone (None if the dataset doesn't know it).
+        """
+        return Location(*self.coordinates(row), self.timezone(row))
+
+    def resolve(self, city, country=None):
+        """
+        Finds a city and returns its location in one indexed read.
+
+        Args:
+            city (str): The city typed by the user.
+            country (str): The country typed by the user. Defaults to None.
+
+        Returns:
+            location (Location): See location(), or None
+            if the city isn't known.
+        """
+        row = self.lookup(city, country)
+        return None if row is None else self.location(row)
+
+
+_cities = None
+
+
+def load_cities():
+    """
+    Memory-maps the converted dataset the first time it is needed.
+
+    The CSV isn't parsed instead when the converted dataset is missing:
+    sorting and indexing a few million cities takes minutes and GBs,
+    which belongs in the build (build_cities.py), not in a user's
+    session or a request.
+
+    Returns:
+        cities (CityTable): The cities dataset.
+
+    Raises:
+        DatasetError: If the dataset hasn't been converted
+        for this version of the app.
+    """
+    global _cities
+    if _cities is None:
+        if not os.path.isdir(STORE_PATH):
+            raise DatasetError(f'{STORE_PATH} is missing, convert the '
+                               f'cities dataset with: '
+                               f'python3 build_cities.py')
+        try:
+            _cities = CityTable.load(STORE_PATH)
+        except ValueError as e:
+            raise DatasetError(f'{str(e).rstrip(".")}. Convert the '
+                               f'cities dataset again with: '
+                               f'python3 build_cities.py')
+    return _cities
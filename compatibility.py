@@ -0,0 +1,279 @@
+"""
+Compatibility scores worked out locally, without asking horoscope.com.
+
+Two sun signs are scored by the angle between them, as astrologers
+read aspects: signs a trine apart (same element) get on best and signs
+a square apart worst. The 144 scores are worked out once into a 12×12
+matrix, so scoring one person against any number of others is a NumPy
+lookup.
+
+Synastry goes further and compares the planets of two birth charts:
+every planet of one chart is checked against every planet of the other
+for the major aspects, each aspect counting more the closer it is to
+exact. The comparisons are done on whole arrays of charts at once,
+which makes matching one person against thousands of candidates, or
+every pair of a cohort, a few milliseconds of work.
+"""
+import numpy as np
+
+from zodiac import SIGNS
+
+# Score of two signs by how many signs apart they are, out of 100
+SEPARATION_SCORES = (70,   # same sign
+                     45,   # semi-sextile
+                     80,   # sextile
+                     35,   # square
+                     95,   # trine
+                     40,   # quincunx
+                     60)   # opposition
+
+
+def _build_matrix():
+    """
+    Returns the score of every pair of signs, indexed by order - 1.
+    """
+    separation = np.abs(np.subtract.outer(np.arange(12), np.arange(12)))
+    separation = np.minimum(separation, 12 - separation)
+    return np.array(SEPARATION_SCORES, dtype=np.int8)[separation]
+
+
+SIGN_MATRIX = _build_matrix()
+_ORDERS = {sign: order for order, sign in enumerate(SIGNS, start=1)}
+
+# Angle, orb (degrees) and weight of the major aspects. Harmonious
+# aspects add to the score and tense ones take away from it
+ASPECTS = ((0, 8, 1.0),      # conjunction
+           (60, 6, 0.6),     # sextile
+           (90, 7, -0.6),    # square
+           (120, 8, 1.0),    # trine
+           (180, 8, -0.4))   # opposition
+# How much every planet counts, in ephemeris.PLANETS order
+PLANET_WEIGHTS = np.array([1.0,   # sun
+                           1.0,   # moon
+                           0.6,   # mercury
+                           0.9,   # venus
+                           0.9,   # mars
+                           0.4,   # jupiter
+                           0.4,   # saturn
+                           0.2,   # uranus
+                           0.2,   # neptune
+                           0.2])  # pluto
+# Harmonics kept by SynastryIndex, enough for the narrowest orb
+HARMONICS = 128
+
+
+def sign_order(sign):
+    """
+    Returns the order of a sign given by name or order.
+    """
+    return _ORDERS[sign] if isinstance(sign, str) else int(sign)
+
+
+def sign_score(sign1, sign2):
+    """
+    Returns the compatibility score of two signs.
+
+    Args:
+        sign1 (str): Name (or order) of the first sign.
+        sign2 (str): Name (or order) of the second sign.
+
+    Returns:
+        score (int): From 0 to 100.
+    """
+    return int(SIGN_MATRIX[sign_order(sign1) - 1, sign_order(sign2) - 1])
+
+
+def sign_scores(sign, candidates):
+    """
+    Scores one sign against an array of signs.
+
+    Args:
+        sign (str): Name (or order) of the sign.
+        candidates (array): Orders of the other signs (1 to 12),
+            e.g. from zodiac.sign_orders().
+
+    Returns:
+        scores (ndarray): The score of every candidate.
+    """
+    return SIGN_MATRIX[sign_order(sign) - 1, np.asarray(candidates) - 1]
+
+
+def cohort_sign_scores(orders):
+    """
+    Scores every pair of signs of a cohort.
+
+    Args:
+        orders (array): Orders of the signs (1 to 12).
+
+    Returns:
+        scores (ndarray): N×N scores, row i against column j.
+    """
+    index = np.asarray(orders) - 1
+    return SIGN_MATRIX[np.ix_(index, index)]
+
+
+def _concentrations():
+    """
+    Returns the concentration of the bump of every aspect, so that an
+    aspect counts fully when exact and about a seventh at its orb.
+    """
+    return [(np.radians(angle), (2 / np.radians(orb)) ** 2, weight)
+            for angle, orb, weight in ASPECTS]
+
+
+_BUMPS = _concentrations()
+
+
+def aspect_closeness(angles):
+    """
+    Scores the angles between planets of two charts.
+
+    Each aspect is a smooth bump (a von Mises curve) centred on its
+    exact angle and about as wide as its orb, which makes the score
+    of two charts expandable into a few harmonics (see SynastryIndex).
+
+    Args:
+        angles (array): Differences of longitudes, in degrees.
+
+    Returns:
+        scores (ndarray): The weighted closeness of every angle to
+        the aspects.
+    """
+    radians = np.radians(angles)
+    cosines, sines = np.cos(radians), np.sin(radians)
+    scores = np.zeros(np.shape(angles))
+    for angle, concentration, weight in _BUMPS:
+        cos_angle, sin_angle = np.cos(angle), np.sin(angle)
+        # cos(angle between the planets -/+ the aspect's angle)
+        scores += weight * np.exp(concentration * (
+            cosines * cos_angle + sines * sin_angle - 1))
+        if 0 < angle < np.pi:
+            scores += weight * np.exp(concentration * (
+                cosines * cos_angle - sines * sin_angle - 1))
+    return scores
+
+
+def _harmonic_coefficients(harmonics=HARMONICS, samples=4096):
+    """
+    Returns the cosine series of aspect_closeness(): its mean and the
+    coefficient of every harmonic from 1 to harmonics.
+    """
+    series = np.fft.rfft(aspect_closeness(np.arange(samples)
+                                          * 360 / samples)) / samples
+    return series[0].real, 2 * series[1:harmonics + 1].real
+
+
+def synastry_score(longitudes1, longitudes2):
+    """
+    Scores the aspects between the planets of two charts.
+
+    Args:
+        longitudes1 (array): Longitudes of the first chart's planets,
+            in ephemeris.PLANETS order (see ephemeris.planet_positions).
+        longitudes2 (array): Longitudes of the second chart's planets.
+
+    Returns:
+        score (float): Positive when the charts get on,
+        negative when they clash.
+    """
+    angles = np.subtract.outer(np.asarray(longitudes1, dtype=float),
+                               np.asarray(longitudes2, dtype=float))
+    return float(np.sum(np.outer(PLANET_WEIGHTS, PLANET_WEIGHTS)
+                        * aspect_closeness(angles)))
+
+
+class SynastryIndex:
+    """
+    Many charts ready to be scored against others in bulk.
+
+    The score of two charts adds up the closeness of every pair of
+    their planets, which only depends on the angle between them. As a
+    cosine series in that angle it splits into one vector per chart
+    (the weighted sines and cosines of every harmonic of its planets)
+    and the score of two charts becomes a dot product. Scoring against
+    the whole index is then one matrix product.
+    """
+
+    _mean, _coefficients = _harmonic_coefficients()
+
+    def __init__(self, longitudes):
+        """
+        Args:
+            longitudes (array): N×planets longitudes of the charts.
+        """
+        self.vectors = self.harmonics(longitudes)
+        self._weighted = self.vectors * np.tile(self._coefficients, 2)
+        self._constant = self._mean * PLANET_WEIGHTS.sum() ** 2
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @staticmethod
+    def harmonics(longitudes):
+        """
+        Returns the harmonic vector of every chart.
+
+        Args:
+            longitudes (array): N×planets longitudes of the charts.
+
+        Returns:
+            vectors (ndarray): N×(2 × HARMONICS) weighted cosines
+            and sines.
+        """
+        radians = np.radians(np.asarray(longitudes, dtype=float))
+        # e^(ik·longitude) of every harmonic, by repeated multiplication
+        steps = np.exp(1j * radians)[..., None]
+        powers = np.cumprod(np.repeat(steps, HARMONICS, axis=-1), axis=-1)
+        vector = np.einsum('p,...pk->...k', PLANET_WEIGHTS, powers)
+        return np.concatenate([vector.real, vector.imag], axis=-1)
+
+    def scores(self, longitudes):
+        """
+        Scores charts against every chart of the index.
+
+        Args:
+            longitudes (array): Longitudes of one chart's planets,
+                or M×planets longitudes of several charts.
+
+        Returns:
+            scores (ndarray): The score against every chart of the
+            index, M×N for several charts.
+        """
+        return self.harmonics(longitudes) @ self._weighted.T \
+            + self._constant
+
+    def cohort(self):
+        """
+        Scores every pair of charts of the index.
+
+        Returns:
+            scores (ndarray): N×N scores, row i against column j.
+        """
+        return self.vectors @ self._weighted.T + self._constant
+
+
+def synastry_scores(longitudes, candidates):
+    """
+    Scores one chart against many.
+
+    Args:
+        longitudes (array): Longitudes of the chart's planets.
+        candidates (array): N×planets longitudes of the other charts.
+
+    Returns:
+        scores (ndarray): The score of every candidate.
+    """
+    return SynastryIndex(candidates).scores(longitudes)
+
+
+def cohort_synastry_scores(longitudes):
+    """
+    Scores every pair of charts of a cohort.
+
+    Args:
+        longitudes (array): N×planets longitudes of the charts.
+
+    Returns:
+        scores (ndarray): N×N scores, row i against column j.
+    """
+    return SynastryIndex(longitudes).cohort()
@@ -0,0 +1,178 @@
+"""
+Planet and house signs computed straight from the Swiss Ephemeris.
+
+Kerykeion's AstrologicalSubject works out every planet, house, node and
+moon phase each time it is built. Where the app only needs the signs
+shown by zodiac_dictionary(), this module asks pyswisseph for them
+with the same settings (tropical zodiac, apparent geocentric positions,
+Placidus houses). The planets only depend on the moment of birth, not
+the place: their signs are looked up in the ingress tables (see
+ingresses.py), or outside them their positions are cached per UTC
+minute, and only the houses, which give the rising sign, are worked
+out for every chart.
+"""
+import functools
+from datetime import datetime as dt
+from importlib.util import find_spec
+from pathlib import Path
+
+import pytz
+import swisseph as swe
+
+from ingresses import load_tables
+from zodiac import SIGNS
+
+# Swiss Ephemeris numbers of the planets shown by zodiac_dictionary()
+PLANETS = {'sun': 0,
+           'moon': 1,
+           'mercury': 2,
+           'venus': 3,
+           'mars': 4,
+           'jupiter': 5,
+           'saturn': 6,
+           'uranus': 7,
+           'neptune': 8,
+           'pluto': 9}
+# Same flags and house system as Kerykeion's defaults
+FLAGS = swe.FLG_SWIEPH + swe.FLG_SPEED
+HOUSE_SYSTEM = b'P'
+# Houses can't be worked out past the polar circles,
+# Kerykeion uses these latitudes instead
+POLAR_LATITUDE = 66.0
+# Birth minutes whose planet positions are kept
+POSITIONS_CACHE_SIZE = 65536
+
+# The ephemeris files shipped with Kerykeion, found without importing it
+swe.set_ephe_path(str(Path(find_spec('kerykeion').origin).parent / 'sweph'))
+
+
+class EphemerisError(ValueError):
+    """
+    Raised when a local time doesn't exist or is ambiguous,
+    e.g. when the clocks change.
+    """
+
+
+def utc_minute(valid_date, valid_time, tz_str):
+    """
+    Converts a local date and time of birth to UTC.
+
+    Args:
+        valid_date (datetime): The date of birth.
+        valid_time (datetime): The time of birth.
+        tz_str (str): The timezone of the place of birth.
+
+    Returns:
+        minute (tuple): The UTC year, month, day, hour and minute.
+
+    Raises:
+        EphemerisError: If the local time doesn't exist
+        or happens twice in the timezone.
+    """
+    local = dt(valid_date.year, valid_date.month, valid_date.day,
+               valid_time.hour, valid_time.minute)
+    try:
+        utc = pytz.timezone(tz_str).localize(local, is_dst=None)
+    except pytz.exceptions.InvalidTimeError as e:
+        raise EphemerisError(f'{local} is ambiguous or '
+                             f'does not exist in {tz_str}: {e!r}')
+    utc = utc.astimezone(pytz.utc)
+    return utc.year, utc.month, utc.day, utc.hour, utc.minute
+
+
+def julian_day(minute):
+    """
+    Returns the Julian day of a UTC minute, as Kerykeion works it out.
+
+    Args:
+        minute (tuple): See utc_minute().
+    """
+    year, month, day, hour, minutes = minute
+    return swe.julday(year, month, day, hour + minutes / 60)
+
+
+def longitude(planet, day):
+    """
+    Returns the longitude of a planet on a Julian day.
+
+    Args:
+        planet (str): A key of PLANETS.
+        day (float): The Julian day, see julian_day().
+    """
+    # Kerykeion passes the UT Julian day to calc() rather than calc_ut(),
+    # which is followed so both give the same signs near a cusp
+    return swe.calc(day, PLANETS[planet], FLAGS)[0][0]
+
+
+@functools.lru_cache(maxsize=POSITIONS_CACHE_SIZE)
+def planet_positions(minute):
+    """
+    Returns the longitude of every planet at a UTC minute.
+
+    Args:
+        minute (tuple): See utc_minute().
+
+    Returns:
+        positions (tuple): Longitudes in PLANETS order, in degrees.
+    """
+    day = julian_day(minute)
+    return tuple(longitude(planet, day) for planet in PLANETS)
+
+
+def ascendant(minute, lat, long):
+    """
+    Returns the longitude of the first house cusp (the ascendant).
+
+    Args:
+        minute (tuple): See utc_minute().
+        lat (float): Latitude of the place of birth.
+        long (float): Longitude of the place of birth.
+    """
+    lat = max(-POLAR_LATITUDE, min(POLAR_LATITUDE, lat))
+    return swe.houses(julian_day(minute), lat, long, HOUSE_SYSTEM)[0][0]
+
+
+def sign_name(longitude):
+    """
+    Returns the name of the sign a longitude falls in.
+    """
+    return SIGNS[int(longitude // 30)]
+
+
+def chart_signs(valid_date, valid_time, lat, long, tz_str):
+    """
+    Works out the signs zodiac_dictionary() reads from a birth chart.
+
+    Args:
+        valid_date (datetime): The date of birth.
+        valid_time (datetime): The time of birth.
+        lat (float): Latitude of the place of birth.
+        long (float): Longitude of the place of birth.
+        tz_str (str): The timezone of the place of birth.
+
+    Returns:
+        signs (dict): The sign names, keyed like zodiac_dictionary().
+
+    Raises:
+        EphemerisError: See utc_minute().
+    """
+    minute = utc_minute(valid_date, valid_time, tz_str)
+    day = julian_day(minute)
+    tables = load_tables()
+    if tables is not None and tables.covers(day):
+        # A binary search per planet in the ingress tables
+        signs = {f'{planet}_sign': SIGNS[sign]
+                 for planet, sign in zip(PLANETS, tables.planet_signs(day))}
+    else:
+        positions = planet_positions(minute)
+        signs = {f'{planet}_sign': sign_name(position)
+                 for planet, position in zip(PLANETS, positions)}
+    signs['rising_sign'] = sign_name(ascendant(minute, lat, long))
+    return signs
+
+
+def cache_info():
+    """
+    Returns the hits, misses and size of the planet positions cache.
+    """
+    return planet_positions.cache_info()
@@ -0,0 +1,345 @@
+"""
+Exports the stored readings for analysis, as JSONL or Parquet:
+
+    python3 export.py --output exports
+    python3 export.py --output exports --format parquet --backend sqlite
+
+The horoscope, birth_chart and compatibility worksheets (or the local
+storage backend, see storage.py) are read a page at a time and every
+page is written out before the next one is read, so any number of
+rows is exported in the same memory. The dates and times stored as
+JSON strings ('"20/06/1990"') become real dates and times: ISO strings
+in JSONL and date and time columns in Parquet.
+
+Exports are incremental. The position of the last row exported from
+every worksheet is kept in the output directory, and the next export
+only reads the rows appended since. JSONL rows are appended to one
+file per worksheet, and every Parquet export adds a part file to the
+worksheet's directory, which Parquet readers load as one dataset.
+Writing Parquet needs pyarrow, which isn't required by the app.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from datetime import date as Date, datetime as dt, time as Time
+
+from records import SIGN_KEYS
+from storage import BACKENDS, PAGE_SIZE, WORKSHEETS, get_backend
+
+# Columns of every worksheet, in the order of run.py's rows
+COLUMNS = {'horoscope': ('name', 'date', 'sign', 'timeframe',
+                         'horoscope'),
+           'birth_chart': ('name', 'date', 'time', 'city', 'country',
+                           *SIGN_KEYS),
+           'compatibility': ('name1', 'date1', 'sign1', 'name2', 'date2',
+                             'sign2', 'text')}
+DATE_COLUMNS = frozenset({'date', 'date1', 'date2'})
+TIME_COLUMNS = frozenset({'time'})
+FORMATS = ('jsonl', 'parquet')
+STATE_FILE = 'export-state.json'
+# Dates and times kept parsed, birth dates come up again and again
+PARSED_CACHE_SIZE = 4096
+
+
+class ExportError(Exception):
+    """
+    Raised when an export can't be done.
+    """
+
+
+def _unquote(value):
+    # The dates and times were stored with json.dumps
+    if value.startswith('"'):
+        return json.loads(value)
+    return value
+
+
+@functools.lru_cache(maxsize=PARSED_CACHE_SIZE)
+def parse_date(value):
+    """
+    Returns the date of a stored '"DD/MM/YYYY"' string.
+
+    Raises:
+        ValueError: If it isn't a date.
+    """
+    return dt.strptime(_unquote(value), '%d/%m/%Y').date()
+
+
+@functools.lru_cache(maxsize=PARSED_CACHE_SIZE)
+def parse_time(value):
+    """
+    Returns the time of a stored '"HH:MM"' string.
+
+    Raises:
+        ValueError: If it isn't a time.
+    """
+    return dt.strptime(_unquote(value), '%H:%M').time()
+
+
+def normalize(worksheet, row):
+    """
+    Turns a stored row into a record with typed values.
+
+    Args:
+        worksheet (str): Name of the worksheet.
+        row (list): The row as stored.
+
+    Returns:
+        record (dict): The values keyed by COLUMNS, dates and times
+        as date and time objects and missing or empty cells as None.
+
+    Raises:
+        ValueError: If the row isn't a reading, e.g. a header row.
+    """
+    columns = COLUMNS[worksheet]
+    if not any(row):
+        raise ValueError('empty row')
+    if len(row) > len(columns):
+        raise ValueError(f'{len(row)} cells, expected {len(columns)}')
+    record = {}
+    for column, value in zip(columns, list(row) + [None] * len(columns)):
+        if value in (None, ''):
+            value = None
+        elif column in DATE_COLUMNS:
+            value = parse_date(value)
+        elif column in TIME_COLUMNS:
+            value = parse_time(value)
+        record[column] = value
+    return record
+
+
+def _json_value(value):
+    if isinstance(value, Date):
+        return value.isoformat()
+    if isinstance(value, Time):
+        return value.strftime('%H:%M')
+    return value
+
+
+class JSONLWriter:
+    """
+    Appends the records of a worksheet to its JSONL file. A file longer
+    than the state says (an export stopped before it was saved) is cut
+    back first, so no record is written twice.
+    """
+
+    def __init__(self, directory, worksheet, state):
+        self.path = os.path.join(directory, f'{worksheet}.jsonl')
+        self.file = open(self.path, 'ab')
+        self.file.truncate(state.get('size', 0))
+
+    def write(self, records):
+        self.file.write(''.join(
+            json.dumps({column: _json_value(value)
+                        for column, value in record.items()},
+                       ensure_ascii=False) + '\n'
+            for record in records).encode())
+
+    def close(self):
+        """
+        Returns the state to save for the next export.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        return {'size': os.path.getsize(self.path)}
+
+
+class ParquetWriter:
+    """
+    Writes the records of a worksheet to a new part file of its
+    Parquet dataset, one row group per page. The part only gets its
+    name once it is complete, and the parts of earlier exports are
+    removed when the state says there are none.
+    """
+
+    def __init__(self, directory, worksheet, state):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError('Writing Parquet needs pyarrow: '
+                              'pip3 install pyarrow')
+        self.pa = pa
+        types = {column: (pa.date32() if column in DATE_COLUMNS
+                          else pa.time32('s') if column in TIME_COLUMNS
+                          else pa.string())
+                 for column in COLUMNS[worksheet]}
+        self.schema = pa.schema(list(types.items()))
+        self.directory = os.path.join(directory, worksheet)
+        os.makedirs(self.directory, exist_ok=True)
+        self.part = state.get('part', 0) + 1
+        if self.part == 1:
+            for name in os.listdir(self.directory):
+                if name.startswith('part-'):
+                    os.remove(os.path.join(self.directory, name))
+        self.path = os.path.join(self.directory,
+                                 f'part-{self.part:05d}.parquet')
+        self.writer = pq.ParquetWriter(f'{self.path}.tmp', self.schema)
+        self.written = 0
+
+    def write(self, records):
+        if records:
+            self.writer.write_table(
+                self.pa.Table.from_pylist(records, schema=self.schema))
+            self.written += len(records)
+
+    def close(self):
+        """
+        Returns the state to save for the next export.
+        """
+        self.writer.close()
+        if self.written:
+            os.replace(f'{self.path}.tmp', self.path)
+            return {'part': self.part}
+        # Nothing new, no empty part
+        os.remove(f'{self.path}.tmp')
+        return {'part': self.part - 1}
+
+
+WRITERS = {'jsonl': JSONLWriter,
+           'parquet': ParquetWriter}
+
+
+def load_state(directory):
+    """
+    Returns what the previous exports to a directory have done.
+    """
+    try:
+        with open(os.path.join(directory, STATE_FILE),
+                  encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(directory, state):
+    """
+    Saves the state of the exports atomically.
+    """
+    path = os.path.join(directory, STATE_FILE)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2)
+    os.replace(f'{path}.tmp', path)
+
+
+def export_worksheet(backend, worksheet, directory, file_format='jsonl',
+                     state=None, page_size=PAGE_SIZE, errors=sys.stderr):
+    """
+    Exports the rows of a worksheet appended since the last export.
+
+    Args:
+        backend (StorageBackend): Where the rows are read from.
+        worksheet (str): Name of the worksheet.
+        directory (str): The output directory.
+        file_format (str): jsonl or parquet. Defaults to jsonl.
+        state (dict): The worksheet's state from the last export to
+            this directory. Defaults to None, exporting every row.
+        page_size (int): Rows read at once. Defaults to PAGE_SIZE.
+        errors (file): Where rows that aren't readings are reported.
+
+    Returns:
+        state (dict): The worksheet's state for the next export.
+        exported (int): Rows exported.
+        skipped (int): Rows that aren't readings.
+    """
+    state = dict(state or {})
+    if state.get('format', file_format) != file_format:
+        raise ExportError(f'{directory} has {state["format"]} exports of '
+                          f'{worksheet}, export to another directory')
+    position = state.get('position', 0)
+    writer = WRITERS[file_format](directory, worksheet, state)
+    exported = skipped = 0
+    try:
+        while True:
+            page = backend.read_rows(worksheet, position, page_size)
+            records = []
+            for position, row in page:
+                try:
+                    records.append(normalize(worksheet, row))
+                except ValueError as e:
+                    skipped += 1
+                    print(f'{worksheet} row {position} skipped: {e}',
+                          file=errors)
+            writer.write(records)
+            exported += len(records)
+            if len(page) < page_size:
+                break
+    finally:
+        written = writer.close()
+    state.update(written, format=file_format, position=position,
+                 rows=state.get('rows', 0) + exported)
+    return state, exported, skipped
+
+
+def export(directory, file_format='jsonl', backend=None,
+           worksheets=WORKSHEETS, page_size=PAGE_SIZE, full=False):
+    """
+    Exports the worksheets, picking up where the last export to the
+    directory stopped.
+
+    Args:
+        directory (str): The output directory.
+        file_format (str): jsonl or parquet. Defaults to jsonl.
+        backend (StorageBackend): Defaults to the app's backend.
+        worksheets (tuple): Defaults to every worksheet.
+        page_size (int): Rows read at once. Defaults to PAGE_SIZE.
+        full (bool): Replace the previous exports with every row.
+            Defaults to False.
+
+    Returns:
+        counts (dict): The rows exported and skipped per worksheet.
+    """
+    backend = backend or get_backend()
+    os.makedirs(directory, exist_ok=True)
+    state = {} if full else load_state(directory)
+    counts = {}
+    for worksheet in worksheets:
+        state[worksheet], exported, skipped = export_worksheet(
+            backend, worksheet, directory, file_format,
+            state.get(worksheet), page_size)
+        # Saved after every worksheet, so an interrupted export
+        # doesn't redo the ones that are done
+        save_state(directory, state)
+        counts[worksheet] = (exported, skipped)
+    return counts
+
+
+def main():
+    """
+    Parses the command line and exports the readings.
+    """
+    parser = argparse.ArgumentParser(
+        description='Export the stored readings as JSONL or Parquet.')
+    parser.add_argument('--output', default='exports',
+                        help='directory of the exported files')
+    parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    parser.add_argument('--backend', choices=BACKENDS,
+                        help="where the readings are read from, the "
+                             "app's storage backend by default")
+    parser.add_argument('--worksheets', nargs='+', choices=WORKSHEETS,
+                        default=WORKSHEETS)
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE,
+                        help='rows read at once')
+    parser.add_argument('--full', action='store_true',
+                        help='replace the previous exports with every row')
+    args = parser.parse_args()
+
+    backend = BACKENDS[args.backend]() if args.backend else None
+    start = time.perf_counter()
+    try:
+        counts = export(args.output, args.format, backend, args.worksheets,
+                        args.page_size, args.full)
+    except ExportError as e:
+        sys.exit(str(e))
+    for worksheet, (exported, skipped) in counts.items():
+        print(f'{worksheet}: {exported} rows exported, {skipped} skipped')
+    print(f'Exported to {args.output} in '
+          f'{time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Extracts the text the app shows from horoscope.com pages.
+
+Each page type has one selector: the element holding the text, whose
+first paragraph is what the app shows. Building a BeautifulSoup tree
+of the whole page just to read that paragraph is wasteful, so the page
+is fed to a small streaming parser a chunk at a time, which stops as
+soon as the paragraph has been read.
+"""
+from html.parser import HTMLParser
+
+# Page type: (tag, attribute, value) of the element holding the text
+SELECTORS = {
+    'horoscope': ('div', 'class', 'main-horoscope'),
+    'yearly': ('section', 'id', 'personal'),
+    'compatibility': ('div', 'class', 'module-skin'),
+}
+# Characters fed to the parser at a time
+CHUNK_SIZE = 8192
+
+
+class ExtractionError(ValueError):
+    """
+    Raised when a page doesn't contain the expected element,
+    usually because the site's layout changed.
+    """
+
+
+class _FirstParagraphParser(HTMLParser):
+    """
+    Collects the text of the first <p> inside the element
+    matching a selector.
+    """
+
+    def __init__(self, tag, attribute, value):
+        super().__init__(convert_charrefs=True)
+        self.tag = tag
+        self.attribute = attribute
+        self.value = value
+        # Depth of the selected element (0 until it is found)
+        # and of the paragraph inside it
+        self.depth = 0
+        self.paragraph_depth = 0
+        self.parts = []
+        self.done = False
+
+    def _matches(self, attrs):
+        for name, value in attrs:
+            if name == self.attribute and value:
+                if self.attribute == 'class':
+                    return self.value in value.split()
+                return value == self.value
+        return False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self.depth == 0:
+            if tag == self.tag and self._matches(attrs):
+                self.depth = 1
+        elif tag == 'p':
+            self.paragraph_depth += 1
+        elif tag == self.tag:
+            self.depth += 1
+
+    def handle_endtag(self, tag):
+        if self.done or self.depth == 0:
+            return
+        if tag == 'p' and self.paragraph_depth:
+            self.paragraph_depth -= 1
+            self.done = self.paragraph_depth == 0
+        elif tag == self.tag:
+            self.depth -= 1
+            # The element ends its unclosed paragraph, otherwise it had
+            # none: keep looking for another element matching the
+            # selector
+            if self.depth == 0:
+                self.done = self.paragraph_depth > 0
+
+    def handle_data(self, data):
+        if self.paragraph_depth and not self.done:
+            self.parts.append(data)
+
+
+def extract_text(html, page_type):
+    """
+    Returns the first paragraph of the element selected for
+    a page type, reading the page only as far as needed.
+
+    Args:
+        html (bytes): The page.
+        page_type (str): A key of SELECTORS.
+
+    Raises:
+        ExtractionError: If the page has no such paragraph.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+    parser = _FirstParagraphParser(*SELECTORS[page_type])
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+        if parser.done:
+            break
+    if not parser.done and not parser.parts:
+        raise ExtractionError(f'No {page_type} text found in the page.')
+    return ''.join(parser.parts)
@@ -0,0 +1,489 @@
+"""
+Horoscopes scraped from horoscope.com.
+
+A horoscope only depends on the zodiac sign and the timeframe, so once
+a page has been scraped its text is kept in a SQLite cache until the
+timeframe rolls over: daily horoscopes at local midnight, weekly ones
+on Monday, monthly ones on the 1st and yearly ones on the 1st of
+January. Just after a rollover the previous text is served for a
+little while as the new one is fetched in the background, so the
+upstream only sees one request per sign and timeframe each period.
+
+Compatibility texts never change, so all 144 pairs of signs are kept
+for good and served from memory; they can be fetched in one go with:
+
+    python3 horoscopes.py compatibility
+
+Every horoscope can also be fetched ahead of the users, a few pages at
+a time. Scheduled just after midnight (e.g. with Heroku Scheduler),
+this turns the first request of the day into a cache hit:
+
+    python3 horoscopes.py warm
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime as dt, timedelta
+
+from extraction import extract_text, ExtractionError
+from http_client import fetch, UpstreamError
+from instrumentation import count, span
+from zodiac import SIGNS
+
+BASE_URL = ('https://www.horoscope.com/us/horoscopes/general/'
+            'horoscope-general-')
+YEARLY_URL = 'https://www.horoscope.com/us/horoscopes/yearly/2024-'
+COMPATIBILITY_URL = 'https://www.horoscope.com/love/compatibility/'
+TIMEFRAMES = ('Daily', 'Weekly', 'Monthly', 'Yearly')
+
+CACHE_PATH = os.environ.get('HOROSCOPE_CACHE',
+                            os.path.join('.cache', 'horoscopes.sqlite3'))
+# How long an expired horoscope is still served while it is refreshed
+STALE_FOR = timedelta(hours=1)
+# Pages fetched at once when warming the caches, the HTTP client
+# also limits how many requests go to the same host
+WARM_WORKERS = 8
+
+
+def horoscope_url(zodiac_sign, timeframe):
+    """
+    Returns the horoscope.com page of a sign for a timeframe.
+
+    Args:
+        zodiac_sign (tuple): The zodiac name and order on the standard list.
+        timeframe (str): Daily, Weekly, Monthly or Yearly.
+    """
+    name, order = zodiac_sign
+    timeframes = {'Daily': f'{BASE_URL}daily-today.aspx?sign={order}',
+                  'Weekly': f'{BASE_URL}weekly.aspx?sign={order}',
+                  'Monthly': f'{BASE_URL}monthly.aspx?sign={order}',
+                  'Yearly': f'{YEARLY_URL}horoscope-{name}.aspx'
+                  }
+    return timeframes[timeframe]
+
+
+def parse_horoscope(html, timeframe):
+    """
+    Extracts the horoscope from a horoscope.com page.
+
+    Args:
+        html (bytes): The page.
+        timeframe (str): The timeframe of the page.
+
+    Returns:
+        horoscope_text (str): The horoscope.
+
+    Raises:
+        ExtractionError: If the page has no horoscope.
+    """
+    return extract_text(html, 'yearly' if timeframe == 'Yearly'
+                        else 'horoscope')
+
+
+def scrape_horoscope(zodiac_sign, timeframe):
+    """
+    Fetches a horoscope from horoscope.com, bypassing the cache.
+
+    Args:
+        zodiac_sign (tuple): The zodiac name and order on the standard list.
+        timeframe (str): Daily, Weekly, Monthly or Yearly.
+
+    Raises:
+        UpstreamError: If the page can't be fetched.
+    """
+    with span('horoscope.fetch'):
+        html = fetch(horoscope_url(zodiac_sign, timeframe)).content
+    with span('horoscope.parse'):
+        return parse_horoscope(html, timeframe)
+
+
+def parse_compatibility(html):
+    """
+    Extracts the compatibility text from a horoscope.com page.
+
+    Args:
+        html (bytes): The page.
+
+    Raises:
+        ExtractionError: If the page has no compatibility text.
+    """
+    return extract_text(html, 'compatibility')
+
+
+def scrape_compatibility(sign1, sign2):
+    """
+    Fetches the compatibility of two signs from horoscope.com.
+
+    Args:
+        sign1 (str): The first zodiac sign.
+        sign2 (str): The second zodiac sign.
+
+    Raises:
+        UpstreamError: If the page can't be fetched.
+    """
+    with span('compatibility.fetch'):
+        html = fetch(f'{COMPATIBILITY_URL}{sign1}-{sign2}').content
+    with span('compatibility.parse'):
+        return parse_compatibility(html)
+
+
+def expires_at(timeframe, now=None):
+    """
+    Returns when a horoscope fetched now is replaced upstream.
+
+    Args:
+        timeframe (str): Daily, Weekly, Monthly or Yearly.
+        now (datetime): Local time of the fetch. Defaults to now.
+    """
+    now = now or dt.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if timeframe == 'Daily':
+        return midnight + timedelta(days=1)
+    if timeframe == 'Weekly':
+        return midnight + timedelta(days=7 - now.weekday())
+    if timeframe == 'Monthly':
+        if now.month == 12:
+            return midnight.replace(year=now.year + 1, month=1, day=1)
+        return midnight.replace(month=now.month + 1, day=1)
+    return midnight.replace(year=now.year + 1, month=1, day=1)
+
+
+class HoroscopeCache:
+    """
+    Horoscopes kept in SQLite, so they survive restarts and
+    are shared by every process of the app.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        """
+        Args:
+            path (str): The SQLite file. Defaults to CACHE_PATH.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS horoscopes ('
+                               'sign TEXT, timeframe TEXT, text TEXT, '
+                               'expires_at REAL, '
+                               'PRIMARY KEY (sign, timeframe))')
+
+    def _connect(self):
+        # One connection per call, so the cache works from any thread
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, sign, timeframe):
+        """
+        Returns the cached horoscope and when it expires (a timestamp),
+        or None if it has never been fetched.
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                'SELECT text, expires_at FROM horoscopes '
+                'WHERE sign = ? AND timeframe = ?',
+                (sign, timeframe)).fetchone()
+
+    def put(self, sign, timeframe, text, expires):
+        """
+        Stores a horoscope until it expires (a timestamp).
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute('INSERT OR REPLACE INTO horoscopes '
+                               'VALUES (?, ?, ?, ?)',
+                               (sign, timeframe, text, expires))
+
+
+class CompatibilityStore:
+    """
+    The compatibility text of every ordered pair of signs, kept in
+    SQLite for good and in memory once loaded. Texts are only fetched
+    again after invalidate().
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        """
+        Args:
+            path (str): The SQLite file. Defaults to CACHE_PATH.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS compatibility ('
+                               'sign1 TEXT, sign2 TEXT, text TEXT, '
+                               'PRIMARY KEY (sign1, sign2))')
+            self.texts = {(sign1, sign2): text
+                          for sign1, sign2, text in connection.execute(
+                              'SELECT sign1, sign2, text FROM compatibility')}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def missing(self):
+        """
+        Returns the pairs of signs that haven't been fetched yet.
+        """
+        return [(sign1, sign2) for sign1 in SIGNS for sign2 in SIGNS
+                if (sign1, sign2) not in self.texts]
+
+    def put(self, sign1, sign2, text):
+        """
+        Stores the compatibility text of a pair of signs.
+        """
+        with self._lock:
+            with closing(self._connect()) as connection, connection:
+                connection.execute('INSERT OR REPLACE INTO compatibility '
+                                   'VALUES (?, ?, ?)', (sign1, sign2, text))
+            self.texts[(sign1, sign2)] = text
+
+    def get(self, sign1, sign2):
+        """
+        Returns the compatibility text of a pair of signs,
+        fetching it if it isn't stored yet.
+
+        Args:
+            sign1 (str): The first zodiac sign.
+            sign2 (str): The second zodiac sign.
+
+        Raises:
+            UpstreamError: If the text has to be fetched and can't be.
+        """
+        text = self.texts.get((sign1, sign2))
+        if text is None:
+            text = scrape_compatibility(sign1, sign2)
+            self.put(sign1, sign2, text)
+        return text
+
+    def prewarm(self, workers=WARM_WORKERS):
+        """
+        Fetches every pair of signs that isn't stored yet, a few at a time.
+
+        Args:
+            workers (int): Pages fetched at once. Defaults to WARM_WORKERS.
+
+        Returns:
+            failed (list): The pairs that couldn't be fetched.
+        """
+        return run_concurrently(lambda pair: self.get(*pair),
+                                self.missing(), workers)
+
+    def invalidate(self, sign1=None, sign2=None):
+        """
+        Forgets the texts of a pair of signs, or of every pair
+        involving one sign, or of every pair when no sign is given,
+        so they are fetched again.
+        """
+        with self._lock:
+            with closing(self._connect()) as connection, connection:
+                connection.execute('DELETE FROM compatibility '
+                                   'WHERE (? IS NULL OR sign1 = ?) '
+                                   'AND (? IS NULL OR sign2 = ?)',
+                                   (sign1, sign1, sign2, sign2))
+            self.texts = {pair: text for pair, text in self.texts.items()
+                          if not ((sign1 is None or pair[0] == sign1)
+                                  and (sign2 is None or pair[1] == sign2))}
+
+
+def run_concurrently(task, items, workers=WARM_WORKERS):
+    """
+    Runs a task for every item in a pool of threads.
+
+    Args:
+        task (func): Takes an item, may raise UpstreamError
+            or ExtractionError.
+        items (list): The items.
+        workers (int): Tasks run at once. Defaults to WARM_WORKERS.
+
+    Returns:
+        failed (list): The items whose task failed.
+    """
+    def attempt(item):
+        try:
+            task(item)
+        except (UpstreamError, ExtractionError):
+            return item
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [item for item in executor.map(attempt, items)
+                if item is not None]
+
+
+_cache = None
+_compatibility = None
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the horoscope cache, opening it the first time.
+    """
+    global _cache
+    if _cache is None:
+        _cache = HoroscopeCache()
+    return _cache
+
+
+def get_compatibility_store():
+    """
+    Returns the compatibility store, loading it the first time.
+    """
+    global _compatibility
+    if _compatibility is None:
+        _compatibility = CompatibilityStore()
+    return _compatibility
+
+
+def refresh_horoscope(zodiac_sign, timeframe, cache=None):
+    """
+    Scrapes a horoscope and stores it in the cache.
+
+    Args:
+        zodiac_sign (tuple): The zodiac name and order on the standard list.
+        timeframe (str): Daily, Weekly, Monthly or Yearly.
+        cache (HoroscopeCache): Defaults to the shared cache.
+
+    Returns:
+        horoscope_text (str): The horoscope.
+    """
+    cache = cache or get_cache()
+    text = scrape_horoscope(zodiac_sign, timeframe)
+    cache.put(zodiac_sign[0], timeframe, text,
+              expires_at(timeframe).timestamp())
+    return text
+
+
+def _refresh_in_background(zodiac_sign, timeframe, cache):
+    """
+    Refreshes a stale horoscope in a thread, once at a time per key.
+    """
+    key = (zodiac_sign[0], timeframe)
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh():
+        try:
+            refresh_horoscope(zodiac_sign, timeframe, cache)
+        except (UpstreamError, ExtractionError):
+            # The stale text keeps being served until a refresh works
+            pass
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def warm_horoscopes(workers=WARM_WORKERS, force=False, cache=None):
+    """
+    Fetches the horoscope of every sign for every timeframe at once
+    and stores them in the cache.
+
+    Args:
+        workers (int): Pages fetched at once. Defaults to WARM_WORKERS.
+        force (bool): Fetch horoscopes that haven't expired as well.
+            Defaults to False.
+        cache (HoroscopeCache): Defaults to the shared cache.
+
+    Returns:
+        failed (list): The (sign, timeframe) pairs that couldn't be fetched.
+    """
+    cache = cache or get_cache()
+    now = time.time()
+    pending = []
+    for order, sign in enumerate(SIGNS, start=1):
+        for timeframe in TIMEFRAMES:
+            cached = cache.get(sign, timeframe)
+            if force or not cached or cached[1] <= now:
+                pending.append(((sign, order), timeframe))
+    failed = run_concurrently(lambda item: refresh_horoscope(*item, cache),
+                              pending, workers)
+    return [(sign, timeframe) for (sign, _), timeframe in failed]
+
+
+def cached_horoscope(zodiac_sign, timeframe, cache=None):
+    """
+    Returns a horoscope from the cache, fetching it when it is missing
+    or expired. Shortly after it expires, the old text is returned
+    while it is refreshed in the background.
+
+    Args:
+        zodiac_sign (tuple): The zodiac name and order on the standard list.
+        timeframe (str): Daily, Weekly, Monthly or Yearly.
+        cache (HoroscopeCache): Defaults to the shared cache.
+
+    Returns:
+        horoscope_text (str): The horoscope.
+    """
+    cache = cache or get_cache()
+    cached = cache.get(zodiac_sign[0], timeframe)
+    now = time.time()
+    if cached:
+        text, expires = cached
+        if now < expires:
+            count('horoscope.cache_hit')
+            return text
+        if now < expires + STALE_FOR.total_seconds():
+            count('horoscope.cache_stale')
+            _refresh_in_background(zodiac_sign, timeframe, cache)
+            return text
+    count('horoscope.cache_miss')
+    try:
+        return refresh_horoscope(zodiac_sign, timeframe, cache)
+    except UpstreamError:
+        # An old horoscope is better than none while the site is down
+        if cached:
+            return cached[0]
+        raise
+
+
+def main():
+    """
+    Parses the command line and manages the caches.
+    """
+    parser = argparse.ArgumentParser(
+        description='Manage the horoscope and compatibility caches.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    compatibility = commands.add_parser(
+        'compatibility', help='fetch every missing compatibility text')
+    compatibility.add_argument('--refresh', action='store_true',
+                               help='fetch every pair again')
+    warm = commands.add_parser(
+        'warm', help='fetch every expired horoscope ahead of the users')
+    warm.add_argument('--force', action='store_true',
+                      help="fetch horoscopes that haven't expired as well")
+    for command in (compatibility, warm):
+        command.add_argument('--workers', type=int, default=WARM_WORKERS,
+                             help='pages fetched at once')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'warm':
+        failed = warm_horoscopes(args.workers, args.force)
+        print(f'Horoscopes warmed in {time.perf_counter() - start:.1f}s, '
+              f'{len(failed)} failed')
+    elif args.command == 'compatibility':
+        store = get_compatibility_store()
+        if args.refresh:
+            store.invalidate()
+        failed = store.prewarm(args.workers)
+        print(f'{len(store)} compatibility texts stored in '
+              f'{time.perf_counter() - start:.1f}s, {len(failed)} failed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Networking layer every horoscope.com scraper goes through.
+
+All requests share one pooled session, so connections are kept alive
+instead of doing a new TCP and TLS handshake for every page. Every
+request has connect and read timeouts, failed requests are retried
+with exponential backoff and jitter, and a circuit breaker per host
+fails fast once the upstream keeps failing.
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Seconds to wait for the connection and then for the response
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+# Attempts after the first one, waiting BACKOFF seconds (doubled every
+# time) plus up to JITTER seconds so clients don't retry in lockstep
+RETRIES = 2
+BACKOFF = 0.5
+JITTER = 0.25
+# Responses worth retrying, anything else is returned or raised at once
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Consecutive failed requests before the breaker opens,
+# and seconds before it lets a trial request through
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+# Connections kept alive per host
+POOL_SIZE = 10
+# Requests sent to the same host at once, however many threads ask
+MAX_PER_HOST = 4
+
+
+class UpstreamError(Exception):
+    """
+    Raised when the upstream can't be reached or keeps failing.
+    """
+
+
+class CircuitOpenError(UpstreamError):
+    """
+    Raised without sending the request while the breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after too many consecutive
+    failures, then lets one trial request through every
+    reset_timeout seconds until one succeeds.
+    """
+
+    def __init__(self,
+                 threshold=FAILURE_THRESHOLD,
+                 reset_timeout=RESET_TIMEOUT,
+                 clock=time.monotonic):
+        """
+        Args:
+            threshold (int): Consecutive failures opening the breaker.
+            reset_timeout (float): Seconds before a trial request.
+            clock (func): Returns the current time in seconds.
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def before_request(self):
+        """
+        Raises CircuitOpenError unless the request may be sent.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.clock() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('The horoscope service is '
+                                       'unavailable, try again later.')
+            # Let this request through as a trial, others keep failing
+            # fast until it comes back
+            self.opened_at = self.clock()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class HttpClient:
+    """
+    Pooled session with timeouts, retries and a breaker per host.
+    """
+
+    def __init__(self,
+                 connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT,
+                 retries=RETRIES,
+                 backoff=BACKOFF,
+                 jitter=JITTER,
+                 pool_size=POOL_SIZE,
+                 max_per_host=MAX_PER_HOST,
+                 sleep=time.sleep):
+        """
+        Args:
+            connect_timeout (float): Seconds to wait for a connection.
+            read_timeout (float): Seconds to wait for the response.
+            retries (int): Attempts after the first one.
+            backoff (float): Seconds before the first retry.
+            jitter (float): Most seconds randomly added to each wait.
+            pool_size (int): Connections kept alive per host.
+            max_per_host (int): Requests sent to a host at once.
+            sleep (func): Waits for a number of seconds.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.jitter = jitter
+        self.sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.max_per_host = max_per_host
+        self.breakers = {}
+        self.host_slots = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, url):
+        """
+        Returns the circuit breaker of the host of a URL.
+
+        Args:
+            url (str): The URL requested.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker()
+            return self.breakers[host]
+
+    def host_slot(self, url):
+        """
+        Returns the semaphore limiting the requests sent
+        to the host of a URL at once.
+
+        Args:
+            url (str): The URL requested.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(
+                    self.max_per_host)
+            return self.host_slots[host]
+
+    def get(self, url, **kwargs):
+        """
+        Sends a GET request, retrying it if it fails.
+
+        Args:
+            url (str): The URL requested.
+            **kwargs: Passed on to requests.
+
+        Returns:
+            response (Response): The response, which can still be
+            a client error (4xx) since retrying won't help those.
+
+        Raises:
+            UpstreamError: If the host can't be reached,
+            keeps failing or its breaker is open.
+        """
+        breaker = self.breaker(url)
+        breaker.before_request()
+        slot = self.host_slot(url)
+        kwargs.setdefault('timeout', self.timeout)
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.sleep(self.backoff * 2 ** (attempt - 1)
+                           + random.uniform(0, self.jitter))
+            try:
+                with slot:
+                    response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                continue
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+            error = f'{response.status_code} {response.reason}'
+
+        breaker.record_failure()
+        raise UpstreamError(f'{url} failed after '
+                            f'{self.retries + 1} attempts: {error}')
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the HttpClient shared by the whole process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+    return _client
+
+
+def fetch(url):
+    """
+    Requests a page through the shared client.
+
+    Args:
+        url (str): The URL requested.
+
+    Returns:
+        response (Response): The successful response.
+
+    Raises:
+        UpstreamError: If the page can't be fetched.
+    """
+    response = get_client().get(url)
+    try:
+        response.raise_for_status()
+    except requests.HTTPError as e:
+        raise UpstreamError(str(e))
+    return response
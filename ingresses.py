@@ -0,0 +1,339 @@
+"""
+Sign ingress tables: when every planet entered each sign between 1900
+and 2100.
+
+Most of a birth chart is which sign each planet was in, which doesn't
+need the planet's exact position: it is the last sign the planet
+entered before the moment of birth. The ingresses of every planet are
+worked out once with the Swiss Ephemeris and kept as sorted Julian
+days, so looking up a sign is a binary search. The rising sign depends
+on the place of birth and is still worked out by ephemeris.py.
+
+The tables are built (a couple of minutes) and checked against
+Kerykeion with:
+
+    python3 ingresses.py build
+    python3 ingresses.py validate --samples 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+# Bump FORMAT_VERSION whenever the tables change
+FORMAT_VERSION = 1
+TABLES_PATH = os.path.join('assets', 'datasets',
+                           f'ingresses-v{FORMAT_VERSION}.npz')
+# Julian days of 1 January 1900 and 1 January 2100 at midnight
+FIRST_DAY = 2415020.5
+LAST_DAY = 2488069.5
+# Fastest apparent motion of every planet in degrees a day, with
+# a margin; steps never go further than the nearest cusp at this speed
+MAX_SPEEDS = {'sun': 1.2,
+              'moon': 18.0,
+              'mercury': 2.6,
+              'venus': 1.5,
+              'mars': 1.0,
+              'jupiter': 0.3,
+              'saturn': 0.16,
+              'uranus': 0.09,
+              'neptune': 0.05,
+              'pluto': 0.05}
+# Shortest step in days, only taken right next to a cusp
+MIN_STEP = 1 / 24
+# Ingresses are worked out to this fraction of a day (under a millisecond)
+PRECISION = 1e-8
+
+
+class IngressTables:
+    """
+    The ingresses of every planet, as sorted Julian days and the signs
+    entered (0 for Aries to 11 for Pisces). The first entry of every
+    planet is its sign at FIRST_DAY.
+    """
+
+    def __init__(self, days, signs):
+        """
+        Args:
+            days (dict): Planet name: float64 array of Julian days.
+            signs (dict): Planet name: int8 array of signs entered.
+        """
+        self.days = days
+        self.signs = signs
+        # Same order as ephemeris.PLANETS
+        self.planets = tuple(days)
+
+    @classmethod
+    def load(cls, path=TABLES_PATH):
+        """
+        Loads the tables saved by build.
+
+        Args:
+            path (str): The .npz file. Defaults to TABLES_PATH.
+
+        Raises:
+            ValueError: If the file was made by another version.
+        """
+        with np.load(path) as tables:
+            if int(tables['version']) != FORMAT_VERSION:
+                raise ValueError(f'{path} was built by another version '
+                                 'of ingresses.py, build it again.')
+            planets = [str(planet) for planet in tables['planets']]
+            return cls({planet: tables[f'{planet}_days']
+                        for planet in planets},
+                       {planet: tables[f'{planet}_signs']
+                        for planet in planets})
+
+    def save(self, path=TABLES_PATH):
+        """
+        Saves the tables as a compressed .npz file.
+
+        Args:
+            path (str): The .npz file. Defaults to TABLES_PATH.
+        """
+        arrays = {'version': np.array(FORMAT_VERSION),
+                  'planets': np.array(self.planets)}
+        for planet in self.planets:
+            arrays[f'{planet}_days'] = self.days[planet]
+            arrays[f'{planet}_signs'] = self.signs[planet]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def covers(day):
+        """
+        Returns whether a Julian day is within the tables.
+        """
+        return FIRST_DAY <= day < LAST_DAY
+
+    def sign(self, planet, day):
+        """
+        Returns the sign of a planet on a Julian day.
+
+        Args:
+            planet (str): A key of ephemeris.PLANETS.
+            day (float): A Julian day within the tables.
+
+        Returns:
+            sign (int): 0 for Aries to 11 for Pisces.
+        """
+        days = self.days[planet]
+        return int(self.signs[planet][np.searchsorted(days, day,
+                                                      'right') - 1])
+
+    def signs_at(self, planet, days):
+        """
+        Returns the signs of a planet on an array of Julian days.
+
+        Args:
+            planet (str): A key of ephemeris.PLANETS.
+            days (array): Julian days within the tables.
+
+        Returns:
+            signs (ndarray): 0 for Aries to 11 for Pisces.
+        """
+        index = np.searchsorted(self.days[planet], days, 'right') - 1
+        return self.signs[planet][index]
+
+    def planet_signs(self, day):
+        """
+        Returns the sign of every planet on a Julian day.
+
+        Args:
+            day (float): A Julian day within the tables.
+
+        Returns:
+            signs (tuple): Signs in ephemeris.PLANETS order.
+        """
+        return tuple(self.sign(planet, day) for planet in self.planets)
+
+
+_tables = None
+
+
+def load_tables():
+    """
+    Loads the tables the first time they are needed.
+
+    Returns:
+        tables (IngressTables): The tables, or None if they haven't
+        been built, in which case the ephemeris is used instead.
+    """
+    global _tables
+    if _tables is None:
+        try:
+            _tables = IngressTables.load()
+        except (OSError, ValueError, KeyError):
+            _tables = False
+    return _tables or None
+
+
+def find_ingresses(planet, first_day=FIRST_DAY, last_day=LAST_DAY):
+    """
+    Works out every ingress of a planet with the Swiss Ephemeris.
+
+    Args:
+        planet (str): A key of ephemeris.PLANETS.
+        first_day (float): Julian day the table starts.
+        last_day (float): Julian day the table ends.
+
+    Returns:
+        days (ndarray): Julian days of the ingresses, starting
+        with first_day.
+        signs (ndarray): The signs entered.
+    """
+    # Imported here, looking signs up doesn't need pyswisseph
+    from ephemeris import longitude
+
+    max_speed = MAX_SPEEDS[planet]
+    day = first_day
+    position = longitude(planet, day)
+    sign = int(position // 30)
+    days, signs = [day], [sign]
+    while day < last_day:
+        offset = position % 30
+        step = max(min(offset, 30 - offset) / max_speed, MIN_STEP)
+        next_day = min(day + step, last_day)
+        next_position = longitude(planet, next_day)
+        if int(next_position // 30) == sign:
+            day, position = next_day, next_position
+            continue
+        # Narrow down the moment the sign changed
+        before, after = day, next_day
+        while after - before > PRECISION:
+            middle = (before + after) / 2
+            if int(longitude(planet, middle) // 30) == sign:
+                before = middle
+            else:
+                after = middle
+        day, position = after, longitude(planet, after)
+        sign = int(position // 30)
+        days.append(day)
+        signs.append(sign)
+    return np.array(days), np.array(signs, dtype=np.int8)
+
+
+def build(path=TABLES_PATH):
+    """
+    Works out the ingresses of every planet and saves them.
+
+    Args:
+        path (str): The .npz file. Defaults to TABLES_PATH.
+
+    Returns:
+        tables (IngressTables): The tables saved.
+    """
+    from ephemeris import PLANETS
+
+    days, signs = {}, {}
+    for planet in PLANETS:
+        start = time.perf_counter()
+        days[planet], signs[planet] = find_ingresses(planet)
+        print(f'{planet}: {len(days[planet]) - 1} ingresses '
+              f'in {time.perf_counter() - start:.1f}s')
+    tables = IngressTables(days, signs)
+    tables.save(path)
+    return tables
+
+
+def random_minute(rng):
+    """
+    Returns a random UTC minute within the tables.
+    """
+    day = rng.uniform(FIRST_DAY, LAST_DAY - 1)
+    return minute_of(day)
+
+
+def minute_of(day):
+    """
+    Returns the UTC minute a Julian day falls in.
+    """
+    import swisseph as swe
+
+    year, month, date, hours = swe.revjul(day)
+    minutes = int(round(hours * 60, 6))
+    return year, month, date, minutes // 60, minutes % 60
+
+
+def validate(tables, samples, seed=0):
+    """
+    Checks the tables against Kerykeion at random minutes and at the
+    minutes either side of random ingresses.
+
+    Args:
+        tables (IngressTables): The tables.
+        samples (int): Random minutes checked, as many
+            ingresses are checked as well.
+        seed (int): Seed of the random minutes.
+
+    Returns:
+        mismatches (list): (minute, planet, table sign, Kerykeion
+        sign) of every sign that doesn't match.
+    """
+    from kerykeion import AstrologicalSubject
+    from ephemeris import julian_day
+    from zodiac import SIGNS
+
+    rng = random.Random(seed)
+    minutes = [random_minute(rng) for _ in range(samples)]
+    for _ in range(samples):
+        planet = rng.choice(tables.planets)
+        ingress = rng.choice(tables.days[planet][1:])
+        minutes.append(minute_of(ingress - 1 / 1440))
+        minutes.append(minute_of(ingress + 1 / 1440))
+
+    mismatches = []
+    for minute in minutes:
+        year, month, day, hour, minutes_ = minute
+        chart = AstrologicalSubject('Validation', year, month, day,
+                                    hour, minutes_, lng=0.0, lat=51.48,
+                                    tz_str='UTC', online=False)
+        signs = tables.planet_signs(julian_day(minute))
+        for planet, sign in zip(tables.planets, signs):
+            expected = getattr(chart, planet).sign
+            if SIGNS[sign][:3] != expected:
+                mismatches.append((minute, planet, SIGNS[sign], expected))
+    return mismatches
+
+
+def main():
+    """
+    Parses the command line and builds or checks the tables.
+    """
+    parser = argparse.ArgumentParser(
+        description='Build and check the sign ingress tables.')
+    parser.add_argument('--path', default=TABLES_PATH,
+                        help='the .npz file of the tables')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help='work out every ingress')
+    check = commands.add_parser(
+        'validate', help='check the tables against Kerykeion')
+    check.add_argument('--samples', type=int, default=1000,
+                       help='random minutes and ingresses checked')
+    check.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        tables = build(args.path)
+        total = sum(len(days) - 1 for days in tables.days.values())
+        print(f'{total} ingresses saved in {args.path}')
+    elif args.command == 'validate':
+        mismatches = validate(IngressTables.load(args.path),
+                              args.samples, args.seed)
+        for minute, planet, sign, expected in mismatches:
+            print(f'{minute} {planet}: {sign} in the tables, '
+                  f'{expected} in Kerykeion')
+        print(f'{len(mismatches)} mismatches in '
+              f'{args.samples * 3} minutes checked')
+        sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,384 @@
+"""
+Timing spans and counters around the stages of the app.
+
+The stages are wrapped in spans, which record how long they took:
+
+    with span('horoscope.fetch'):
+        ...
+
+    @timed('generate_birth_chart')
+    def generate_birth_chart(...):
+
+and events are counted with count('horoscope.cache_hit'). Nothing is
+recorded until instrumentation is enabled, and while it is disabled a
+span costs one global lookup, so the calls stay in the code for good.
+It is enabled from the environment:
+
+    INSTRUMENT=1          keep the timings in memory (e.g. for /metrics)
+    TRACE_FILE=trace.jsonl  also write every span as one line of JSON
+    METRICS_PORT=9100     also serve the metrics over HTTP
+
+The metrics are exported as Prometheus text, with the 50th, 95th and
+99th percentiles of every stage over its last SAMPLES timings. Trace
+files, which can come from many processes, are summarized with:
+
+    python3 instrumentation.py summary trace.jsonl
+"""
+import argparse
+import atexit
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import nullcontext
+
+# Timings kept per stage for the percentiles
+SAMPLES = 4096
+QUANTILES = (0.5, 0.95, 0.99)
+# Prefix of the exported metrics
+NAMESPACE = 'astrology'
+# Spans written to the trace file in one go
+TRACE_BUFFER = 256
+
+_enabled = False
+_NULL_SPAN = nullcontext()
+
+
+class Stage:
+    """
+    The timings of one stage.
+    """
+
+    __slots__ = ('count', 'errors', 'total', 'samples')
+
+    def __init__(self, samples=SAMPLES):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=samples)
+
+    def add(self, seconds, error=False):
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def quantiles(self, quantiles=QUANTILES):
+        """
+        Returns the timings at the quantiles (nearest rank) of the
+        samples kept, all None when there are none.
+        """
+        ordered = sorted(self.samples)
+        if not ordered:
+            return [None] * len(quantiles)
+        return [ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+                for q in quantiles]
+
+    def summary(self):
+        p50, p95, p99 = self.quantiles()
+        return {'count': self.count, 'errors': self.errors,
+                'total': self.total, 'p50': p50, 'p95': p95, 'p99': p99}
+
+
+class Registry:
+    """
+    The stages and counters of the process, and the trace file.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(Stage)
+        self.counters = defaultdict(int)
+        self.trace = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, seconds, parent, error):
+        with self._lock:
+            self.stages[name].add(seconds, error)
+            if self.trace is not None:
+                self._pending.append({'name': name, 'parent': parent,
+                                      'start': start, 'seconds': seconds,
+                                      'error': error, 'pid': os.getpid(),
+                                      'thread': threading.get_ident()})
+                if len(self._pending) >= TRACE_BUFFER:
+                    self._write_trace()
+
+    def increment(self, name, value):
+        with self._lock:
+            self.counters[name] += value
+
+    def _write_trace(self):
+        self.trace.write(''.join(json.dumps(line) + '\n'
+                                 for line in self._pending))
+        self.trace.flush()
+        self._pending.clear()
+
+    def open_trace(self, path):
+        """
+        Appends the spans to a JSONL file from now on.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self.trace = open(path, 'a', encoding='utf-8')
+
+    def flush(self):
+        """
+        Writes the spans still buffered to the trace file.
+        """
+        with self._lock:
+            if self.trace is not None and self._pending:
+                self._write_trace()
+
+    def summary(self):
+        """
+        Returns the summary of every stage and the counters.
+        """
+        with self._lock:
+            return ({name: stage.summary()
+                     for name, stage in sorted(self.stages.items())},
+                    dict(sorted(self.counters.items())))
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.counters.clear()
+
+
+registry = Registry()
+# Spans buffered before a fork are the parent's to write
+os.register_at_fork(after_in_child=registry._pending.clear)
+_current = threading.local()
+
+
+class Span:
+    """
+    Times the block it wraps and records it under its name.
+    """
+
+    __slots__ = ('name', 'parent', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.parent = getattr(_current, 'name', None)
+        _current.name = self.name
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        seconds = time.perf_counter() - self.start
+        _current.name = self.parent
+        registry.record(self.name, time.time() - seconds, seconds,
+                        self.parent, kind is not None)
+        return False
+
+
+def span(name):
+    """
+    Returns a context manager timing a stage.
+
+    Args:
+        name (str): The name of the stage, e.g. 'horoscope.fetch'.
+    """
+    return Span(name) if _enabled else _NULL_SPAN
+
+
+def timed(name):
+    """
+    Decorates a function so every call is timed as a stage.
+
+    Args:
+        name (str): The name of the stage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    """
+    Adds to a counter.
+
+    Args:
+        name (str): The name of the counter, e.g. 'horoscope.cache_hit'.
+        value (int): Added to the counter. Defaults to 1.
+    """
+    if _enabled:
+        registry.increment(name, value)
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(trace_file=None):
+    """
+    Starts recording spans and counters.
+
+    Args:
+        trace_file (str): JSONL file the spans are appended to.
+            Defaults to None, keeping them in memory only.
+    """
+    global _enabled
+    if trace_file:
+        registry.open_trace(trace_file)
+        atexit.register(registry.flush)
+    _enabled = True
+
+
+def disable():
+    """
+    Stops recording, the spans buffered are written to the trace file.
+    """
+    global _enabled
+    _enabled = False
+    registry.flush()
+
+
+def _metric_name(name):
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+
+def prometheus_text():
+    """
+    Returns the metrics in the Prometheus text format: a summary of
+    the seconds of every stage and a counter for every count().
+    """
+    stages, counters = registry.summary()
+    lines = [f'# HELP {NAMESPACE}_stage_seconds Time spent in each stage.',
+             f'# TYPE {NAMESPACE}_stage_seconds summary']
+    for name, stage in stages.items():
+        label = f'stage="{name}"'
+        for quantile, key in zip(QUANTILES, ('p50', 'p95', 'p99')):
+            lines.append(f'{NAMESPACE}_stage_seconds{{{label},'
+                         f'quantile="{quantile}"}} {stage[key]:.9f}')
+        lines.append(f'{NAMESPACE}_stage_seconds_sum{{{label}}} '
+                     f'{stage["total"]:.9f}')
+        lines.append(f'{NAMESPACE}_stage_seconds_count{{{label}}} '
+                     f'{stage["count"]}')
+    lines.append(f'# TYPE {NAMESPACE}_stage_errors_total counter')
+    for name, stage in stages.items():
+        lines.append(f'{NAMESPACE}_stage_errors_total{{stage="{name}"}} '
+                     f'{stage["errors"]}')
+    for name, value in counters.items():
+        metric = f'{NAMESPACE}_{_metric_name(name)}_total'
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(port, host='127.0.0.1'):
+    """
+    Serves prometheus_text() from a background thread.
+
+    Args:
+        port (int): The port of the endpoint.
+        host (str): The address of the endpoint. Defaults to localhost.
+
+    Returns:
+        server (ThreadingHTTPServer): The server, already running.
+    """
+    # Only imported when the endpoint is asked for
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            payload = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            # The terminal belongs to the app
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def configure():
+    """
+    Enables instrumentation as the environment asks,
+    see the module's docstring.
+    """
+    trace_file = os.environ.get('TRACE_FILE')
+    port = os.environ.get('METRICS_PORT')
+    if os.environ.get('INSTRUMENT') == '1' or trace_file or port:
+        enable(trace_file)
+    if port:
+        serve_metrics(int(port))
+
+
+def summarize(lines):
+    """
+    Summarizes the spans of a trace.
+
+    Args:
+        lines (iterable): The lines of a trace file.
+
+    Returns:
+        stages (dict): The summary of every stage, like
+        Stage.summary(), over all of its spans.
+    """
+    stages = defaultdict(lambda: Stage(samples=None))
+    for line in lines:
+        if line.strip():
+            record = json.loads(line)
+            stages[record['name']].add(record['seconds'], record['error'])
+    return {name: stage.summary() for name, stage in sorted(stages.items())}
+
+
+def print_summary(stages, file=sys.stdout):
+    """
+    Prints the summary of every stage as a table, in milliseconds.
+    """
+    print(f'{"stage":<32}{"count":>8}{"errors":>8}'
+          f'{"p50":>10}{"p95":>10}{"p99":>10}', file=file)
+    for name, stage in stages.items():
+        p50, p95, p99 = (stage[key] * 1000 for key in ('p50', 'p95', 'p99'))
+        print(f'{name:<32}{stage["count"]:>8}{stage["errors"]:>8}'
+              f'{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}', file=file)
+
+
+def main():
+    """
+    Parses the command line and summarizes trace files.
+    """
+    parser = argparse.ArgumentParser(
+        description='Summarize the timings of trace files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary = commands.add_parser(
+        'summary', help='print the percentiles of every stage')
+    summary.add_argument('traces', nargs='+', help='JSONL trace files')
+    args = parser.parse_args()
+
+    def lines():
+        for path in args.traces:
+            with open(path, encoding='utf-8') as file:
+                yield from file
+
+    print_summary(summarize(lines()))
+
+
+configure()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Everything the terminal app prints goes through this module.
+
+There is one rich Console for the whole process, created the first
+time something is printed, instead of a new one (detecting the
+terminal's features and size again) for every line. A styled line is
+rendered to its escape codes once per terminal width and kept, so a
+line printed again isn't parsed and wrapped again, and a screen of
+lines can be held with screen() and written in one go.
+
+Plain output skips rich altogether: no colors, emojis or markup to
+parse, and rich isn't even imported. It is used when stdout isn't a
+terminal (e.g. piped into a file or in batch jobs), and can be forced
+on or off with PLAIN_OUTPUT=1 or PLAIN_OUTPUT=0.
+"""
+import functools
+import os
+import sys
+from contextlib import contextmanager
+
+PLAIN_OUTPUT = os.environ.get('PLAIN_OUTPUT')
+# Styled lines kept rendered
+STYLED_CACHE_SIZE = 512
+
+_console = None
+_plain = None
+_file = None
+# Plain lines held by screen(), None when they are written at once
+_held = None
+
+
+def is_plain():
+    """
+    Returns whether output is plain, see the module's docstring.
+    """
+    global _plain
+    if _plain is None:
+        if PLAIN_OUTPUT is not None:
+            _plain = PLAIN_OUTPUT == '1'
+        else:
+            _plain = not (_file or sys.stdout).isatty()
+    return _plain
+
+
+def get_console():
+    """
+    Returns the Console shared by the whole app, creating it the first
+    time.
+    """
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console(file=_file)
+    return _console
+
+
+def configure(plain=None, file=None, **options):
+    """
+    Replaces the shared console, e.g. to print somewhere else.
+
+    Args:
+        plain (bool): Plain output. Defaults to None, deciding as the
+            module's docstring says.
+        file (file): Where to print. Defaults to None, for stdout.
+        **options: Passed on to the rich Console.
+    """
+    global _console, _plain, _file
+    _plain = plain
+    _file = file
+    _console = None
+    render.cache_clear()
+    if options:
+        from rich.console import Console
+        _console = Console(file=file, **options)
+
+
+@functools.lru_cache(maxsize=STYLED_CACHE_SIZE)
+def render(text, color, emoji=None, width=None):
+    """
+    Renders a line of bold, colored text on the shared console.
+
+    Args:
+        text (str): The text, which may contain rich markup.
+        color (str): The color of the text.
+        emoji (str): The emoji displayed after it. Defaults to None.
+        width (int): The width it is wrapped at. Defaults to None,
+            for the console's.
+
+    Returns:
+        line (str): The line with its escape codes, ready to write.
+    """
+    console = get_console()
+    markup = f'[bold {color}]{text}[/]'
+    if emoji:
+        markup += f' :{emoji}:'
+    with console.capture() as capture:
+        console.print(markup, width=width)
+    return capture.get()
+
+
+def _write(line):
+    if _held is not None:
+        _held.append(line)
+        return
+    file = _file or sys.stdout
+    file.write(line)
+    file.flush()
+
+
+def echo(text, color, emoji=None):
+    """
+    Prints a line of bold, colored text, or just the text when
+    output is plain.
+
+    Args:
+        text (str): The text. Anything else, e.g. the None of a reading
+            that couldn't be fetched, is printed as rich prints it.
+        color (str): The color of the text.
+        emoji (str): The emoji displayed after it. Defaults to None.
+    """
+    if is_plain():
+        _write(f'{text}\n')
+    else:
+        _write(render(text, color, emoji, get_console().width))
+
+
+@contextmanager
+def screen():
+    """
+    Holds the lines printed inside it and writes them in one go
+    when it ends.
+    """
+    global _held
+    if _held is not None:
+        yield
+        return
+    _held = []
+    try:
+        yield
+    finally:
+        lines, _held = _held, None
+        file = _file or sys.stdout
+        file.write(''.join(lines))
+        file.flush()
@@ -0,0 +1,299 @@
+"""
+Compact records of birth charts.
+
+A chart used to be carried around as the live AstrologicalSubject, a
+dict of eleven sign names and the 16-element worksheet row. A
+ChartRecord keeps only what the worksheet stores, with the signs as one
+byte each, and turns into the worksheet row or JSON when it is saved.
+Many charts are held by a ChartTable, one NumPy column per field, for
+batch jobs that keep large result sets in memory.
+"""
+import json
+from array import array
+from datetime import date as Date, datetime as dt
+
+import numpy as np
+
+from zodiac import SIGNS
+
+# Keys of the signs, in the order of the birth_chart worksheet columns
+SIGN_KEYS = ('sun_sign', 'moon_sign', 'rising_sign', 'mercury_sign',
+             'venus_sign', 'mars_sign', 'jupiter_sign', 'saturn_sign',
+             'uranus_sign', 'neptune_sign', 'pluto_sign')
+# Keys of the planets' signs, in ephemeris.PLANETS order: the order of
+# the longitudes, so they can be scored by compatibility.SynastryIndex
+PLANET_KEYS = tuple(key for key in SIGN_KEYS if key != 'rising_sign')
+# Code of a sign Kerykeion couldn't name
+UNKNOWN = 255
+_CODES = {sign: code for code, sign in enumerate(SIGNS)}
+
+
+def sign_code(sign):
+    """
+    Returns the one-byte code of a sign name, UNKNOWN for None.
+    """
+    return _CODES.get(sign, UNKNOWN)
+
+
+def sign_name(code):
+    """
+    Returns the name of a sign code, None if it is unknown.
+    """
+    return SIGNS[code] if code < len(SIGNS) else None
+
+
+class ChartRecord:
+    """
+    The details and signs of one birth chart.
+    """
+
+    __slots__ = ('name', 'day', 'minute', 'city', 'country', 'codes',
+                 'longitudes')
+
+    def __init__(self, name, day, minute, city, country, codes,
+                 longitudes=None):
+        """
+        Args:
+            name (str): The person's name.
+            day (int): Ordinal of the date of birth.
+            minute (int): Minutes since midnight of the time of birth.
+            city (str): The city of birth.
+            country (str): The country of birth.
+            codes (bytes): The sign codes, in SIGN_KEYS order.
+            longitudes (array): Longitudes of the planets in
+                PLANET_KEYS order, in degrees. Defaults to None.
+        """
+        self.name = name
+        self.day = day
+        self.minute = minute
+        self.city = city
+        self.country = country
+        self.codes = codes
+        self.longitudes = longitudes
+
+    @classmethod
+    def from_signs(cls, name, valid_date, valid_time, city, country,
+                   signs, longitudes=None):
+        """
+        Makes a record from the arguments of save_birth_chart_data().
+
+        Args:
+            name (str): The person's name.
+            valid_date (datetime): The date of birth.
+            valid_time (datetime): The time of birth.
+            city (str): The city of birth.
+            country (str): The country of birth.
+            signs (dict): The sign names, keyed by SIGN_KEYS.
+            longitudes (tuple): The longitudes in PLANET_KEYS order,
+                as ephemeris.planet_positions() returns them.
+                Defaults to None.
+        """
+        codes = bytes(sign_code(signs[key]) for key in SIGN_KEYS)
+        if longitudes is not None:
+            longitudes = array('d', longitudes)
+        return cls(name, valid_date.toordinal(),
+                   valid_time.hour * 60 + valid_time.minute,
+                   city, country, codes, longitudes)
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Makes a record from a birth_chart worksheet row.
+
+        Args:
+            row (list): A row made by to_row().
+        """
+        name, json_date, json_time, city, country, *signs = row
+        valid_date = dt.strptime(json.loads(json_date), '%d/%m/%Y')
+        valid_time = dt.strptime(json.loads(json_time), '%H:%M')
+        return cls.from_signs(name, valid_date, valid_time, city, country,
+                              dict(zip(SIGN_KEYS, signs)))
+
+    @property
+    def date(self):
+        return Date.fromordinal(self.day)
+
+    @property
+    def time(self):
+        return dt(1900, 1, 1, self.minute // 60, self.minute % 60)
+
+    def signs(self):
+        """
+        Returns the sign names, keyed like zodiac_dictionary().
+        """
+        return {key: sign_name(code)
+                for key, code in zip(SIGN_KEYS, self.codes)}
+
+    def to_row(self):
+        """
+        Returns the row of the birth_chart worksheet.
+        """
+        hours, minutes = divmod(self.minute, 60)
+        # The date and time are stored as JSON strings in the worksheet
+        return [self.name,
+                json.dumps(self.date.strftime('%d/%m/%Y')),
+                json.dumps(f'{hours:02d}:{minutes:02d}'),
+                self.city,
+                self.country,
+                *(sign_name(code) for code in self.codes)]
+
+    def to_json(self):
+        """
+        Returns the worksheet row as one line of JSON.
+        """
+        return json.dumps(self.to_row())
+
+    def __eq__(self, other):
+        if not isinstance(other, ChartRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot)
+                   for slot in self.__slots__)
+
+    def __repr__(self):
+        return (f'ChartRecord({self.name!r}, {self.date}, '
+                f'{self.city!r}, {self.country!r})')
+
+
+class ChartTable:
+    """
+    Many chart records kept column by column: the dates, times and
+    signs in NumPy arrays, and the cities and countries as codes into
+    lists of the distinct values.
+    """
+
+    def __init__(self, capacity=1024, longitudes=False):
+        """
+        Args:
+            capacity (int): Records allocated to begin with, the
+                columns grow as records are added.
+            longitudes (bool): Keep the longitudes of the planets.
+                Defaults to False.
+        """
+        self.names = []
+        self.places = []
+        self._place_codes = {}
+        self.size = 0
+        self.days = np.zeros(capacity, dtype=np.int32)
+        self.minutes = np.zeros(capacity, dtype=np.int16)
+        self.cities = np.zeros(capacity, dtype=np.int32)
+        self.countries = np.zeros(capacity, dtype=np.int32)
+        self.codes = np.zeros((capacity, len(SIGN_KEYS)), dtype=np.uint8)
+        self.longitudes = (np.zeros((capacity, len(PLANET_KEYS)))
+                           if longitudes else None)
+
+    def __len__(self):
+        return self.size
+
+    def _place_code(self, place):
+        code = self._place_codes.get(place)
+        if code is None:
+            code = self._place_codes[place] = len(self.places)
+            self.places.append(place)
+        return code
+
+    def _grow(self):
+        capacity = max(2 * len(self.days), 1)
+        for column in ('days', 'minutes', 'cities', 'countries', 'codes',
+                       'longitudes'):
+            values = getattr(self, column)
+            if values is not None:
+                grown = np.zeros((capacity,) + values.shape[1:],
+                                 dtype=values.dtype)
+                grown[:self.size] = values[:self.size]
+                setattr(self, column, grown)
+
+    def append(self, record):
+        """
+        Adds a record to the table.
+
+        Args:
+            record (ChartRecord): The record.
+        """
+        if self.size == len(self.days):
+            self._grow()
+        row = self.size
+        self.names.append(record.name)
+        self.days[row] = record.day
+        self.minutes[row] = record.minute
+        self.cities[row] = self._place_code(record.city)
+        self.countries[row] = self._place_code(record.country)
+        self.codes[row] = np.frombuffer(record.codes, dtype=np.uint8)
+        if self.longitudes is not None and record.longitudes is not None:
+            self.longitudes[row] = record.longitudes
+        self.size += 1
+
+    def extend(self, records):
+        """
+        Adds many records to the table.
+
+        Args:
+            records (iterable): The records.
+        """
+        for record in records:
+            self.append(record)
+
+    def __getitem__(self, row):
+        """
+        Returns a record of the table.
+
+        Args:
+            row (int): Position of the record.
+        """
+        if not -self.size <= row < self.size:
+            raise IndexError(row)
+        row %= self.size
+        longitudes = (array('d', self.longitudes[row])
+                      if self.longitudes is not None else None)
+        return ChartRecord(self.names[row],
+                           int(self.days[row]),
+                           int(self.minutes[row]),
+                           self.places[self.cities[row]],
+                           self.places[self.countries[row]],
+                           self.codes[row].tobytes(),
+                           longitudes)
+
+    def __iter__(self):
+        return (self[row] for row in range(self.size))
+
+    def sign_codes(self, key):
+        """
+        Returns the codes of one sign of every record.
+
+        Args:
+            key (str): One of SIGN_KEYS.
+        """
+        return self.codes[:self.size, SIGN_KEYS.index(key)]
+
+    def nbytes(self):
+        """
+        Returns roughly how many bytes the table takes.
+        """
+        columns = (self.days, self.minutes, self.cities, self.countries,
+                   self.codes, self.longitudes)
+        strings = sum(len(value) + 49 for value in self.names + self.places)
+        return (sum(column.nbytes for column in columns
+                    if column is not None)
+                + strings + 8 * (len(self.names) + len(self.places)))
+
+    def to_jsonl(self, file):
+        """
+        Writes the worksheet row of every record as JSON lines.
+
+        Args:
+            file (file): Where the rows are written.
+        """
+        for record in self:
+            file.write(record.to_json() + '\n')
+
+    @classmethod
+    def from_jsonl(cls, file):
+        """
+        Reads the rows written by to_jsonl() or batch.py.
+
+        Args:
+            file (file): The open JSONL file.
+        """
+        table = cls()
+        table.extend(ChartRecord.from_row(json.loads(line))
+                     for line in file if line.strip())
+        return table
@@ -0,0 +1,213 @@
+"""
+Reports of birth charts rendered from a ChartRecord into a string,
+for batch jobs and the JSON API.
+
+Kerykeion's Report(chart).print_report() needs the live chart, builds
+its tables cell by cell with terminaltables and prints them, so its
+output can't be reused. The renderers here only need the record and
+return the report, without printing it:
+
+    render_json(record)   compact JSON, for machines
+    render_text(record)   an ASCII table like Kerykeion's
+    render_rich(record)   a rich table, with or without colors
+
+The rows of the text table are made once for every sign, so rendering
+a report mostly joins strings that already exist, and tens of
+thousands of text or JSON reports a second can be streamed with
+write_reports(). Rich tables take milliseconds each, they are meant
+for terminals rather than bulk jobs.
+"""
+import functools
+import io
+import json
+
+from records import PLANET_KEYS, SIGN_KEYS, UNKNOWN, sign_name
+from zodiac import SIGNS
+
+# Keys and labels of the signs, in SIGN_KEYS order
+KEYS = tuple(key[:-len('_sign')] for key in SIGN_KEYS)
+LABELS = tuple(key.capitalize() for key in KEYS)
+# Position of every sign's longitude in a record's longitudes,
+# None for the rising sign which has none
+LONGITUDES = tuple(PLANET_KEYS.index(key) if key in PLANET_KEYS else None
+                   for key in SIGN_KEYS)
+# Width the rich table is rendered at
+RICH_WIDTH = 60
+
+
+def _time(record):
+    hours, minutes = divmod(record.minute, 60)
+    return f'{hours:02d}:{minutes:02d}'
+
+
+def to_dict(record):
+    """
+    Returns the report of a chart as a dict, ready for JSON.
+
+    Args:
+        record (ChartRecord): The chart.
+
+    Returns:
+        report (dict): The person's details and sign names keyed by
+        planet ('sun', 'moon', 'rising'...), plus the longitudes of
+        the planets when the record has them.
+    """
+    report = {'name': record.name,
+              'date': record.date.isoformat(),
+              'time': _time(record),
+              'city': record.city,
+              'country': record.country,
+              'signs': dict(zip(KEYS, map(sign_name, record.codes)))}
+    if record.longitudes is not None:
+        report['longitudes'] = {
+            key[:-len('_sign')]: round(longitude, 4)
+            for key, longitude in zip(PLANET_KEYS, record.longitudes)}
+    return report
+
+
+def render_json(record):
+    """
+    Renders the report of a chart as one line of compact JSON.
+    """
+    return json.dumps(to_dict(record), ensure_ascii=False,
+                      separators=(',', ':'))
+
+
+def _border(widths):
+    return '+' + '+'.join('-' * (width + 2) for width in widths) + '+'
+
+
+def _row(cells, widths):
+    return '| ' + ' | '.join(f'{cell:<{width}}'
+                             for cell, width in zip(cells, widths)) + ' |'
+
+
+# The signs are abbreviated like Kerykeion's report, '-' when unknown
+_SIGN_CELLS = {code: sign[:3] for code, sign in enumerate(SIGNS)}
+_SIGN_CELLS[UNKNOWN] = '-'
+_WIDTHS = (max(map(len, LABELS + ('Planet',))), len('Sign'))
+_POSITION_WIDTH = len('00.00')
+_FRAME = _border(_WIDTHS)
+_HEADER = _row(('Planet', 'Sign'), _WIDTHS)
+_FRAME_POSITIONS = _border(_WIDTHS + (_POSITION_WIDTH,))
+_HEADER_POSITIONS = _row(('Planet', 'Sign', 'Pos.'),
+                         _WIDTHS + (_POSITION_WIDTH,))
+# The row of every sign of every planet, without its closing '|' so the
+# position can follow it
+_ROWS = tuple({code: _row((label, cell), _WIDTHS)[:-1]
+               for code, cell in _SIGN_CELLS.items()}
+              for label in LABELS)
+
+
+def _positions(record):
+    """
+    Returns the cell of the position in its sign of every planet,
+    in SIGN_KEYS order, '-' for the rising sign.
+    """
+    return [f'{record.longitudes[index] % 30:.2f}'
+            if index is not None else '-' for index in LONGITUDES]
+
+
+def render_text(record):
+    """
+    Renders the report of a chart as ASCII tables: the date, time and
+    place of birth, then the sign (and the position in it, when the
+    record has the longitudes) of every planet.
+    """
+    cells = (record.date.strftime('%d/%m/%Y'), _time(record),
+             f'{record.city}, {record.country}')
+    headers = ('Date', 'Time', 'Location')
+    widths = tuple(max(len(header), len(cell))
+                   for header, cell in zip(headers, cells))
+    frame = _border(widths)
+    lines = [f'+- Birth chart of {record.name} -+',
+             frame, _row(headers, widths), frame, _row(cells, widths), frame]
+    if record.longitudes is None:
+        lines += (_FRAME, _HEADER, _FRAME)
+        lines += [rows[code] + '|' for rows, code
+                  in zip(_ROWS, record.codes)]
+        lines.append(_FRAME)
+    else:
+        lines += (_FRAME_POSITIONS, _HEADER_POSITIONS, _FRAME_POSITIONS)
+        lines += [f'{rows[code]}| {position:>{_POSITION_WIDTH}} |'
+                  for rows, code, position
+                  in zip(_ROWS, record.codes, _positions(record))]
+        lines.append(_FRAME_POSITIONS)
+    return '\n'.join(lines)
+
+
+@functools.lru_cache(maxsize=8)
+def _rich_console(width, color):
+    # Only imported by the rich renderer, see output.py
+    from rich.console import Console
+    return Console(file=io.StringIO(), width=width, force_terminal=color,
+                   color_system='256' if color else None,
+                   legacy_windows=False)
+
+
+def render_rich(record, width=RICH_WIDTH, color=True):
+    """
+    Renders the report of a chart as a rich table.
+
+    Args:
+        record (ChartRecord): The chart.
+        width (int): Width of the report. Defaults to RICH_WIDTH.
+        color (bool): Include the terminal's color codes.
+            Defaults to True.
+
+    Returns:
+        report (str): The report, ready to be written to a terminal.
+    """
+    from rich.table import Table
+
+    table = Table(title=f'Birth chart of {record.name}',
+                  caption=f'{record.date.strftime("%d/%m/%Y")} '
+                          f'{_time(record)}, '
+                          f'{record.city}, {record.country}',
+                  title_style='bold deep_pink1')
+    table.add_column('Planet', style='bold #875fff')
+    table.add_column('Sign', style='#5fd700')
+    if record.longitudes is not None:
+        table.add_column('Position', justify='right')
+        for label, code, position in zip(LABELS, record.codes,
+                                         _positions(record)):
+            table.add_row(label, sign_name(code) or '-',
+                          position if position == '-' else f'{position}°')
+    else:
+        for label, code in zip(LABELS, record.codes):
+            table.add_row(label, sign_name(code) or '-')
+    console = _rich_console(width, color)
+    with console.capture() as capture:
+        console.print(table)
+    return capture.get().rstrip('\n')
+
+
+RENDERERS = {'json': render_json,
+             'text': render_text,
+             'rich': render_rich}
+# Written after every report when streaming them, the reports spanning
+# several lines are kept apart by a blank one
+SEPARATORS = {'json': '\n',
+              'text': '\n\n',
+              'rich': '\n\n'}
+
+
+def write_reports(records, file, renderer='json'):
+    """
+    Renders charts one after the other and writes them as they go,
+    a line of JSON or a report followed by a blank line each.
+
+    Args:
+        records (iterable): The ChartRecords.
+        file (file): Where the reports are written.
+        renderer (str): One of RENDERERS. Defaults to 'json'.
+
+    Returns:
+        written (int): Reports written.
+    """
+    render, end = RENDERERS[renderer], SEPARATORS[renderer]
+    written = 0
+    for record in records:
+        file.write(render(record) + end)
+        written += 1
+    return written
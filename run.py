@@ -1,52 +1,32 @@
 # Import neccesary packages for our app
+import importlib
 import textwrap
+import threading
 import shutil
 import json
-import gzip
 from datetime import datetime as dt
-import requests
-import gspread
-from google.oauth2.service_account import Credentials
-from bs4 import BeautifulSoup
-from kerykeion import AstrologicalSubject, Report, KerykeionException
-import pandas as pd
-from timezonefinder import TimezoneFinder
 import questionary
-from rich.console import Console
-
-# This section of code is borrowed from the "Love Sandwiches" project
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive"
-    ]
-
-# Define constant variables - also borrowed from "Love Sandwiches" project
-CREDS = Credentials.from_service_account_file('creds.json')
-SCOPED_CREDS = CREDS.with_scopes(SCOPE)
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CREDS)
-SHEET = GSPREAD_CLIENT.open('astrology_app')
-
-# Using gzip and pandas to open the compressed dataset and read the data
-with gzip.open('assets/datasets/compressed-cities-df.csv.gz', 'rb') as file:
-    cities_df = pd.read_csv(file)
+from instrumentation import span, timed
+from output import echo, screen
+from zodiac import sign_of
+# The modules of each feature (Kerykeion, the cities dataset, the
+# timezone finder, the scrapers, the storage backends...) are imported
+# by the flows that use them, so the menu shows up without loading them
+# and choosing Horoscope or Exit never pays for the birth chart's.
 
 
 def prettify_text(text, color, emoji=None):
     """
     Formats text with colors and emojis and displays it
-    in the terminal by using rich library.
+    in the terminal by using rich library, through the console
+    shared by the whole app (see output.py).
 
     Args:
         text (str): Text that is displayed.
         color (str): The color of the text.
         emoji (str): The emoji displayed. Defaults to None.
     """
-    console = Console()
-    if emoji:
-        console.print(f'[bold {color}]{text}[/] :{emoji}:')
-    else:
-        console.print(f'[bold {color}]{text}[/]')
+    echo(text, color, emoji)
 
 
 def warning(text):
@@ -57,41 +37,45 @@ def warning(text):
     Args:
         text (str): The text that is displayed.
     """
-    console = Console()
-    console.print(f'[bold red]{text}[/] :warning:')
+    echo(text, 'red', 'warning')
+
+
+def preload(*modules):
+    """
+    Imports modules in the background while the user answers
+    the prompts, so the flow doesn't wait for them afterwards.
+
+    Args:
+        *modules (str): The names of the modules.
+    """
+    def load():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                # The flow's own import reports it
+                return
+
+    threading.Thread(target=load, daemon=True).start()
 
 
 def start_app(message):
     """
-    Starts the app by asking the user to pick multiple options:
+    Asks the user to pick one of the options:
     Horoscope, Birth Chart, Compatibility or simply exit the app.
 
     Args:
         message (str): Message that gets printed in the terminal.
+
+    Returns:
+        option (str): The option selected, None if the prompt was
+        cancelled (e.g. with Ctrl-C).
     """
     prettify_text(message, 'purple', 'crystal_ball')
-    options = ['Horoscope', 'Birth Chart', 'Compatibility', 'Exit']
+    options = [*FLOWS, 'Exit']
 
     # Use Questionary library to provide options for a pleasant UX
-    select_option = (questionary.select('Select an option:',
-                                        choices=options).ask())
-
-    # Returns a tuple containing the option selected
-    # and the function that will initialize
-    try:
-        if select_option == 'Horoscope':
-            return 'Horoscope', horoscope()
-        elif select_option == 'Birth Chart':
-            return 'Birth Chart', birth_chart()
-        elif select_option == 'Compatibility':
-            return 'Compatibility', get_compatibility()
-        elif select_option == 'Exit':
-            prettify_text('Thank you for using AstrologyApp!',
-                          'orange1',
-                          'sparkles')
-            return None, None
-    except (TypeError, ValueError) as e:
-        warning(f'An error occured while starting the app: {e}')
+    return questionary.select('Select an option:', choices=options).ask()
 
 
 def validate_name(name):
@@ -183,24 +167,70 @@ def prompt_user_for_input(prompt, validation_func):
             warning(f'An error occured while getting input: {e}')
 
 
-def fetch_coordinates_from_dataset(city, df):
+def choose_city(city, country, cities):
     """
-    Gets the longitude and latitude from the cities-df dataset.
+    Offers the cities closest to what the user typed
+    when it doesn't match any city, e.g. because of a typo.
 
     Args:
-        city (str): The city/town where the user is born.
-        df (obj): The dataset from which the data is extracted from.
+        city (str): The city/town typed by the user.
+        country (str): The country typed by the user.
+        cities (CityTable): The cities dataset.
+
+    Returns:
+        row (int): The row of the city picked by the user,
+        or None if none of the suggestions was right.
+    """
+    from cities import country_key
+
+    suggestions = cities.suggest(city)
+    if not suggestions:
+        return None
+    # Cities in the country typed come first
+    key = country_key(country)
+    suggestions.sort(key=lambda match: match.country != key)
+
+    choices = []
+    for match in suggestions:
+        title = f'{match.city}, {match.country.upper()}'
+        if match.population:
+            title += f' (population {match.population:,})'
+        choices.append(questionary.Choice(title, value=match.row))
+    choices.append(questionary.Choice('None of these', value=None))
+
+    warning(f'{city} could not be found.')
+    # Use Questionary library to provide options for a pleasant UX
+    # The row shown is the one returned, with its country in the title
+    return questionary.select('Did you mean:', choices=choices).ask()
+
+
+def fetch_coordinates_from_dataset(city, country, cities):
     """
-    try:
-        city_data = df[df['City'].str.lower() == city.lower()]
-        # Used pandas' iloc method to extract the lat and long
-        lat = city_data.iloc[0]['Latitude']
-        long = city_data.iloc[0]['Longitude']
-        return lat, long
-    except ValueError as e:
-        warning(f'An error occured while fetching coordinates: {e}')
+    Gets the longitude and latitude from the cities-df dataset.
 
+    Args:
+        city (str): The city/town where the user is born.
+        country (str): The country where the user is born.
+        cities (CityTable): The dataset from which the data is extracted from.
 
+    Returns:
+        location (tuple): The latitude, the longitude and the timezone
+        of the city, if the dataset knows it (otherwise None).
+    """
+    # Used the gazetteer so the lookup doesn't scan the whole dataset,
+    # the country picks the right city when the name isn't unique.
+    # Only the lookup is timed, not the user picking a suggestion
+    with span('fetch_coordinates_from_dataset'):
+        row = cities.lookup(city, country)
+    if row is None:
+        row = choose_city(city, country, cities)
+    if row is None:
+        raise ValueError(f'{city}, {country} could not be found.')
+    # One indexed read gives the coordinates and the precomputed timezone
+    return cities.location(row)
+
+
+@timed('fetch_timezone')
 def fetch_timezone(lat, long):
     """
     Gets the corresponding timezone based on the coordinates given.
@@ -212,10 +242,12 @@ def fetch_timezone(lat, long):
     Returns:
         tz_str (str): Timezone name.
     """
+    from timezones import timezone_at
+
     try:
-        # Used TimezoneFinder() from timezonefinder to calculate timezone
-        tz = TimezoneFinder()
-        tz_str = tz.timezone_at(lat=lat, lng=long)
+        # Used the TimezoneFinder shared by the whole app (see timezones.py)
+        # so its polygon data isn't loaded again for every chart
+        tz_str = timezone_at(lat, long)
         if tz_str is None:
             raise ValueError(warning('Timezone not found.'))
     except ValueError as e:
@@ -227,10 +259,8 @@ def get_zodiac_sign(day, month):
     """
     Returns a tuple containing the user's zodiac sign
     and its order in the zodiac list based on the day and month inputs.
-    Inner tuple contains the corresponding
-    start months and days, end months and end days
-    respectively for each zodiac sign,
-    followed by sign name and order in its list.
+    The sign boundaries live in zodiac.py, which also classifies
+    whole arrays of dates at once.
 
     Args:
         day (int): Day of the month.
@@ -238,55 +268,27 @@ def get_zodiac_sign(day, month):
 
     Returns:
         zodiac_sign (tuple): Returns a tuple containing the zodiac name
-        and order on the standard list.
+        and order on the standard list, or 'Invalid date'.
     """
+    return sign_of(day, month)
 
-    # Validate the date within the function
-    try:
-        if not (1 <= month <= 12 and 1 <= day <= 31):
-            return 'Invalid date'
-
-        # The inspiration for this structure was from the tuple tutorial
-        # on W3Schools and a dev.to article - link in README.md
-        signs = [((3, 21, 4, 19), 'Aries', 1),
-                 ((4, 20, 5, 20), 'Taurus', 2),
-                 ((5, 21, 6, 20), 'Gemini', 3),
-                 ((6, 21, 7, 22), 'Cancer', 4),
-                 ((7, 23, 8, 22), 'Leo', 5),
-                 ((8, 23, 9, 22), 'Virgo', 6),
-                 ((9, 23, 10, 22), 'Libra', 7),
-                 ((10, 23, 11, 21), 'Scorpio', 8),
-                 ((11, 22, 12, 21), 'Sagittarius', 9),
-                 ((12, 22, 1, 19), 'Capricorn', 10),
-                 ((1, 20, 2, 18), 'Aquarius', 11),
-                 ((2, 19, 3, 20), 'Pisces', 12)
-                 ]
-
-        for (start_month, start_day, end_month, end_day), sign, order in signs:
-            if (month == start_month and day >= start_day) or (month == end_month and day <= end_day):
-                return sign, order
-    except ValueError as e:
-        warning(f'An error occured while calculating zodiac sign: {e}')
 
-
-def get_horoscope(url, timeframe):
+@timed('get_horoscope')
+def get_horoscope(zodiac_sign, timeframe):
     """
     Gets the desired horoscope and formats it
-    from the given URL based on the timeframe.
-    This function was created using the BeautifulSoup4 library.
+    based on the zodiac sign and the timeframe.
+    The horoscope is scraped from horoscope.com and cached
+    until the timeframe rolls over (see horoscopes.py).
 
     Args:
-        url (str): The URL BeautifulSoup needs to request information from.
+        zodiac_sign (tuple): The zodiac name and order on the standard list.
         timeframe (str): The timeframe the user chooses for their horoscope.
     """
+    from horoscopes import cached_horoscope
+
     try:
-        # Used BeautifulSoup and requests code to scrap data and display it
-        # credits to W3Resources article and BeautifulSoup4 documentation
-        soup = BeautifulSoup(requests.get(url).content, 'html.parser')
-        if timeframe == 'Yearly':
-            horoscope_text = soup.find('section', id='personal').p.text
-        else:
-            horoscope_text = soup.find('div', class_='main-horoscope').p.text
+        horoscope_text = cached_horoscope(zodiac_sign, timeframe)
         # This line of code was taken and adapted
         # from a StackOverflow forum page link in README.md
         format_text = textwrap.fill(horoscope_text,
@@ -301,10 +303,13 @@ def horoscope():
     Takes input from the user, validates it and returns the user's
     zodiac sign and horoscope for the desired timeframe.
     """
-    prettify_text('Please enter your first name and date of birth.\n',
-                  '#875fff')
-    prettify_text('Example:\n Name: Gerry \n Date of Birth: 20/06/1990\n',
-                  '#875fff')
+    preload('horoscopes')
+    with screen():
+        prettify_text('Please enter your first name and date of birth.\n',
+                      '#875fff')
+        prettify_text('Example:\n Name: Gerry \n '
+                      'Date of Birth: 20/06/1990\n',
+                      '#875fff')
 
     name = prompt_user_for_input('\nName:\n', validate_name)
     birth_date = prompt_user_for_input('\nDate of Birth (DD/MM/YYYY):\n',
@@ -323,19 +328,11 @@ def horoscope():
     # Use Questionary library to provide options for a pleasant UX
     select_opt = (questionary.select('Please choose the timeframe:',
                                      choices=options, ).ask())
-    base = 'https://www.horoscope.com/us/horoscopes/general/horoscope-general-'
-    base_url_yearly = 'https://www.horoscope.com/us/horoscopes/yearly/2024-'
-
-    timeframes = {'Daily': f'{base}daily-today.aspx?sign={zodiac_sign[1]}',
-                  'Weekly': f'{base}weekly.aspx?sign={zodiac_sign[1]}',
-                  'Monthly': f'{base}monthly.aspx?sign={zodiac_sign[1]}',
-                  'Yearly': f'{base_url_yearly}horoscope-{zodiac_sign[0]}.aspx'
-                  }
 
     prettify_text(f"\n{select_opt} horoscope for {name}, a {zodiac_sign[0]}: ",
                   '#875fff',
                   'sparkles')
-    horoscope_text = get_horoscope(timeframes[select_opt], select_opt)
+    horoscope_text = get_horoscope(zodiac_sign, select_opt)
     prettify_text(horoscope_text, 'deep_pink1')
 
     # Convert valid_date into json_date so it can be appended to the worksheet
@@ -350,7 +347,6 @@ def horoscope():
                       zodiac_sign[0],
                       select_opt,
                       horoscope_text]
-    start_app('\nTry something else!')
     return horoscope_data
 
 
@@ -375,6 +371,7 @@ def birth_chart_user_input():
     return name, valid_date, valid_time, location_city, location_country
 
 
+@timed('generate_birth_chart')
 def generate_birth_chart(name,
                          valid_date,
                          valid_time,
@@ -396,6 +393,8 @@ def generate_birth_chart(name,
         long (float): The longitude of the location.
         tz_str (str): The timezone of the location.
     """
+    from kerykeion import AstrologicalSubject
+
     return AstrologicalSubject(
             name=name,
             year=valid_date.year,
@@ -468,13 +467,15 @@ def print_first_signs(name, chart, signs):
     sun_emoji = chart.sun.emoji
     moon_emoji = chart.moon.emoji
     rising_emoji = chart.first_house.emoji
-    prettify_text(f'\nHello, {name}.', 'deep_pink1', 'sparkles')
-    prettify_text(f"Your Sun sign is {sun_sign}. {sun_emoji}\n",
-                  'deep_pink1')
-    prettify_text(f"Your Moon sign is {moon_sign}. {moon_emoji}\n",
-                  'deep_pink1')
-    prettify_text(f'Your Rising sign is {rising_sign}. {rising_emoji}\n',
-                  'deep_pink1')
+    # Written to the terminal in one go
+    with screen():
+        prettify_text(f'\nHello, {name}.', 'deep_pink1', 'sparkles')
+        prettify_text(f"Your Sun sign is {sun_sign}. {sun_emoji}\n",
+                      'deep_pink1')
+        prettify_text(f"Your Moon sign is {moon_sign}. {moon_emoji}\n",
+                      'deep_pink1')
+        prettify_text(f'Your Rising sign is {rising_sign}. {rising_emoji}\n',
+                      'deep_pink1')
 
 
 def save_birth_chart_data(name,
@@ -494,33 +495,17 @@ def save_birth_chart_data(name,
         location_country (str): User's country of birth.
         signs (dict): User's zodiac signs.
     """
+    from records import ChartRecord
 
-    # Convert valid_date into json_date so it can be appended to the worksheet
-    # credits to Geeks for Geeks website - article linked in README.md
-    # Also used the datetimes' strftime method
-    # to display data in a specific way
-    str_date = valid_date.strftime('%d/%m/%Y')
-    json_date = json.dumps(str_date)
-    str_time = valid_time.strftime('%H:%M')
-    json_time = json.dumps(str_time)
-
-    return [name,
-            json_date,
-            json_time,
-            location_city,
-            location_country,
-            signs['sun_sign'],
-            signs['moon_sign'],
-            signs['rising_sign'],
-            signs['mercury_sign'],
-            signs['venus_sign'],
-            signs['mars_sign'],
-            signs['jupiter_sign'],
-            signs['saturn_sign'],
-            signs['uranus_sign'],
-            signs['neptune_sign'],
-            signs['pluto_sign']
-            ]
+    # The record keeps the signs as one byte each and
+    # turns back into the worksheet row (see records.py)
+    record = ChartRecord.from_signs(name,
+                                    valid_date,
+                                    valid_time,
+                                    location_city,
+                                    location_country,
+                                    signs)
+    return record.to_row()
 
 
 def birth_chart():
@@ -530,13 +515,21 @@ def birth_chart():
 
     # Initialize birth_chart_data
     birth_chart_data = None
-    # Fetch the user input
+    # Fetch the user input while the chart's modules load
+    preload('kerykeion', 'cities', 'timezones', 'records')
     name, date, time, loc_city, loc_country = birth_chart_user_input()
+    from kerykeion import Report, KerykeionException
+    from cities import load_cities
 
     try:
 
-        lat, long = fetch_coordinates_from_dataset(loc_city, cities_df)
-        tz_str = fetch_timezone(lat, long)
+        # The dataset is only loaded the first time a chart is made
+        lat, long, tz_str = fetch_coordinates_from_dataset(loc_city,
+                                                           loc_country,
+                                                           load_cities())
+        # The timezone is only looked up when the dataset doesn't have it
+        if tz_str is None:
+            tz_str = fetch_timezone(lat, long)
 
         # Generate the chart
         chart = generate_birth_chart(name,
@@ -553,8 +546,9 @@ def birth_chart():
         print_first_signs(name, chart, signs)
 
         # Use Kerykeion's Report() to generate and display the chart
-        report = Report(chart)
-        report.print_report()
+        with span('print_report'):
+            report = Report(chart)
+            report.print_report()
         # Save the data
         birth_chart_data = save_birth_chart_data(name,
                                                  date,
@@ -567,7 +561,6 @@ def birth_chart():
     except Exception as e:
         warning(f"An unexpected error occurred: {e}")
 
-    start_app('\nTry something else!')
     return birth_chart_data
 
 
@@ -575,15 +568,18 @@ def get_compatibility():
     """
     Gets the compatibility between two zodiac signs and displays it
     """
-    prettify_text("Find out if you're compatible!",
-                  '#875fff',
-                  'couple_with_heart')
-    prettify_text('Please fill out the necessary information:\n',
-                  '#875fff')
-    prettify_text('Example:\n Name: Gerry \n Date of Birth: 20/06/1990\n',
-                  '#875fff')
-    prettify_text('\nPlease enter your first name:\n',
-                  '#875fff')
+    preload('compatibility', 'horoscopes')
+    with screen():
+        prettify_text("Find out if you're compatible!",
+                      '#875fff',
+                      'couple_with_heart')
+        prettify_text('Please fill out the necessary information:\n',
+                      '#875fff')
+        prettify_text('Example:\n Name: Gerry \n '
+                      'Date of Birth: 20/06/1990\n',
+                      '#875fff')
+        prettify_text('\nPlease enter your first name:\n',
+                      '#875fff')
     name1 = prompt_user_for_input('\nName:\n', validate_name)
     prettify_text('\nPlease enter their first name:\n',
                   '#875fff')
@@ -606,21 +602,30 @@ def get_compatibility():
     zodiac_month2 = valid_date2.month
     zodiac_sign1 = get_zodiac_sign(zodiac_day1, zodiac_month1)
     zodiac_sign2 = get_zodiac_sign(zodiac_day2, zodiac_month2)
+    from compatibility import sign_score
+    from extraction import ExtractionError
+    from horoscopes import get_compatibility_store
+    from http_client import UpstreamError
     prettify_text(f"""\nHello, {name1}. Your zodiac sign is {zodiac_sign1[0]},
                   \nand {name2}'s zodiac sign is {zodiac_sign2[0]}.\n
                   """,
                   '#875fff')
     prettify_text("Let's see your compatibility!", '#5fd700')
+    # Worked out locally, so it shows even if the text can't be fetched
+    score = sign_score(zodiac_sign1[0], zodiac_sign2[0])
+    prettify_text(f'Compatibility score: {score}/100\n', 'deep_pink1',
+                  'couple_with_heart')
 
-    # Used BeautifulSoup and requests code to scrap data and display it
-    # credits to W3Resources article and BeautifulSoup4 documentation
-    base_url = 'https://www.horoscope.com/love/compatibility/'
-    url = f"{base_url}{zodiac_sign1[0]}-{zodiac_sign2[0]}"
-    soup = BeautifulSoup(requests.get(url).content, 'html.parser')
-    horoscope_text = soup.find('div', class_='module-skin').p.text
-    formatted_text = textwrap.fill(horoscope_text,
-                                   width=shutil.get_terminal_size().columns)
-    prettify_text(formatted_text, 'deep_pink1')
+    # The text of each pair of signs is only scraped once (see horoscopes.py)
+    try:
+        horoscope_text = get_compatibility_store().get(zodiac_sign1[0],
+                                                       zodiac_sign2[0])
+        formatted_text = textwrap.fill(
+            horoscope_text, width=shutil.get_terminal_size().columns)
+        prettify_text(formatted_text, 'deep_pink1')
+    except (UpstreamError, ExtractionError) as e:
+        formatted_text = None
+        warning(f'An error occured while requesting data: {e}')
 
     # Convert valid_date into json_date so it can be appended to the worksheet
     # credits to Geeks for Geeks
@@ -641,42 +646,71 @@ def get_compatibility():
                           formatted_text
                           ]
 
-    start_app('\nTry something else!')
     return compatibility_data
 
 
+@timed('update_worksheet')
 def update_worksheet(data, worksheet):
     """
-    Updates the worksheet with the provided data.
-    Using gspread library for this function.
+    Stores the provided data in the worksheet.
+    Rows are journaled locally and sent to Google Sheets, or to local
+    storage when there are no credentials (see storage.py).
 
     Args:
         data (obj): Data provided from the user.
-        worksheet (obj): Where the data gets stored.
+        worksheet (str): Name of the worksheet where the data gets stored.
     """
-    worksheet.append_row(data)
+    from storage import get_writer
+
+    writer = get_writer()
+    writer.append(worksheet, data)
+    # The terminal kills the session when it is closed, so rows aren't
+    # left waiting for the writer to be closed at exit. Rows that can't
+    # be sent stay journaled, a later session sends them
+    try:
+        writer.flush()
+    except Exception:
+        warning('The worksheet is unavailable, '
+                'your reading will be stored later.')
 
 
 def main_program():
     """
-    Initiates the entire program
+    Initiates the entire program. Every reading the user asks for
+    is stored as soon as it is done, then the user picks the next
+    option until they exit.
     """
+    message = 'Welcome to AstrologyApp!'
+    while True:
+        option = start_app(message)
+        if option not in FLOWS:
+            break
+        flow, worksheet = FLOWS[option]
+        # Each flow returns its data instead of starting the next one,
+        # so a long session doesn't pile up frames
+        try:
+            data = flow()
+        except (TypeError, ValueError) as e:
+            warning(f'An error occured while starting the app: {e}')
+            data = None
+        try:
+            if data:
+                update_worksheet(data, worksheet)
+        except (TypeError, ValueError) as e:
+            warning(f'An error occured while updating the worksheet: {e}')
+        message = '\nTry something else!'
 
-    # Define the sheet variables using gspread's methods
-    horoscope_sheet = SHEET.worksheet('horoscope')
-    birth_chart_sheet = SHEET.worksheet('birth_chart')
-    compatibility_sheet = SHEET.worksheet('compatibility')
+    prettify_text('Thank you for using AstrologyApp!',
+                  'orange1',
+                  'sparkles')
 
-    option, data = start_app('Welcome to AstrologyApp!')
-    try:
-        if option == 'Horoscope' and data:
-            update_worksheet(data, horoscope_sheet)
-        elif option == 'Birth Chart' and data:
-            update_worksheet(data, birth_chart_sheet)
-        elif option == 'Compatibility' and data:
-            update_worksheet(data, compatibility_sheet)
-    except (TypeError, ValueError) as e:
-        warning(f'An error occured while updating the worksheet: {e}')
+
+# Option of the menu: the function asking for the reading
+# and the worksheet where it is stored
+FLOWS = {'Horoscope': (horoscope, 'horoscope'),
+         'Birth Chart': (birth_chart, 'birth_chart'),
+         'Compatibility': (get_compatibility, 'compatibility')}
 
 
-main_program()
+if __name__ == '__main__':
+    main_program()
@@ -0,0 +1,431 @@
+"""
+HTTP API serving the app's readings as JSON, without the terminal:
+
+    python3 server.py --port 8000 --workers 4
+
+    GET /horoscope?date=20/06/1990&timeframe=Daily
+    GET /birth-chart?name=Gerry&date=20/06/1990&time=14:30
+        &city=Dublin&country=Ireland[&report=json|text|rich]
+    GET /compatibility?date1=20/06/1990&date2=01/01/1992
+    GET /health
+    GET /metrics
+
+Every worker process loads the cities dataset, the timezone finder, the
+ingress tables and the HTTP session once when it starts, then serves
+many users from them, instead of one cold Python process per terminal
+session. Requests are handled by asyncio; work that blocks (scraping
+a page, working out a chart) runs in a thread pool so the event loop
+keeps serving other connections meanwhile. The workers share the
+listening socket and the kernel spreads connections between them.
+
+With INSTRUMENT=1 (see instrumentation.py) every request is timed and
+/metrics answers the worker's timings as Prometheus text; every worker
+keeps its own, so a scrape sees the one its connection landed on.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+import ephemeris
+from cities import DatasetError, load_cities
+from compatibility import sign_score
+from extraction import ExtractionError
+from horoscopes import (TIMEFRAMES, cached_horoscope,
+                        get_compatibility_store)
+from http_client import UpstreamError, get_client
+from instrumentation import prometheus_text, registry, span
+from ingresses import load_tables
+from records import ChartRecord
+from renderers import render_rich, render_text, to_dict
+from timezones import get_finder, timezone_at
+from zodiac import INVALID, sign_of
+
+HOST = '127.0.0.1'
+PORT = 8000
+# Threads per worker running blocking work (scraping, charts)
+THREADS = 16
+# Longest request line and headers accepted, in bytes
+MAX_HEADERS = 16384
+# Seconds an idle keep-alive connection is kept open
+KEEP_ALIVE = 15
+# Answered when the horoscope site fails, the details are only logged
+UNAVAILABLE = 'Horoscope service unavailable'
+
+
+class MetricsText(str):
+    """
+    Prometheus text, answered with the content type of its format.
+    """
+
+
+class RequestError(ValueError):
+    """
+    Raised when a request is invalid, answered with its status.
+    """
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+def _param(params, name):
+    value = params.get(name, '').strip()
+    if not value:
+        raise RequestError(f'Missing {name}')
+    return value
+
+
+def _date(params, name):
+    value = _param(params, name)
+    try:
+        return dt.strptime(value, '%d/%m/%Y')
+    except ValueError:
+        raise RequestError(f'{name} must be in DD/MM/YYYY format')
+
+
+def _sign(valid_date):
+    zodiac_sign = sign_of(valid_date.day, valid_date.month)
+    if zodiac_sign == INVALID:
+        raise RequestError('Invalid date')
+    return zodiac_sign
+
+
+def horoscope(params):
+    """
+    The horoscope of a date of birth's sign for a timeframe.
+    """
+    zodiac_sign = _sign(_date(params, 'date'))
+    timeframe = params.get('timeframe', 'Daily').capitalize()
+    if timeframe not in TIMEFRAMES:
+        raise RequestError(f'timeframe must be one of '
+                           f'{", ".join(TIMEFRAMES)}')
+    return {'sign': zodiac_sign[0],
+            'timeframe': timeframe,
+            'horoscope': cached_horoscope(zodiac_sign, timeframe)}
+
+
+def birth_chart(params):
+    """
+    The signs of a birth chart and its worksheet row, or its report:
+    report=json adds it to the JSON, text and rich answer it as
+    plain text.
+    """
+    report = params.get('report')
+    if report not in (None, 'json', 'text', 'rich'):
+        raise RequestError('report must be json, text or rich')
+    name = _param(params, 'name')
+    valid_date = _date(params, 'date')
+    try:
+        valid_time = dt.strptime(_param(params, 'time'), '%H:%M')
+    except ValueError:
+        raise RequestError('time must be in HH:MM format')
+    city, country = _param(params, 'city'), _param(params, 'country')
+
+    try:
+        cities = load_cities()
+    except DatasetError:
+        raise RequestError('Birth charts are unavailable, the cities '
+                           'dataset is missing.',
+                           HTTPStatus.SERVICE_UNAVAILABLE)
+    location = cities.resolve(city, country)
+    if location is None:
+        raise RequestError(f'{city}, {country} could not be found.',
+                           HTTPStatus.NOT_FOUND)
+    lat, long, tz_str = location
+    if tz_str is None:
+        tz_str = timezone_at(lat, long)
+    try:
+        signs = ephemeris.chart_signs(valid_date, valid_time,
+                                      lat, long, tz_str)
+    except ephemeris.EphemerisError as e:
+        raise RequestError(str(e))
+    record = ChartRecord.from_signs(name, valid_date, valid_time,
+                                    city, country, signs)
+    if report == 'text':
+        return render_text(record) + '\n'
+    if report == 'rich':
+        return render_rich(record, color=False) + '\n'
+    reading = {'name': name,
+               'location': {'latitude': lat, 'longitude': long,
+                            'timezone': tz_str},
+               'signs': signs,
+               'row': record.to_row()}
+    if report == 'json':
+        reading['report'] = to_dict(record)
+    return reading
+
+
+def compatibility(params):
+    """
+    The compatibility of two dates of birth's signs.
+    """
+    sign1 = _sign(_date(params, 'date1'))[0]
+    sign2 = _sign(_date(params, 'date2'))[0]
+    reading = {'signs': [sign1, sign2],
+               'score': sign_score(sign1, sign2)}
+    # The score is still returned when the text can't be fetched
+    try:
+        reading['text'] = get_compatibility_store().get(sign1, sign2)
+    except (UpstreamError, ExtractionError) as e:
+        print(f'[{os.getpid()}] Compatibility text not fetched: {e}',
+              file=sys.stderr)
+        reading['text'] = None
+        reading['error'] = UNAVAILABLE
+    return reading
+
+
+def health(params):
+    return {'status': 'ok', 'pid': os.getpid()}
+
+
+def metrics(params):
+    """
+    The worker's timings and counters, as Prometheus text.
+    """
+    return MetricsText(prometheus_text())
+
+
+ROUTES = {'/horoscope': horoscope,
+          '/birth-chart': birth_chart,
+          '/compatibility': compatibility,
+          '/health': health,
+          '/metrics': metrics}
+
+
+def handle(method, target):
+    """
+    Answers a request.
+
+    Args:
+        method (str): The HTTP method.
+        target (str): The path and query string.
+
+    Returns:
+        status (HTTPStatus): The status of the response.
+        body (dict): The JSON body of the response, or a str
+        sent as plain text.
+    """
+    url = urlsplit(target)
+    path = url.path.rstrip('/') or '/'
+    route = ROUTES.get(path)
+    if route is None:
+        return HTTPStatus.NOT_FOUND, {'error': 'Not found'}
+    if method not in ('GET', 'HEAD'):
+        return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'Use GET'}
+    try:
+        with span(f'api{path}'):
+            return HTTPStatus.OK, route(dict(parse_qsl(url.query)))
+    except RequestError as e:
+        return e.status, {'error': str(e)}
+    except (UpstreamError, ExtractionError) as e:
+        print(f'[{os.getpid()}] {method} {target} failed: {e}',
+              file=sys.stderr)
+        return HTTPStatus.BAD_GATEWAY, {'error': UNAVAILABLE}
+    except Exception:
+        # The details are for the logs, not for the clients
+        print(f'[{os.getpid()}] {method} {target} failed:',
+              file=sys.stderr)
+        traceback.print_exc()
+        return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': 'Internal error'}
+
+
+def _response(version, status, body, keep_alive, head_only=False):
+    """
+    Returns the bytes of a response.
+
+    Args:
+        version (str): The HTTP version of the request.
+        status (HTTPStatus): The status of the response.
+        body (dict): The JSON body, or a str sent as plain text.
+        keep_alive (bool): Whether the connection is kept open.
+        head_only (bool): Leave out the body, for HEAD requests.
+            Defaults to False.
+    """
+    if isinstance(body, MetricsText):
+        payload = body.encode()
+        # Prometheus reads /metrics as its text format 0.0.4
+        content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    elif isinstance(body, str):
+        payload = body.encode()
+        content_type = 'text/plain; charset=utf-8'
+    else:
+        payload = json.dumps(body).encode()
+        content_type = 'application/json'
+    head = (f'{version} {status.value} {status.phrase}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}'
+            f'\r\n\r\n').encode('latin-1')
+    return head if head_only else head + payload
+
+
+async def serve_connection(reader, writer):
+    """
+    Answers the requests of one connection until it is closed.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(
+                    reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError, ConnectionError):
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, version = lines[0].split(' ')
+            except ValueError:
+                break
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+            # Requests have no use for a body, it is skipped, which needs
+            # its length to find where the next request starts. Bodies
+            # without one (chunked) or with a bad one can't be skipped,
+            # so they are answered and the connection is closed.
+            length = headers.get('content-length') or '0'
+            if 'transfer-encoding' in headers:
+                writer.write(_response(version, HTTPStatus.LENGTH_REQUIRED,
+                                       {'error': 'Content-Length required'},
+                                       keep_alive=False))
+                await writer.drain()
+                break
+            if not (length.isascii() and length.isdigit()):
+                writer.write(_response(version, HTTPStatus.BAD_REQUEST,
+                                       {'error': 'Invalid Content-Length'},
+                                       keep_alive=False))
+                await writer.drain()
+                break
+            try:
+                await reader.readexactly(int(length))
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+
+            status, body = await loop.run_in_executor(None, handle,
+                                                      method, target)
+            connection = headers.get('connection', '').lower()
+            keep_alive = (connection == 'keep-alive'
+                          or (version == 'HTTP/1.1'
+                              and connection != 'close'))
+            writer.write(_response(version, status, body, keep_alive,
+                                   head_only=method == 'HEAD'))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        # The client went away while it was answered
+        pass
+    finally:
+        writer.close()
+
+
+def warm_up():
+    """
+    Loads everything a worker shares between requests.
+    """
+    start = time.perf_counter()
+    get_finder()
+    get_client()
+    get_compatibility_store()
+    load_tables()
+    try:
+        load_cities()
+    except DatasetError as e:
+        # Birth charts fail until the dataset is there, the rest works
+        print(f'[{os.getpid()}] Cities dataset not loaded: {e}',
+              file=sys.stderr)
+    print(f'[{os.getpid()}] Ready in {time.perf_counter() - start:.1f}s',
+          file=sys.stderr)
+
+
+async def run_worker(sock, threads):
+    """
+    Serves connections on a listening socket until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=threads))
+    server = await asyncio.start_server(serve_connection, sock=sock,
+                                        limit=MAX_HEADERS)
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+    async with server:
+        await stop.wait()
+
+
+def worker(sock, threads):
+    """
+    Runs one worker process.
+    """
+    warm_up()
+    try:
+        asyncio.run(run_worker(sock, threads))
+    finally:
+        registry.flush()
+
+
+def main():
+    """
+    Parses the command line, opens the socket and starts the workers.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve the app's readings as a JSON API.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int,
+                        default=int(os.environ.get('PORT', PORT)))
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes')
+    parser.add_argument('--threads', type=int, default=THREADS,
+                        help='threads per worker for blocking work')
+    args = parser.parse_args()
+
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    print(f'Serving on http://{args.host}:{args.port} '
+          f'with {args.workers} workers', file=sys.stderr)
+    if args.workers <= 1:
+        worker(sock, args.threads)
+        return
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker(sock, args.threads)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""
+Storage of the users' readings.
+
+Readings go to the Google Sheets spreadsheet of the app. The client is
+only authorized the first time a row is written, so the app starts
+without any network call, and when there are no credentials the rows
+are kept in a local SQLite database (or CSV files) instead.
+
+Instead of one append_row call per session, rows are collected per
+worksheet and sent with a single append_rows call once enough of them
+are waiting or the oldest one has waited long enough. Every row is
+first written to a journal file of the process, so rows that were
+never sent (e.g. the app crashed) are sent by the next process.
+"""
+import atexit
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+
+from instrumentation import count, span
+
+# This section of code is borrowed from the "Love Sandwiches" project
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+    ]
+CREDS_PATH = 'creds.json'
+SPREADSHEET = 'astrology_app'
+WORKSHEETS = ('horoscope', 'birth_chart', 'compatibility')
+
+# Set STORAGE_BACKEND to sheets, sqlite or csv to choose where readings
+# go; by default they go to Sheets when creds.json exists
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND')
+LOCAL_STORAGE = os.environ.get('LOCAL_STORAGE',
+                               os.path.join('.cache', 'readings'))
+
+JOURNAL_DIR = os.environ.get('SHEETS_JOURNAL',
+                             os.path.join('.cache', 'journal'))
+# Rows waiting for a worksheet before they are sent
+FLUSH_ROWS = 20
+# Seconds the oldest row of a worksheet waits before it is sent
+FLUSH_SECONDS = 30
+# Rows read at once when a worksheet is read back
+PAGE_SIZE = 1000
+
+
+def _process_alive(pid):
+    """
+    Returns whether a process is still running.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StorageBackend(ABC):
+    """
+    Where the readings end up, one table of rows per worksheet.
+    A backend missing one of the methods can't be created.
+    """
+
+    @abstractmethod
+    def append_rows(self, worksheet, rows):
+        """
+        Appends rows to a worksheet.
+
+        Args:
+            worksheet (str): Name of the worksheet.
+            rows (list): The rows to append.
+        """
+
+    @abstractmethod
+    def read_rows(self, worksheet, after=0, limit=PAGE_SIZE):
+        """
+        Reads a page of a worksheet's rows, in the order they were
+        appended.
+
+        Args:
+            worksheet (str): Name of the worksheet.
+            after (int): Position of the last row already read,
+                0 to start from the first row.
+            limit (int): Most rows read. Defaults to PAGE_SIZE.
+
+        Returns:
+            rows (list): (position, row) pairs, fewer than limit at
+            the end of the worksheet. Positions only grow, so the last
+            one can be passed as after to read the next page.
+        """
+
+
+class SheetsBackend(StorageBackend):
+    """
+    The app's Google Sheets spreadsheet, authorized the first time
+    a row is written. Worksheet handles are looked up once.
+    """
+
+    def __init__(self, creds_path=CREDS_PATH, spreadsheet=SPREADSHEET):
+        """
+        Args:
+            creds_path (str): The service account credentials.
+            spreadsheet (str): Name of the spreadsheet.
+        """
+        self.creds_path = creds_path
+        self.spreadsheet = spreadsheet
+        self.sheet = None
+        self.worksheets = {}
+        self._lock = threading.Lock()
+
+    def worksheet(self, name):
+        """
+        Returns the handle of a worksheet, authorizing the client
+        and opening the spreadsheet the first time.
+
+        Args:
+            name (str): Name of the worksheet.
+        """
+        with self._lock:
+            if self.sheet is None:
+                # Imported here so starting the app doesn't load them
+                import gspread
+                from google.oauth2.service_account import Credentials
+
+                # Also borrowed from "Love Sandwiches" project
+                creds = Credentials.from_service_account_file(
+                    self.creds_path)
+                scoped_creds = creds.with_scopes(SCOPE)
+                client = gspread.authorize(scoped_creds)
+                self.sheet = client.open(self.spreadsheet)
+            if name not in self.worksheets:
+                self.worksheets[name] = self.sheet.worksheet(name)
+            return self.worksheets[name]
+
+    def append_rows(self, worksheet, rows):
+        self.worksheet(worksheet).append_rows(rows)
+
+    def read_rows(self, worksheet, after=0, limit=PAGE_SIZE):
+        # Positions are the numbers of the rows in the worksheet
+        handle = self.worksheet(worksheet)
+        values = handle.get(f'A{after + 1}:Z{after + limit}')
+        if len(values) < limit:
+            # Sheets leaves out the blank rows at the end of a range, so
+            # a short page only ends the worksheet if the next page is
+            # empty too (more than a page of blank rows ends it). The
+            # grid's row_count isn't the end: appends fill its empty
+            # rows first
+            if handle.get(f'A{after + limit + 1}:Z{after + 2 * limit}'):
+                values += [[]] * (limit - len(values))
+        return list(enumerate(values, start=after + 1))
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    A local SQLite database with one table per worksheet,
+    each row stored as a JSON list.
+    """
+
+    def __init__(self, path=f'{LOCAL_STORAGE}.sqlite3'):
+        """
+        Args:
+            path (str): The SQLite file.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def append_rows(self, worksheet, rows):
+        if worksheet not in WORKSHEETS:
+            raise ValueError(f'Unknown worksheet: {worksheet}')
+        with closing(self._connect()) as connection, connection:
+            connection.execute(f'CREATE TABLE IF NOT EXISTS {worksheet} ('
+                               'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                               'row TEXT)')
+            connection.executemany(f'INSERT INTO {worksheet} (row) '
+                                   'VALUES (?)',
+                                   [(json.dumps(row),) for row in rows])
+
+    def read_rows(self, worksheet, after=0, limit=PAGE_SIZE):
+        if worksheet not in WORKSHEETS:
+            raise ValueError(f'Unknown worksheet: {worksheet}')
+        # Positions are the ids of the rows, so a page is an index range
+        with closing(self._connect()) as connection:
+            try:
+                return [(position, json.loads(row)) for position, row
+                        in connection.execute(
+                            f'SELECT id, row FROM {worksheet} '
+                            'WHERE id > ? ORDER BY id LIMIT ?',
+                            (after, limit))]
+            except sqlite3.OperationalError:
+                # Nothing has been written to the worksheet yet
+                return []
+
+
+class CSVBackend(StorageBackend):
+    """
+    A directory with one CSV file per worksheet.
+    """
+
+    def __init__(self, path=LOCAL_STORAGE):
+        """
+        Args:
+            path (str): The directory of the CSV files.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append_rows(self, worksheet, rows):
+        if worksheet not in WORKSHEETS:
+            raise ValueError(f'Unknown worksheet: {worksheet}')
+        with self._lock, open(os.path.join(self.path, f'{worksheet}.csv'),
+                              'a', encoding='utf-8', newline='') as file:
+            csv.writer(file).writerows(rows)
+
+    def read_rows(self, worksheet, after=0, limit=PAGE_SIZE):
+        if worksheet not in WORKSHEETS:
+            raise ValueError(f'Unknown worksheet: {worksheet}')
+        path = os.path.join(self.path, f'{worksheet}.csv')
+        if not os.path.exists(path):
+            return []
+        # Positions are the offsets where the rows end in the file,
+        # texts can span several lines so the reader is fed line by
+        # line and the offset is taken after every row
+        rows = []
+        with open(path, encoding='utf-8', newline='') as file:
+            file.seek(after)
+            reader = csv.reader(iter(file.readline, ''))
+            for row in reader:
+                rows.append((file.tell(), row))
+                if len(rows) == limit:
+                    break
+        return rows
+
+
+BACKENDS = {'sheets': SheetsBackend,
+            'sqlite': SQLiteBackend,
+            'csv': CSVBackend}
+_backend = None
+
+
+def get_backend():
+    """
+    Returns the storage backend of the process: the one named by
+    STORAGE_BACKEND, otherwise Sheets if there are credentials
+    and SQLite if there aren't.
+    """
+    global _backend
+    if _backend is None:
+        name = STORAGE_BACKEND or ('sheets' if os.path.exists(CREDS_PATH)
+                                   else 'sqlite')
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+class BufferedWriter:
+    """
+    Collects rows per worksheet and sends them in batches.
+    """
+
+    def __init__(self,
+                 sink,
+                 journal_dir=JOURNAL_DIR,
+                 max_rows=FLUSH_ROWS,
+                 max_age=FLUSH_SECONDS,
+                 clock=time.monotonic):
+        """
+        Args:
+            sink (func): Takes a worksheet name and a list of rows
+                and stores them, e.g. with gspread's append_rows.
+            journal_dir (str): Where the rows are journaled.
+            max_rows (int): Rows waiting before a worksheet is sent.
+            max_age (float): Seconds the oldest row waits before
+                its worksheet is sent.
+            clock (func): Returns the current time in seconds.
+        """
+        self.sink = sink
+        self.max_rows = max_rows
+        self.max_age = max_age
+        self.clock = clock
+        self.buffers = {}
+        self.oldest = {}
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self.journal_dir = journal_dir
+        self.journal_path = os.path.join(journal_dir,
+                                          f'{os.getpid()}.jsonl')
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._recover()
+
+        self._thread = threading.Thread(target=self._flush_periodically,
+                                        daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        """
+        Takes over the rows journaled by processes that have stopped.
+        """
+        claimed = []
+        for name in os.listdir(self.journal_dir):
+            pid, extension = os.path.splitext(name)
+            if (extension != '.jsonl' or not pid.isdigit()
+                    or int(pid) == os.getpid() or _process_alive(int(pid))):
+                continue
+            path = os.path.join(self.journal_dir, name)
+            claimed_path = f'{path}.{os.getpid()}'
+            try:
+                # Renaming is atomic, so only one process takes them over
+                os.rename(path, claimed_path)
+            except OSError:
+                continue
+            with open(claimed_path, encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._buffer(entry['worksheet'], entry['row'])
+            claimed.append(claimed_path)
+        if claimed:
+            self._rewrite_journal()
+            for path in claimed:
+                os.remove(path)
+
+    def _buffer(self, worksheet, row):
+        self.buffers.setdefault(worksheet, []).append(row)
+        self.oldest.setdefault(worksheet, self.clock())
+
+    def _write_journal(self, worksheet, row):
+        self._journal.write(json.dumps({'worksheet': worksheet,
+                                        'row': row}) + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _rewrite_journal(self):
+        """
+        Replaces the journal with the rows still waiting.
+        """
+        tmp_path = f'{self.journal_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            for worksheet, rows in self.buffers.items():
+                for row in rows:
+                    file.write(json.dumps({'worksheet': worksheet,
+                                           'row': row}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal.close()
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def append(self, worksheet, row):
+        """
+        Journals a row and sends its worksheet if it is due.
+
+        Args:
+            worksheet (str): Name of the worksheet.
+            row (list): The values of the row.
+        """
+        with self._lock:
+            self._write_journal(worksheet, row)
+            self._buffer(worksheet, row)
+            if len(self.buffers[worksheet]) >= self.max_rows:
+                try:
+                    self.flush(worksheet)
+                except Exception:
+                    # The rows stay journaled and are sent by a later flush
+                    pass
+
+    def flush(self, worksheet=None, due_only=False):
+        """
+        Sends the rows waiting for one worksheet, or for all of them.
+        Rows that fail to be sent stay journaled for the next flush.
+
+        Args:
+            worksheet (str): Name of the worksheet. Defaults to all.
+            due_only (bool): Only send worksheets whose oldest row
+                has waited max_age seconds. Defaults to False.
+
+        Raises:
+            Exception: Whatever the sink raised, after the other
+            worksheets have been sent.
+        """
+        error = None
+        with self._lock:
+            names = [worksheet] if worksheet else list(self.buffers)
+            sent = False
+            for name in names:
+                rows = self.buffers.get(name)
+                waited = self.clock() - self.oldest.get(name, 0)
+                if not rows or (due_only and waited < self.max_age):
+                    continue
+                try:
+                    # The write itself, append() only queues the row
+                    with span('storage.send'):
+                        self.sink(name, rows)
+                except Exception as e:
+                    count('storage.send_failed')
+                    error = e
+                    continue
+                count('storage.rows_sent', len(rows))
+                del self.buffers[name]
+                del self.oldest[name]
+                sent = True
+            if sent:
+                self._rewrite_journal()
+        if error:
+            raise error
+
+    def _flush_periodically(self):
+        while not self._closed.wait(min(self.max_age, 1)):
+            try:
+                self.flush(due_only=True)
+            except Exception:
+                # The rows stay journaled and are sent by a later flush
+                pass
+
+    def close(self):
+        """
+        Sends every waiting row and stops the background flushes.
+        Rows that can't be sent stay journaled for the next process.
+
+        Returns:
+            sent (bool): Whether every row was sent.
+        """
+        if self._closed.is_set():
+            return not self.buffers
+        self._closed.set()
+        try:
+            self.flush()
+        except Exception:
+            pass
+        with self._lock:
+            self._journal.close()
+            if self.buffers:
+                return False
+            os.remove(self.journal_path)
+            return True
+
+
+_writer = None
+
+
+def get_writer():
+    """
+    Returns the writer shared by the whole process, sending rows to
+    the storage backend. It is created the first time a row is written
+    and closed, sending every waiting row, when the app exits.
+    """
+    global _writer
+    if _writer is None:
+        _writer = BufferedWriter(get_backend().append_rows)
+        atexit.register(_writer.close)
+    return _writer
@@ -0,0 +1,10 @@
+"""
+The tests import the app's modules from the project root:
+
+    python3 -m pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
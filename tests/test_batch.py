@@ -0,0 +1,54 @@
+"""
+Tests of batch.py with a stand-in for the cities dataset.
+"""
+import io
+import json
+
+import pytest
+
+import batch
+
+DUBLIN = (53.35, -6.26, 'Europe/Dublin')
+RECORD = {'name': 'Gerry', 'date': '20/06/1990', 'time': '14:30',
+          'city': 'Dublin', 'country': 'Ireland'}
+
+
+class Cities:
+    def resolve(self, city, country):
+        return DUBLIN if city == 'Dublin' else None
+
+
+@pytest.fixture
+def cities(monkeypatch):
+    monkeypatch.setattr(batch, 'load_cities', Cities)
+    return Cities()
+
+
+def test_prepare_parses_json_lines(cities):
+    job = batch.prepare(json.dumps(RECORD), cities)
+    assert job == ('Gerry', '20/06/1990', '14:30', 'Dublin', 'Ireland',
+                   *DUBLIN)
+
+
+@pytest.mark.parametrize('line', ['{"name": oops', '[1, 2]', '"Gerry"'])
+def test_prepare_rejects_lines_that_are_not_records(cities, line):
+    with pytest.raises(ValueError):
+        batch.prepare(line, cities)
+
+
+def test_bad_records_are_reported_and_skipped(cities):
+    lines = [json.dumps(RECORD), '{"name": oops', '[1, 2]',
+             json.dumps(dict(RECORD, city='Atlantis')),
+             json.dumps(dict(RECORD, name='Ann'))]
+    source = io.StringIO('\n'.join(lines) + '\n')
+    output, errors = io.StringIO(), io.StringIO()
+
+    made, failed, _ = batch.run_batch(batch.read_records(source, 'jsonl'),
+                                      output, workers=1, errors=errors)
+
+    assert (made, failed) == (2, 3)
+    names = [json.loads(line)[0] for line in output.getvalue().splitlines()]
+    assert names == ['Gerry', 'Ann']
+    reported = [line.split(':')[0] for line in
+                errors.getvalue().splitlines()]
+    assert reported == ['Record 2', 'Record 3', 'Record 4']
@@ -0,0 +1,92 @@
+"""
+Tests of cities.py on a small dataset converted in a temporary directory.
+"""
+import gzip
+import json
+import os
+
+import pytest
+
+import cities
+
+CSV = """Country,City,AccentCity,Region,Population,Latitude,Longitude
+ie,dublin,Dublin,07,1024027,53.3331,-6.2489
+us,dublin,Dublin,CA,46036,37.7022,-121.9347
+fr,paris,Paris,A8,2110694,48.8667,2.3333
+gb,london,London,H9,7421228,51.5142,-0.0931
+"""
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    source = tmp_path / 'cities.csv.gz'
+    with gzip.open(source, 'wt', encoding='utf-8') as file:
+        file.write(CSV)
+    path = str(tmp_path / 'cities-v1')
+    cities.CityTable.from_csv(str(source)).save(path)
+    monkeypatch.setattr(cities, '_cities', None)
+    monkeypatch.setattr(cities, 'STORE_PATH', path)
+    return path
+
+
+def test_loads_the_converted_dataset(store):
+    table = cities.load_cities()
+    assert cities.load_cities() is table
+    latitude, longitude, _ = table.resolve('Dublin', 'Ireland')
+    assert (latitude, longitude) == pytest.approx((53.3331, -6.2489))
+    assert table.resolve('Dublin', 'United States')[0] == pytest.approx(
+        37.7022)
+    assert table.resolve('London', 'UK') is not None
+
+
+def test_lookup_in_another_country(store):
+    table = cities.load_cities()
+    # Not Paris, FR: the user is asked to pick a city instead
+    assert table.lookup('Paris', 'Canada') is None
+    assert table.resolve('Paris', 'Canada') is None
+    assert table.city[table.lookup('Paris', 'France')] == 'Paris'
+    # The biggest city of that name without a country
+    assert table.country[table.lookup('Dublin')] == 'ie'
+
+
+def test_missing_dataset_fails_fast(store, monkeypatch):
+    monkeypatch.setattr(cities, 'STORE_PATH', store + '-missing')
+
+    def parse(*args, **kwargs):
+        raise AssertionError('The CSV was parsed')
+
+    monkeypatch.setattr(cities.CityTable, 'from_csv', parse)
+    with pytest.raises(cities.DatasetError, match='build_cities.py'):
+        cities.load_cities()
+    assert cities._cities is None
+
+
+def test_stale_dataset_fails_fast(store):
+    manifest_path = os.path.join(store, cities.MANIFEST)
+    with open(manifest_path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    manifest['version'] = cities.FORMAT_VERSION - 1
+    with open(manifest_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    with pytest.raises(cities.DatasetError, match='again with'):
+        cities.load_cities()
+
+
+def test_suggests_names_made_of_common_trigrams(tmp_path, monkeypatch):
+    # Every name starts with the same trigrams, which are common
+    # in a corpus this small
+    monkeypatch.setattr(cities, 'COMMON_TRIGRAM', 10)
+    lines = [CSV.splitlines()[0]]
+    for number in range(200):
+        name = f'Santa {chr(97 + number % 26)}{number}'
+        lines.append(f'es,{name.lower()},{name},01,{number},40,-3')
+    lines.append('es,santander,Santander,39,172221,43.4647,-3.8044')
+    source = tmp_path / 'cities.csv.gz'
+    with gzip.open(source, 'wt', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+    table = cities.CityTable.from_csv(str(source))
+
+    for typo in ('Santander', 'Santnder', 'Satander', 'Santandr'):
+        suggestions = table.suggest(typo)
+        assert suggestions, typo
+        assert suggestions[0].city == 'Santander'
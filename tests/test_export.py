@@ -0,0 +1,156 @@
+"""
+Tests of export.py, reading the readings back from every backend.
+"""
+import io
+import json
+import re
+
+import pytest
+
+import export
+from storage import CSVBackend, SheetsBackend, SQLiteBackend
+
+HEADER = ['Name', 'Date', 'Sign', 'Timeframe', 'Horoscope']
+
+
+def reading(number):
+    return [f'Reader {number}', '"20/06/1990"', 'Gemini', 'Daily',
+            f'Reading {number},\nover "two" lines']
+
+
+class FakeWorksheet:
+    """
+    Answers get() like gspread: blank rows at the end of a range and
+    blank cells at the end of a row are left out, and append_rows()
+    fills the first rows after the last one with data. The ranges read
+    are kept.
+    """
+
+    def __init__(self, row_count=1000):
+        self.values = []
+        self.row_count = row_count
+        self.ranges = []
+
+    def append_rows(self, rows):
+        while self.values and not any(self.values[-1]):
+            self.values.pop()
+        self.values.extend(list(row) for row in rows)
+
+    def get(self, cells):
+        first, last = map(int, re.fullmatch(r'A(\d+):Z(\d+)',
+                                            cells).groups())
+        self.ranges.append((first, last))
+        rows = [self._trim(row) for row in self.values[first - 1:last]]
+        while rows and not rows[-1]:
+            rows.pop()
+        return rows
+
+    @staticmethod
+    def _trim(row):
+        row = list(row)
+        while row and row[-1] in ('', None):
+            row.pop()
+        return row
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.worksheets = {}
+
+    def worksheet(self, name):
+        return self.worksheets.setdefault(name, FakeWorksheet())
+
+
+@pytest.fixture(params=['sheets', 'sqlite', 'csv'])
+def backend(request, tmp_path):
+    if request.param == 'sheets':
+        backend = SheetsBackend()
+        backend.sheet = FakeSpreadsheet()
+        return backend
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'readings.sqlite3'))
+    return CSVBackend(str(tmp_path / 'readings'))
+
+
+def exported(directory, worksheet='horoscope'):
+    with open(directory / f'{worksheet}.jsonl', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def run_export(backend, directory, page_size=3):
+    return export.export(str(directory), backend=backend,
+                         worksheets=('horoscope',), page_size=page_size)
+
+
+def test_exports_every_reading(backend, tmp_path):
+    backend.append_rows('horoscope', [HEADER])
+    backend.append_rows('horoscope', [reading(n) for n in range(10)])
+    counts = run_export(backend, tmp_path / 'out')
+    assert counts == {'horoscope': (10, 1)}
+    records = exported(tmp_path / 'out')
+    assert [record['name'] for record in records] == [
+        f'Reader {n}' for n in range(10)]
+    assert records[0]['date'] == '1990-06-20'
+    assert records[0]['horoscope'] == 'Reading 0,\nover "two" lines'
+
+
+def test_exports_only_new_readings(backend, tmp_path):
+    backend.append_rows('horoscope', [reading(n) for n in range(4)])
+    assert run_export(backend, tmp_path / 'out') == {'horoscope': (4, 0)}
+    backend.append_rows('horoscope', [reading(n) for n in range(4, 6)])
+    assert run_export(backend, tmp_path / 'out') == {'horoscope': (2, 0)}
+    assert run_export(backend, tmp_path / 'out') == {'horoscope': (0, 0)}
+    assert len(exported(tmp_path / 'out')) == 6
+
+
+def test_sheets_blank_rows_at_a_page_boundary(tmp_path):
+    backend = SheetsBackend()
+    backend.sheet = FakeSpreadsheet()
+    sheet = backend.sheet.worksheet('horoscope')
+    # Rows 3 and 4 are blank, ending the first page of 4 rows
+    sheet.values = [reading(0), reading(1), [], ['', ''],
+                    reading(2), reading(3)]
+    errors = io.StringIO()
+    state, exported_rows, skipped = export.export_worksheet(
+        backend, 'horoscope', str(tmp_path), page_size=4, errors=errors)
+    assert (exported_rows, skipped) == (4, 2)
+    assert state['position'] == 6
+    assert 'row 3 skipped' in errors.getvalue()
+
+
+def test_sheets_stops_at_the_last_reading(tmp_path):
+    backend = SheetsBackend()
+    backend.sheet = FakeSpreadsheet()
+    sheet = backend.sheet.worksheet('horoscope')
+    backend.append_rows('horoscope', [reading(n) for n in range(5)])
+    state, exported_rows, _ = export.export_worksheet(
+        backend, 'horoscope', str(tmp_path), page_size=4)
+    assert exported_rows == 5
+    # Not the grid's row_count, which the next appends fill
+    assert state['position'] == 5 < sheet.row_count
+    # Only the page after the short one is checked
+    assert sheet.ranges == [(1, 4), (5, 8), (9, 12)]
+
+    backend.append_rows('horoscope', [reading(5)])
+    state, exported_rows, _ = export.export_worksheet(
+        backend, 'horoscope', str(tmp_path), state=state, page_size=4)
+    assert exported_rows == 1
+    assert state['position'] == 6
+
+
+def test_sheets_ends_at_a_page_of_blank_rows(tmp_path):
+    backend = SheetsBackend()
+    backend.sheet = FakeSpreadsheet()
+    sheet = backend.sheet.worksheet('horoscope')
+    sheet.values = [reading(0)] + [[]] * 8 + [reading(1)]
+    state, exported_rows, _ = export.export_worksheet(
+        backend, 'horoscope', str(tmp_path), page_size=4)
+    assert exported_rows == 1
+    assert state['position'] == 1
+
+
+def test_format_mismatch(tmp_path):
+    with pytest.raises(export.ExportError):
+        export.export_worksheet(SQLiteBackend(str(tmp_path / 'db')),
+                                'horoscope', str(tmp_path), 'jsonl',
+                                state={'format': 'parquet'})
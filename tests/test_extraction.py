@@ -0,0 +1,51 @@
+"""
+Tests of extraction.py on the fixture pages of the benchmarks, against
+the BeautifulSoup extraction the app used before.
+"""
+import os
+
+import pytest
+
+from benchmarks.bench_extraction import FIXTURES, PAGES, soup_text
+from extraction import CHUNK_SIZE, ExtractionError, extract_text
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_matches_beautifulsoup(name):
+    page_type, _ = PAGES[name]
+    html = fixture(name)
+    assert extract_text(html, page_type) == soup_text(html, page_type)
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_reads_text_not_markup(name):
+    page_type, _ = PAGES[name]
+    text = extract_text(fixture(name), page_type)
+    assert text
+    assert '<' not in text
+    assert '&amp;' not in text and '&rsquo;' not in text
+
+
+def test_reads_across_chunks():
+    # The daily page's text starts after the first chunk
+    html = fixture('daily.html')
+    assert html.index(b'class="main-horoscope">\n') > CHUNK_SIZE
+    assert extract_text(html, 'horoscope').startswith('Jul 14, 2024 - ')
+
+
+def test_missing_element():
+    with pytest.raises(ExtractionError):
+        extract_text(fixture('compatibility.html'), 'yearly')
+
+
+def test_paragraph_ended_by_its_element():
+    # The element ends its unclosed paragraph, the next one isn't read
+    html = (b'<div class="main-horoscope"><p>a<p>b</div>'
+            b'<div class="main-horoscope"><p>c</p></div>')
+    assert extract_text(html, 'horoscope') == 'ab'
+    assert soup_text(html, 'horoscope') == 'ab'
@@ -0,0 +1,231 @@
+"""
+Tests of http_client.py against a stub HTTP server running in a thread.
+"""
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_client import (CircuitBreaker, CircuitOpenError, HttpClient,
+                         UpstreamError)
+
+# Seconds the stub takes to answer a slow request, well over the read
+# timeout of the tests' clients
+SLOW = 1
+READ_TIMEOUT = 0.2
+
+
+class Stub(ThreadingHTTPServer):
+    """
+    Answers every path with the next of its scripted actions: a status
+    code, 'reset' to drop the connection, 'slow' to answer after SLOW
+    seconds or 'block' to wait until released. The last action is
+    repeated once the others are used up.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.scripts = {}
+        self.requests = {}
+        self.released = threading.Event()
+        self.in_flight = self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # The client gave up on a slow answer, as the tests mean it to
+        pass
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server_port}{path}'
+
+    def next_action(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            script = self.scripts.get(path, [200])
+            return script.pop(0) if len(script) > 1 else script[0]
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        action = self.server.next_action(self.path)
+        if action == 'reset':
+            # Closing with a zero linger sends a RST
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                       struct.pack('ii', 1, 0))
+            self.close_connection = True
+            self.connection.close()
+            return
+        if action == 'slow':
+            time.sleep(SLOW)
+            action = 200
+        elif action == 'block':
+            with self.server.lock:
+                self.server.in_flight += 1
+                self.server.most_in_flight = max(self.server.most_in_flight,
+                                                 self.server.in_flight)
+            self.server.released.wait(5)
+            with self.server.lock:
+                self.server.in_flight -= 1
+            action = 200
+        body = f'{action} {self.path}'.encode()
+        self.send_response(action)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = Stub()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,),
+                              daemon=True)
+    thread.start()
+    yield server
+    server.released.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client():
+    client = HttpClient(read_timeout=READ_TIMEOUT, backoff=0.01, jitter=0,
+                        sleep=lambda seconds: None)
+    yield client
+    client.session.close()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_success(stub, client):
+    response = client.get(stub.url('/daily'))
+    assert response.status_code == 200
+    assert response.text == '200 /daily'
+
+
+@pytest.mark.parametrize('status', [500, 502, 503, 504, 429])
+def test_retries_server_errors(stub, client, status):
+    stub.scripts['/daily'] = [status, status, 200]
+    assert client.get(stub.url('/daily')).status_code == 200
+    assert stub.requests['/daily'] == 3
+
+
+def test_retries_connection_resets(stub, client):
+    stub.scripts['/daily'] = ['reset', 200]
+    assert client.get(stub.url('/daily')).status_code == 200
+    assert stub.requests['/daily'] == 2
+
+
+def test_gives_up_after_the_retries(stub, client):
+    stub.scripts['/daily'] = [503]
+    with pytest.raises(UpstreamError, match='after 3 attempts: 503'):
+        client.get(stub.url('/daily'))
+    assert stub.requests['/daily'] == 3
+
+
+def test_backs_off_between_attempts(stub):
+    waits = []
+    client = HttpClient(backoff=0.5, jitter=0, sleep=waits.append)
+    stub.scripts['/daily'] = [503]
+    with pytest.raises(UpstreamError):
+        client.get(stub.url('/daily'))
+    assert waits == [0.5, 1.0]
+
+
+def test_times_out(stub, client):
+    stub.scripts['/daily'] = ['slow']
+    start = time.monotonic()
+    with pytest.raises(UpstreamError, match='timed out'):
+        client.get(stub.url('/daily'))
+    # Three attempts, none waiting for the slow answers
+    assert time.monotonic() - start < SLOW
+    assert stub.requests['/daily'] == 3
+
+
+def test_does_not_retry_not_found(stub, client):
+    stub.scripts['/missing'] = [404, 200]
+    response = client.get(stub.url('/missing'))
+    assert response.status_code == 404
+    assert stub.requests['/missing'] == 1
+    assert client.breaker(stub.url('/missing')).failures == 0
+
+
+def test_breaker_opens_and_fails_fast(stub, client):
+    clock = Clock()
+    url = stub.url('/daily')
+    client.breakers[f'127.0.0.1:{stub.server_port}'] = CircuitBreaker(
+        threshold=2, reset_timeout=30, clock=clock)
+    stub.scripts['/daily'] = [503]
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            client.get(url)
+    sent = stub.requests['/daily']
+
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+    assert stub.requests['/daily'] == sent
+
+
+def test_breaker_half_opens_for_one_trial(stub, client):
+    clock = Clock()
+    url = stub.url('/daily')
+    breaker = CircuitBreaker(threshold=1, reset_timeout=30, clock=clock)
+    client.breakers[f'127.0.0.1:{stub.server_port}'] = breaker
+    stub.scripts['/daily'] = [503, 503, 503, 503, 503, 503, 200]
+    with pytest.raises(UpstreamError):
+        client.get(url)
+    assert breaker.is_open
+
+    # A failed trial opens it again for another reset_timeout
+    clock.now = 30
+    with pytest.raises(UpstreamError, match='attempts'):
+        client.get(url)
+    clock.now = 59
+    with pytest.raises(CircuitOpenError):
+        client.get(url)
+
+    # Only one request is let through as the trial
+    clock.now = 60
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    # A successful trial closes it
+    clock.now = 90
+    assert client.get(url).status_code == 200
+    assert not breaker.is_open
+    assert client.get(url).status_code == 200
+
+
+def test_limits_requests_per_host(stub):
+    client = HttpClient(max_per_host=2, sleep=lambda seconds: None)
+    stub.scripts['/daily'] = ['block']
+    threads = [threading.Thread(target=client.get,
+                                args=(stub.url('/daily'),))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while stub.in_flight < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Give the other threads the chance to go over the limit
+    time.sleep(0.2)
+    assert stub.in_flight == 2
+    stub.released.set()
+    for thread in threads:
+        thread.join(5)
+    assert stub.most_in_flight == 2
+    assert stub.requests['/daily'] == 6
@@ -0,0 +1,11 @@
+"""
+Tests of the committed ingress tables against Kerykeion.
+"""
+import ingresses
+
+
+def test_tables_match_kerykeion():
+    tables = ingresses.load_tables()
+    assert tables is not None, 'Run python3 ingresses.py build'
+    # 100 random minutes and the minutes either side of 100 ingresses
+    assert ingresses.validate(tables, samples=100, seed=1) == []
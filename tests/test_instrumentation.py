@@ -0,0 +1,75 @@
+"""
+Tests of what the app's stages time, with instrumentation enabled.
+"""
+import time
+
+import pytest
+
+import instrumentation
+import run
+from storage import BufferedWriter
+
+
+@pytest.fixture
+def registry():
+    instrumentation.enable()
+    instrumentation.registry.reset()
+    yield instrumentation.registry
+    instrumentation.disable()
+    instrumentation.registry.reset()
+
+
+class Cities:
+    def lookup(self, city, country):
+        return None
+
+    def location(self, row):
+        return 53.35, -6.26, 'Europe/Dublin'
+
+
+def test_city_lookup_excludes_the_prompt(registry, monkeypatch):
+    def choose_city(city, country, cities):
+        # The user takes a while to pick a suggestion
+        time.sleep(0.2)
+        return 0
+
+    monkeypatch.setattr(run, 'choose_city', choose_city)
+    location = run.fetch_coordinates_from_dataset('Dubln', 'Ireland',
+                                                  Cities())
+    assert location == (53.35, -6.26, 'Europe/Dublin')
+    stages, _ = registry.summary()
+    stage = stages['fetch_coordinates_from_dataset']
+    assert stage['count'] == 1
+    assert stage['total'] < 0.1
+
+
+def test_writer_times_the_batch_send(registry, tmp_path):
+    sent = []
+
+    def sink(worksheet, rows):
+        time.sleep(0.05)
+        sent.append(rows)
+
+    writer = BufferedWriter(sink, journal_dir=str(tmp_path), max_rows=2)
+    writer.append('horoscope', ['Gerry'])
+    stages, _ = registry.summary()
+    assert 'storage.send' not in stages
+
+    writer.append('horoscope', ['Ann'])
+    writer.close()
+    stages, counters = registry.summary()
+    assert stages['storage.send']['count'] == 1
+    assert stages['storage.send']['total'] >= 0.05
+    assert counters['storage.rows_sent'] == 2
+
+
+def test_writer_counts_failed_sends(registry, tmp_path):
+    def sink(worksheet, rows):
+        raise ConnectionError('Sheets is unavailable')
+
+    writer = BufferedWriter(sink, journal_dir=str(tmp_path))
+    writer.append('horoscope', ['Gerry'])
+    assert not writer.close()
+    stages, counters = registry.summary()
+    assert stages['storage.send']['errors'] == 1
+    assert counters['storage.send_failed'] == 1
@@ -0,0 +1,70 @@
+"""
+Tests of output.py and of the app printing through it.
+"""
+import io
+
+import pytest
+
+import output
+import run
+
+
+@pytest.fixture
+def plain():
+    file = io.StringIO()
+    output.configure(plain=True, file=file)
+    yield file
+    output.configure()
+
+
+@pytest.fixture
+def styled():
+    file = io.StringIO()
+    output.configure(plain=False, file=file, force_terminal=True, width=80)
+    yield file
+    output.configure()
+
+
+def test_plain_echo_writes_text(plain):
+    output.echo('Hello, Gerry.', 'deep_pink1', 'sparkles')
+    assert plain.getvalue() == 'Hello, Gerry.\n'
+
+
+def test_plain_echo_prints_none(plain):
+    output.echo(None, 'deep_pink1')
+    assert plain.getvalue() == 'None\n'
+
+
+def test_styled_echo_prints_none(styled):
+    output.echo(None, 'deep_pink1')
+    assert 'None' in styled.getvalue()
+
+
+def test_screen_holds_lines(plain):
+    with output.screen():
+        output.echo('one', 'red')
+        output.echo('two', 'red')
+        assert plain.getvalue() == ''
+    assert plain.getvalue() == 'one\ntwo\n'
+
+
+def test_horoscope_without_reading_is_still_stored(plain, monkeypatch):
+    answers = iter(['Gerry', '20/06/1990'])
+    monkeypatch.setattr('builtins.input', lambda prompt: next(answers))
+    monkeypatch.setattr(run, 'preload', lambda *modules: None)
+
+    class Select:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def ask(self):
+            return 'Daily'
+
+    monkeypatch.setattr(run.questionary, 'select', Select)
+    # What get_horoscope() returns when the request fails
+    monkeypatch.setattr(run, 'get_horoscope', lambda sign, timeframe: None)
+
+    data = run.horoscope()
+
+    assert data == ['Gerry', '"20/06/1990"', 'Gemini', 'Daily', None]
+    assert 'None\n' in plain.getvalue()
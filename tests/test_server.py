@@ -0,0 +1,149 @@
+"""
+Tests of server.py's connection handling, sending raw requests to
+serve_connection() on a local port.
+"""
+import asyncio
+import json
+from http import HTTPStatus
+
+import server
+from http_client import UpstreamError
+
+
+async def exchange(*requests):
+    """
+    Sends requests on one connection and returns everything answered
+    until the server closes it or stops answering.
+    """
+    listener = await asyncio.start_server(server.serve_connection,
+                                          '127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+    async with listener:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for request in requests:
+            writer.write(request)
+        await writer.drain()
+        answer = b''
+        try:
+            while True:
+                chunk = await asyncio.wait_for(reader.read(65536), 2)
+                if not chunk:
+                    break
+                answer += chunk
+        except asyncio.TimeoutError:
+            pass
+        writer.close()
+    return answer.decode('latin-1')
+
+
+def responses(answer):
+    """
+    Splits what a connection answered into (status, headers, body).
+    """
+    found = []
+    while answer:
+        head, _, answer = answer.partition('\r\n\r\n')
+        lines = head.split('\r\n')
+        headers = dict(line.split(': ', 1) for line in lines[1:])
+        length = int(headers['Content-Length'])
+        body, answer = answer[:length], answer[length:]
+        found.append((int(lines[0].split(' ')[1]), headers,
+                      json.loads(body)))
+    return found
+
+
+def get(path='/health', headers=''):
+    return f'GET {path} HTTP/1.1\r\nHost: test\r\n{headers}\r\n'.encode()
+
+
+# The last request of a connection, so the server closes it
+LAST = get(headers='Connection: close\r\n')
+
+
+def test_keeps_the_connection_alive():
+    answer = asyncio.run(exchange(get(), LAST))
+    found = responses(answer)
+    assert [status for status, _, _ in found] == [200, 200]
+    assert found[0][1]['Connection'] == 'keep-alive'
+    assert found[1][1]['Connection'] == 'close'
+
+
+def test_skips_request_bodies():
+    request = get(headers='Content-Length: 5\r\n') + b'hello'
+    answer = asyncio.run(exchange(request, LAST))
+    assert [status for status, _, _ in responses(answer)] == [200, 200]
+
+
+def test_rejects_a_bad_content_length():
+    answer = asyncio.run(exchange(get(headers='Content-Length: abc\r\n'),
+                                  get()))
+    (status, headers, body), = responses(answer)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert headers['Connection'] == 'close'
+    assert body == {'error': 'Invalid Content-Length'}
+
+
+def test_rejects_a_negative_content_length():
+    answer = asyncio.run(exchange(get(headers='Content-Length: -1\r\n')))
+    (status, headers, _), = responses(answer)
+    assert status == HTTPStatus.BAD_REQUEST
+    assert headers['Connection'] == 'close'
+
+
+def test_rejects_chunked_bodies():
+    request = (get(headers='Transfer-Encoding: chunked\r\n')
+               + b'5\r\nhello\r\n0\r\n\r\n')
+    answer = asyncio.run(exchange(request, get()))
+    (status, headers, _), = responses(answer)
+    assert status == HTTPStatus.LENGTH_REQUIRED
+    assert headers['Connection'] == 'close'
+
+
+def test_hides_internal_errors(monkeypatch, capsys):
+    def broken(params):
+        raise KeyError('secret')
+
+    monkeypatch.setitem(server.ROUTES, '/health', broken)
+    status, body = server.handle('GET', '/health')
+    assert status == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert body == {'error': 'Internal error'}
+    logged = capsys.readouterr().err
+    assert 'GET /health failed' in logged
+    assert "KeyError: 'secret'" in logged
+
+
+def test_hides_upstream_errors(monkeypatch, capsys):
+    def failing(params):
+        raise UpstreamError('GET https://upstream.test/daily failed: '
+                            'Max retries exceeded')
+
+    monkeypatch.setitem(server.ROUTES, '/health', failing)
+    status, body = server.handle('GET', '/health')
+    assert status == HTTPStatus.BAD_GATEWAY
+    assert body == {'error': 'Horoscope service unavailable'}
+    assert 'https://upstream.test/daily' in capsys.readouterr().err
+
+
+def test_compatibility_hides_upstream_errors(monkeypatch, capsys):
+    class Store:
+        def get(self, sign1, sign2):
+            raise UpstreamError('GET https://upstream.test/ failed')
+
+    monkeypatch.setattr(server, 'get_compatibility_store', Store)
+    status, body = server.handle(
+        'GET', '/compatibility?date1=20/06/1990&date2=01/01/1992')
+    assert status == HTTPStatus.OK
+    assert body['text'] is None
+    assert body['error'] == 'Horoscope service unavailable'
+    assert body['score'] is not None
+    assert 'https://upstream.test/' in capsys.readouterr().err
+
+
+def test_content_types(monkeypatch):
+    monkeypatch.setitem(server.ROUTES, '/health',
+                        lambda params: 'A text report\n')
+    answer = asyncio.run(exchange(get('/metrics'), LAST))
+    metrics, report = answer.split('HTTP/1.1 ')[1:]
+    assert ('Content-Type: text/plain; version=0.0.4; charset=utf-8'
+            in metrics)
+    assert 'Content-Type: text/plain; charset=utf-8\r\n' in report
@@ -0,0 +1,243 @@
+"""
+Tests of storage.py's BufferedWriter, sending rows to a fake gspread
+spreadsheet through the Sheets backend.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import ROOT
+from storage import BACKENDS, BufferedWriter, SheetsBackend, StorageBackend
+
+ROW = ['Gerry', '"20/06/1990"', 'Gemini', 'Daily', 'A good day.']
+
+
+class FakeWorksheet:
+    """
+    Keeps what gspread's append_rows would send, failing while
+    failing is set.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def append_rows(self, rows):
+        if self.failing:
+            raise ConnectionError('Sheets is unavailable')
+        self.calls.append([list(row) for row in rows])
+
+    @property
+    def rows(self):
+        return [row for call in self.calls for row in call]
+
+
+class FakeSpreadsheet:
+    def __init__(self):
+        self.worksheets = {}
+
+    def worksheet(self, name):
+        return self.worksheets.setdefault(name, FakeWorksheet())
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def sheet():
+    return FakeSpreadsheet()
+
+
+@pytest.fixture
+def backend(sheet):
+    backend = SheetsBackend()
+    # Already authorized, so the fake is used instead of gspread
+    backend.sheet = sheet
+    return backend
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def make_writer(backend, clock, tmp_path):
+    writers = []
+
+    def make_writer(**options):
+        options = {'journal_dir': str(tmp_path), 'max_rows': 3,
+                   'max_age': 30, 'clock': clock, **options}
+        writer = BufferedWriter(backend.append_rows, **options)
+        writers.append(writer)
+        return writer
+
+    yield make_writer
+    for writer in writers:
+        writer.close()
+
+
+def journaled(writer):
+    with open(writer.journal_path, encoding='utf-8') as file:
+        return [json.loads(line)['row'] for line in file]
+
+
+def test_flushes_at_the_size_limit(make_writer, sheet):
+    writer = make_writer()
+    writer.append('horoscope', ROW)
+    writer.append('horoscope', ROW)
+    assert sheet.worksheet('horoscope').calls == []
+    assert len(journaled(writer)) == 2
+
+    writer.append('horoscope', ROW)
+    # One append_rows call for the whole batch
+    assert sheet.worksheet('horoscope').calls == [[ROW] * 3]
+    assert journaled(writer) == []
+
+
+def test_worksheets_are_batched_apart(make_writer, sheet):
+    writer = make_writer()
+    for _ in range(3):
+        writer.append('horoscope', ROW)
+    writer.append('compatibility', ['Ann'])
+    assert sheet.worksheet('horoscope').rows == [ROW] * 3
+    assert sheet.worksheet('compatibility').rows == []
+
+
+def test_flushes_at_the_age_limit(make_writer, sheet, clock):
+    writer = make_writer(max_rows=100, max_age=0.05)
+    writer.append('horoscope', ROW)
+    time.sleep(0.2)
+    # Not due yet on the writer's clock
+    assert sheet.worksheet('horoscope').calls == []
+
+    clock.now = 0.05
+    deadline = time.monotonic() + 5
+    while (not sheet.worksheet('horoscope').calls
+           and time.monotonic() < deadline):
+        time.sleep(0.01)
+    # The journal is rewritten after sending, under the same lock
+    with writer._lock:
+        assert sheet.worksheet('horoscope').calls == [[ROW]]
+        assert journaled(writer) == []
+
+
+def test_due_only_flush_skips_recent_rows(make_writer, sheet, clock):
+    writer = make_writer(max_rows=100)
+    writer.append('horoscope', ROW)
+    clock.now = 20
+    writer.append('compatibility', ['Ann'])
+    clock.now = 30
+    writer.flush(due_only=True)
+    assert sheet.worksheet('horoscope').rows == [ROW]
+    assert sheet.worksheet('compatibility').rows == []
+
+
+def test_failing_sink_keeps_the_rows(make_writer, sheet):
+    writer = make_writer()
+    sheet.worksheet('horoscope').failing = True
+    rows = [ROW[:4] + [f'Reading {number}'] for number in range(4)]
+    for row in rows:
+        # Sending fails at the size limit, the append doesn't
+        writer.append('horoscope', row)
+    assert writer.buffers['horoscope'] == rows
+    assert journaled(writer) == rows
+    with pytest.raises(ConnectionError):
+        writer.flush()
+
+    sheet.worksheet('horoscope').failing = False
+    writer.flush()
+    assert sheet.worksheet('horoscope').rows == rows
+    assert journaled(writer) == []
+
+
+def test_close_drains_the_buffer(make_writer, sheet):
+    writer = make_writer()
+    writer.append('horoscope', ROW)
+    writer.append('birth_chart', ['Gerry'])
+    assert writer.close()
+    assert sheet.worksheet('horoscope').rows == [ROW]
+    assert sheet.worksheet('birth_chart').rows == [['Gerry']]
+    assert not os.path.exists(writer.journal_path)
+    # Closing again does nothing
+    assert writer.close()
+
+
+def test_close_keeps_the_journal_when_sending_fails(make_writer, sheet):
+    writer = make_writer()
+    sheet.worksheet('horoscope').failing = True
+    writer.append('horoscope', ROW)
+    assert not writer.close()
+    assert journaled(writer) == [ROW]
+
+
+CRASH = """
+import os, sys
+from storage import BufferedWriter
+
+def unavailable(worksheet, rows):
+    raise ConnectionError('Sheets is unavailable')
+
+writer = BufferedWriter(unavailable, journal_dir=sys.argv[1], max_rows=2)
+writer.append('horoscope', ['Gerry'])
+writer.append('horoscope', ['Ann'])
+writer.append('compatibility', ['Gerry', 'Ann'])
+# Stops without closing the writer, like a crash
+os._exit(1)
+"""
+
+
+def test_replays_the_journal_after_a_crash(make_writer, sheet, tmp_path):
+    crashed = subprocess.run([sys.executable, '-c', CRASH, str(tmp_path)],
+                             cwd=ROOT)
+    assert crashed.returncode == 1
+    assert len(os.listdir(tmp_path)) == 1
+
+    writer = make_writer(max_rows=100)
+    assert writer.buffers == {'horoscope': [['Gerry'], ['Ann']],
+                              'compatibility': [['Gerry', 'Ann']]}
+    # The rows taken over are journaled again by this process
+    assert os.listdir(tmp_path) == [os.path.basename(writer.journal_path)]
+    assert len(journaled(writer)) == 3
+
+    assert writer.close()
+    assert sheet.worksheet('horoscope').rows == [['Gerry'], ['Ann']]
+    assert sheet.worksheet('compatibility').rows == [['Gerry', 'Ann']]
+    assert os.listdir(tmp_path) == []
+
+
+def test_running_processes_keep_their_journals(make_writer, tmp_path):
+    running = tmp_path / f'{os.getppid()}.jsonl'
+    running.write_text(json.dumps({'worksheet': 'horoscope',
+                                   'row': ROW}) + '\n')
+    writer = make_writer()
+    assert writer.buffers == {}
+    assert running.exists()
+
+
+def test_incomplete_backends_fail_when_created():
+    class AppendOnly(StorageBackend):
+        def append_rows(self, worksheet, rows):
+            pass
+
+    with pytest.raises(TypeError, match='read_rows'):
+        AppendOnly()
+
+
+@pytest.mark.parametrize('name', BACKENDS)
+def test_backends_are_complete(name, tmp_path):
+    backend_class = BACKENDS[name]
+    if backend_class is SheetsBackend:
+        backend = backend_class()
+    else:
+        backend = backend_class(str(tmp_path / 'readings'))
+    assert isinstance(backend, StorageBackend)
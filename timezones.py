@@ -0,0 +1,89 @@
+"""
+Timezone lookups for birth places.
+
+Building a TimezoneFinder loads its polygon data, so the app keeps a
+single one. timezonefinder splits the world into H3 cells; when only
+one timezone covers the cell of a point, that answer is cached for the
+whole cell, and the polygons are only searched near timezone borders.
+"""
+import functools
+import os
+import threading
+
+import h3
+from timezonefinder import TimezoneFinder
+from timezonefinder.configs import SHORTCUT_H3_RES
+
+# Set TZ_IN_MEMORY=1 to read the polygon data into memory once,
+# which makes lookups near borders faster at the cost of RAM
+IN_MEMORY = os.environ.get('TZ_IN_MEMORY') == '1'
+# Coordinates are rounded to 4 decimals (about 10 metres)
+# before the polygons are searched, so nearby points share an entry
+PRECISION = 4
+
+_finder = None
+_finder_lock = threading.Lock()
+# Timezone of every H3 cell seen so far, None when the cell
+# is shared by several timezones
+_cell_timezones = {}
+
+
+def get_finder():
+    """
+    Returns the TimezoneFinder shared by the whole process,
+    creating it the first time it is needed.
+    """
+    global _finder
+    with _finder_lock:
+        if _finder is None:
+            _finder = TimezoneFinder(in_memory=IN_MEMORY)
+    return _finder
+
+
+def _cell_timezone(cell, lat, long):
+    """
+    Returns the timezone of an H3 cell if it is the only one in it.
+    """
+    if cell not in _cell_timezones:
+        finder = get_finder()
+        with _finder_lock:
+            _cell_timezones[cell] = finder.unique_timezone_at(lng=long,
+                                                              lat=lat)
+    return _cell_timezones[cell]
+
+
+@functools.lru_cache(maxsize=65536)
+def _polygon_timezone(lat, long):
+    """
+    Searches the timezone polygons for a point near a border.
+    """
+    finder = get_finder()
+    with _finder_lock:
+        return finder.timezone_at(lng=long, lat=lat)
+
+
+def timezone_at(lat, long):
+    """
+    Gets the timezone of a point.
+
+    Args:
+        lat (float): Latitude of the location.
+        long (float): Longitude of the location.
+
+    Returns:
+        tz_str (str): Timezone name or None if it couldn't be found.
+    """
+    cell = h3.geo_to_h3(lat, long, SHORTCUT_H3_RES)
+    tz_str = _cell_timezone(cell, lat, long)
+    if tz_str is None:
+        tz_str = _polygon_timezone(round(lat, PRECISION),
+                                   round(long, PRECISION))
+    return tz_str
+
+
+def cache_info():
+    """
+    Returns how many cells are cached and the hits and misses
+    of the polygon searches.
+    """
+    return len(_cell_timezones), _polygon_timezone.cache_info()
@@ -0,0 +1,180 @@
+"""
+Works out zodiac signs from birth dates.
+
+The sign only depends on the day of the year, so the sign of every day
+of a leap year is worked out once into a 366-entry table. Classifying
+a date is then a single lookup, and whole arrays of dates (e.g. every
+birth date stored in the worksheets) are classified at once by NumPy.
+NumPy is only imported by the array functions, so classifying one
+date (the horoscope and compatibility prompts) doesn't load it.
+
+Signs are numbered by their order in the zodiac, from 1 (Aries) to 12
+(Pisces), and 0 stands for an invalid date.
+"""
+from itertools import accumulate
+
+SIGNS = ('Aries', 'Taurus', 'Gemini', 'Cancer', 'Leo', 'Virgo', 'Libra',
+         'Scorpio', 'Sagittarius', 'Capricorn', 'Aquarius', 'Pisces')
+INVALID = 'Invalid date'
+
+# The inspiration for this structure was from the tuple tutorial
+# on W3Schools and a dev.to article - link in README.md
+# Start month and day, end month and day of every sign, in SIGNS order
+BOUNDARIES = ((3, 21, 4, 19),
+              (4, 20, 5, 20),
+              (5, 21, 6, 20),
+              (6, 21, 7, 22),
+              (7, 23, 8, 22),
+              (8, 23, 9, 22),
+              (9, 23, 10, 22),
+              (10, 23, 11, 21),
+              (11, 22, 12, 21),
+              (12, 22, 1, 19),
+              (1, 20, 2, 18),
+              (2, 19, 3, 20))
+
+# Days of a leap year before the first day of every month. Days past the
+# end of a month (e.g. 31/04) fall on the start of the next month, which
+# always has the same sign since no sign changes before the 19th.
+MONTH_STARTS = tuple(accumulate((0, 31, 29, 31, 30, 31, 30,
+                                 31, 31, 30, 31, 30)))
+
+
+def _build_table():
+    """
+    Returns the order of the sign of every day of a leap year.
+    """
+    table = [0] * 366
+    for order, (start_month, start_day, _, _) in enumerate(BOUNDARIES,
+                                                           start=1):
+        start = MONTH_STARTS[start_month - 1] + start_day - 1
+        # Every day from the start of a sign belongs to it until the
+        # next sign starts, Capricorn wraps around the new year
+        next_month, next_day = BOUNDARIES[order % 12][:2]
+        end = MONTH_STARTS[next_month - 1] + next_day - 1
+        if end < start:
+            table[start:] = [order] * (366 - start)
+            table[:end] = [order] * end
+        else:
+            table[start:end] = [order] * (end - start)
+    return tuple(table)
+
+
+DAY_OF_YEAR_SIGNS = _build_table()
+
+# Converting datetime64 days to months is slow, so the sign of every day
+# in this range is kept by its number of days since the range starts,
+# built the first time dates are classified. Other dates take the slower
+# path.
+DATE_RANGE = ('1800-01-01', '2200-01-01')
+_arrays = None
+_date_signs = None
+
+
+def _tables():
+    """
+    Returns NumPy and the tables as arrays, made the first time
+    an array of dates is classified.
+    """
+    global _arrays
+    import numpy as np
+    if _arrays is None:
+        _arrays = (np.array(MONTH_STARTS),
+                   np.array(DAY_OF_YEAR_SIGNS, dtype=np.int8),
+                   # Names indexed by order, with the invalid date at 0
+                   np.array((INVALID,) + SIGNS))
+    return (np, *_arrays)
+
+
+def sign_of(day, month):
+    """
+    Returns the zodiac sign of a day of the year.
+
+    Args:
+        day (int): Day of the month.
+        month (int): Month of the year.
+
+    Returns:
+        zodiac_sign (tuple): The zodiac name and its order on the
+        standard list, or 'Invalid date'.
+    """
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        return INVALID
+    order = DAY_OF_YEAR_SIGNS[MONTH_STARTS[month - 1] + day - 1]
+    return SIGNS[order - 1], order
+
+
+def sign_orders(days, months):
+    """
+    Classifies arrays of days and months at once.
+
+    Args:
+        days (array): Days of the month.
+        months (array): Months of the year, same shape as days.
+
+    Returns:
+        orders (ndarray): The order of every sign, 0 for invalid dates.
+    """
+    np, month_starts, day_signs, _ = _tables()
+    days = np.asarray(days)
+    months = np.asarray(months)
+    valid = (months >= 1) & (months <= 12) & (days >= 1) & (days <= 31)
+    # Invalid dates are looked up as 1 January, then cleared
+    index = (month_starts[np.where(valid, months - 1, 0)]
+             + np.where(valid, days - 1, 0))
+    orders = day_signs[index]
+    orders[~valid] = 0
+    return orders
+
+
+def _calendar_sign_orders(dates):
+    """
+    Classifies datetime64[D] dates by their month and day.
+    """
+    np = _tables()[0]
+    month_starts = dates.astype('datetime64[M]')
+    days = (dates - month_starts).astype(np.int64) + 1
+    months = month_starts.astype(np.int64) % 12 + 1
+    orders = sign_orders(days, months)
+    orders[np.isnat(dates)] = 0
+    return orders
+
+
+def date_sign_orders(dates):
+    """
+    Classifies an array of dates at once.
+
+    Args:
+        dates (array): datetime64 dates (any unit).
+
+    Returns:
+        orders (ndarray): The order of every sign, 0 for NaT.
+    """
+    global _date_signs
+    np = _tables()[0]
+    first, last = (np.datetime64(date) for date in DATE_RANGE)
+    if _date_signs is None:
+        _date_signs = _calendar_sign_orders(np.arange(first, last))
+    dates = np.asarray(dates).astype('datetime64[D]')
+    # Comparisons with NaT are False, so it takes the slower path too
+    inside = (dates >= first) & (dates < last)
+    if inside.all():
+        return _date_signs[(dates - first).astype(np.int64)]
+    orders = np.zeros(dates.shape, dtype=np.int8)
+    orders[inside] = _date_signs[(dates[inside] - first).astype(np.int64)]
+    orders[~inside] = _calendar_sign_orders(dates[~inside])
+    return orders
+
+
+def sign_names(orders):
+    """
+    Returns the names of an array of sign orders.
+
+    Args:
+        orders (array): Orders from sign_orders() or date_sign_orders().
+
+    Returns:
+        names (ndarray): The sign names, 'Invalid date' for 0.
+    """
+    np, _, _, names = _tables()
+    return names[np.asarray(orders)]